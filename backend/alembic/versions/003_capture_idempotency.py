@@ -0,0 +1,21 @@
+"""add captures.idempotency_key
+
+Revision ID: 003_capture_idempotency
+Revises: 002_cameras
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "003_capture_idempotency"
+down_revision = "002_cameras"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # init_db.py applies the same change at startup; IF NOT EXISTS lets both run
+    op.execute("ALTER TABLE captures ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(128)")
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_captures_idempotency_key ON captures (idempotency_key)")
+
+def downgrade():
+    op.drop_index("ix_captures_idempotency_key", table_name="captures")
+    op.drop_column("captures", "idempotency_key")
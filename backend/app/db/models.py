@@ -4,6 +4,7 @@ Database Models for Thai LPR V2 with Vehicle Tracking
 """
 import enum
 from datetime import datetime
+from typing import Optional
 from sqlalchemy import String, Integer, DateTime, Enum, Float, Boolean, ForeignKey, Text, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship, DeclarativeBase
 
@@ -132,6 +133,9 @@ class Capture(Base):
     captured_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     original_path: Mapped[str] = mapped_column(Text)
     sha256: Mapped[str] = mapped_column(String(64))
+    # Set by the worker so redelivered reads insert once; existing databases get
+    # the column from init_db.upgrade_schema() / alembic 003
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, unique=True, index=True)
     
     # Relationships
     detections: Mapped[list["Detection"]] = relationship(back_populates="capture")
@@ -4,7 +4,6 @@ RTSP Stream Manager with Line Crossing & Trajectory Tracking
 Uses TensorRT vehicle detection (models/vehicles.engine) + LPR tracking engine
 """
 import asyncio
-import base64
 import hashlib
 import logging
 import os
@@ -45,6 +44,8 @@ except ImportError:
 
     from worker.tracking.bytetrack_engine import LPRTrackingEngine, Detection
 
+from worker.alpr_worker.crop_payload import CropPayloadCodec, describe_payload
+
 
 log = logging.getLogger(__name__)
 
@@ -241,6 +242,9 @@ class RTSPStreamManager:
             os.getenv("TRACK_TRIGGER_CLEANUP_INTERVAL_SEC", "30")
         )
         self._last_track_trigger_cleanup_at = time.monotonic()
+
+        # How the vehicle crop travels to the worker (inline base64 / blob / redis key)
+        self.crop_payload = CropPayloadCodec(redis_client=self.redis)
         
         log.info("RTSPStreamManager initialized for %d cameras", len(self.cameras))
         log.info("Count line: %s", self.count_line)
@@ -433,7 +437,7 @@ class RTSPStreamManager:
     ):
         """Dispatch LPR processing task to Celery worker"""
         try:
-            # Encode vehicle crop to Base64
+            # Encode vehicle crop to JPEG
             ok, encoded = cv2.imencode('.jpg', vehicle_crop, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
             if not ok:
                 log.error(
@@ -442,13 +446,14 @@ class RTSPStreamManager:
                 )
                 return
             
-            vehicle_crop_b64 = base64.b64encode(encoded.tobytes()).decode('utf-8')
+            # Inline base64 or a small blob/redis reference, per LPR_PAYLOAD_MODE
+            crop_kwargs = self.crop_payload.encode(encoded.tobytes())
             
             # Send to Celery worker by task name so stream-manager does not import OCR runtime deps.
             celery_client.send_task(
                 "tasks.process_lpr_task",
                 kwargs={
-                    "vehicle_crop_b64": vehicle_crop_b64,
+                    **crop_kwargs,
                     "track_id": track_id,
                     "vehicle_count": vehicle_count,
                     "camera_id": camera_id,
@@ -457,8 +462,8 @@ class RTSPStreamManager:
             )
             
             log.info(
-                "📤 LPR task dispatched: camera=%s, track_id=%d, count=%d, crop_size=%d bytes",
-                camera_id, track_id, vehicle_count, len(vehicle_crop_b64)
+                "📤 LPR task dispatched: camera=%s, track_id=%d, count=%d, crop_size=%d bytes, payload=%s",
+                camera_id, track_id, vehicle_count, len(encoded), describe_payload(crop_kwargs)
             )
         
         except Exception as e:
@@ -6,13 +6,30 @@ import os
 # Add app to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import text
+
 from app.db.models import Base
 from app.db.session import engine
 
+# create_all() only creates missing tables; columns added to an existing table
+# are applied here (same as the alembic revision named in the comment).
+SCHEMA_UPGRADES = [
+    # 003_capture_idempotency
+    "ALTER TABLE captures ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(128)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_captures_idempotency_key ON captures (idempotency_key)",
+]
+
+def upgrade_schema():
+    """Apply column additions to tables created by an older release"""
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
 def init_db():
     """Create all tables"""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
     print("✓ Database tables created successfully!")
 
 if __name__ == "__main__":
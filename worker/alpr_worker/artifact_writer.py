@@ -0,0 +1,100 @@
+"""
+artifact_writer.py — Background Artifact Persistence
+======================================================
+
+Persist already-encoded image bytes (vehicle / plate crops) off the task's
+critical path. Paths are decided by the caller up front so they can be stored
+in the DB immediately; the bytes land on disk shortly after.
+
+ENV:
+  ARTIFACT_WRITER_ASYNC=true        write in a background thread
+  ARTIFACT_WRITER_QUEUE_SIZE=256    max pending writes (full queue → sync write)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class ArtifactWriter:
+    """Single daemon thread that writes ``(path, bytes)`` jobs atomically."""
+
+    def __init__(self):
+        self.enabled = os.getenv("ARTIFACT_WRITER_ASYNC", "true").lower() == "true"
+        self.queue_size = int(os.getenv("ARTIFACT_WRITER_QUEUE_SIZE", "256"))
+        self._queue: "queue.Queue[Optional[Tuple[Path, bytes]]]" = queue.Queue(maxsize=self.queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        log.info("ArtifactWriter: async=%s queue_size=%d", self.enabled, self.queue_size)
+
+    def submit(self, path: Path, data: bytes) -> None:
+        """Queue ``data`` to be written at ``path``; writes inline when async is off or the queue is full."""
+        if not self.enabled:
+            self._write(path, data)
+            return
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((Path(path), data))
+        except queue.Full:
+            log.warning("ArtifactWriter queue full; writing %s synchronously", path)
+            self._write(path, data)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until every queued write has been attempted."""
+        if self._thread is None:
+            return
+        if timeout is None:
+            self._queue.join()
+            return
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        done.wait(timeout)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        path = Path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.error("ArtifactWriter failed to write %s: %s", path, e)
+
+
+_writer: Optional[ArtifactWriter] = None
+
+
+def get_artifact_writer() -> ArtifactWriter:
+    global _writer
+    if _writer is None:
+        _writer = ArtifactWriter()
+        atexit.register(_writer.flush, 10.0)
+    return _writer
@@ -0,0 +1,135 @@
+"""
+checkpoint.py — Stage Checkpoints for process_lpr_task
+========================================================
+
+A Celery retry (e.g. after a transient Postgres error) used to start again
+from base64 decode and re-run detection plus every OCR variant. Each stage
+that finishes now records its output here, keyed by the vehicle
+(camera_id, track_id, vehicle_count) and a fingerprint of the crop payload,
+so a retry resumes from the first incomplete stage:
+
+  ocr       detection / crop paths + OCR result  → retry skips decode/detect/OCR
+  dedup     plate dedup decision                 → retry doesn't hit its own dedup entry
+  persist   final task result                    → redelivery returns it as-is
+
+Stored as a Redis hash (one field per stage) with a TTL; if Redis is not
+reachable, a JSON file per vehicle under STORAGE_DIR/checkpoints is used.
+
+ENV:
+  LPR_CHECKPOINT_ENABLED=true
+  LPR_CHECKPOINT_TTL_SEC=3600
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def checkpoint_key(
+    camera_id: str,
+    track_id: int,
+    vehicle_count: int,
+    vehicle_crop_b64: Optional[str] = None,
+    vehicle_crop_ref: Optional[str] = None,
+) -> str:
+    # The payload fingerprint keeps a tracker/counter reset from resuming
+    # someone else's checkpoint; it is the same on every retry of one task.
+    if vehicle_crop_ref:
+        fingerprint = vehicle_crop_ref.rpartition(":")[2][:16]
+    else:
+        fingerprint = hashlib.sha1((vehicle_crop_b64 or "").encode("ascii", "ignore")).hexdigest()[:16]
+    return f"lpr:ckpt:{camera_id}:{track_id}:{vehicle_count}:{fingerprint}"
+
+
+class CheckpointStore:
+    def __init__(self, redis_client=None):
+        self.enabled = os.getenv("LPR_CHECKPOINT_ENABLED", "true").lower() == "true"
+        self.ttl_sec = int(os.getenv("LPR_CHECKPOINT_TTL_SEC", "3600"))
+        self.redis = redis_client
+        self.disk_dir = Path(os.getenv("STORAGE_DIR", "/storage")) / "checkpoints"
+        self._last_sweep = 0.0
+
+        log.info("CheckpointStore: enabled=%s ttl=%ds redis=%s",
+                 self.enabled, self.ttl_sec, redis_client is not None)
+
+    def load(self, key: str) -> Dict[str, Any]:
+        """Return ``{stage: data}`` for every completed stage of ``key``."""
+        if not self.enabled:
+            return {}
+        stages: Dict[str, Any] = {}
+        if self.redis is not None:
+            try:
+                raw = self.redis.hgetall(key)
+                stages = {
+                    (k.decode() if isinstance(k, bytes) else k): json.loads(v)
+                    for k, v in raw.items()
+                }
+            except Exception as e:
+                log.warning("Checkpoint load from Redis failed (%s); trying disk", e)
+        if not stages:
+            stages = self._load_disk(key)
+        return stages
+
+    def save(self, key: str, stage: str, data: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.hset(key, stage, payload)
+                pipe.expire(key, self.ttl_sec)
+                pipe.execute()
+                return
+            except Exception as e:
+                log.warning("Checkpoint save to Redis failed (%s); writing to disk", e)
+        self._save_disk(key, stage, payload)
+
+    # ----------------------------
+    # Disk fallback
+    # ----------------------------
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{_UNSAFE_CHARS.sub('_', key)}.json"
+
+    def _load_disk(self, key: str) -> Dict[str, Any]:
+        path = self._disk_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_sec:
+                return {}
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_disk(self, key: str, stage: str, payload: str) -> None:
+        path = self._disk_path(key)
+        try:
+            stages = self._load_disk(key)
+            stages[stage] = json.loads(payload)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_text(json.dumps(stages, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.error("Checkpoint save to disk failed for %s: %s", key, e)
+        self._maybe_sweep_disk()
+
+    def _maybe_sweep_disk(self) -> None:
+        now = time.time()
+        if now - self._last_sweep < max(60, self.ttl_sec // 10):
+            return
+        self._last_sweep = now
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > self.ttl_sec:
+                    path.unlink()
+            except OSError:
+                continue
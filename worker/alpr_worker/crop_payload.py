@@ -0,0 +1,237 @@
+"""
+crop_payload.py — Vehicle Crop Transport for LPR Tasks
+========================================================
+
+By default the stream manager puts a base64 JPEG of the vehicle crop into the
+Celery task kwargs, so every queued task holds ~100 KB of JSON in Redis. With
+Redis on ``allkeys-lru`` a backlog can push those task messages out. The
+offload modes keep the bytes out of the broker and send only a short
+reference:
+
+  inline   {"vehicle_crop_b64": "..."}                       (legacy)
+  blob     {"vehicle_crop_ref": "blob:<key>"}  → STORAGE_DIR/blobs/ab/<key>.jpg
+  redis    {"vehicle_crop_ref": "redis:<key>"} → binary key lpr:crop:<key> with TTL
+
+``<key>`` is ``<sha256>.<token>``: the digest names the content (checkpoint
+keys use it), the random token makes every dispatched task own its payload.
+Two in-flight tasks with byte-identical crops therefore never share one,
+and the first to finish cannot delete the other's (``release_crop_ref``).
+``process_lpr_task`` accepts either form (see ``load_crop_bytes``).
+
+Shared by the stream manager (backend image) and the Celery worker.
+
+ENV:
+  LPR_PAYLOAD_MODE=inline          inline | blob | redis
+  LPR_PAYLOAD_TTL_SEC=3600         redis key TTL / max age of blob files
+  LPR_PAYLOAD_BLOB_DIR=            default: $STORAGE_DIR/blobs
+  LPR_PAYLOAD_STATS_EVERY=100      log + publish dispatch stats every N tasks
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+PAYLOAD_MODES = ("inline", "blob", "redis")
+REDIS_KEY_PREFIX = "lpr:crop:"
+STATS_KEY = "lpr:payload_stats"
+
+
+def _blob_dir() -> Path:
+    configured = os.getenv("LPR_PAYLOAD_BLOB_DIR", "").strip()
+    if configured:
+        return Path(configured)
+    return Path(os.getenv("STORAGE_DIR", "/storage")) / "blobs"
+
+
+def _blob_path(key: str) -> Path:
+    return _blob_dir() / key[:2] / f"{key}.jpg"
+
+
+def _payload_key(jpeg_bytes: bytes) -> str:
+    """``<sha256>.<token>`` — content digest plus a per-task token."""
+    return f"{hashlib.sha256(jpeg_bytes).hexdigest()}.{uuid.uuid4().hex[:16]}"
+
+
+def _redis_client():
+    from redis import Redis
+    return Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+
+
+class CropPayloadCodec:
+    """Turn encoded crop bytes into task kwargs and publish transport stats."""
+
+    def __init__(self, redis_client=None):
+        self.mode = os.getenv("LPR_PAYLOAD_MODE", "inline").strip().lower()
+        if self.mode not in PAYLOAD_MODES:
+            log.warning("Unknown LPR_PAYLOAD_MODE=%s; using inline", self.mode)
+            self.mode = "inline"
+        self.ttl_sec = int(os.getenv("LPR_PAYLOAD_TTL_SEC", "3600"))
+        self.stats_every = max(1, int(os.getenv("LPR_PAYLOAD_STATS_EVERY", "100")))
+        self._redis = redis_client
+        self._lock = threading.Lock()
+        self._reset_window()
+        self._last_sweep = 0.0
+
+        log.info("CropPayloadCodec: mode=%s ttl=%ds", self.mode, self.ttl_sec)
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = _redis_client()
+        return self._redis
+
+    # ----------------------------
+    # Encode (stream manager side)
+    # ----------------------------
+    def encode(self, jpeg_bytes: bytes) -> Dict[str, str]:
+        """Return the crop part of the task kwargs for ``jpeg_bytes``."""
+        t0 = time.perf_counter()
+        if self.mode == "inline":
+            kwargs = {"vehicle_crop_b64": base64.b64encode(jpeg_bytes).decode("utf-8")}
+        else:
+            key = _payload_key(jpeg_bytes)
+            try:
+                if self.mode == "redis":
+                    self.redis.set(REDIS_KEY_PREFIX + key, jpeg_bytes, ex=self.ttl_sec)
+                else:
+                    self._write_blob(key, jpeg_bytes)
+                kwargs = {"vehicle_crop_ref": f"{self.mode}:{key}"}
+            except Exception as e:
+                # Offload store unavailable: never drop the vehicle, ship it inline.
+                log.warning("Crop offload (%s) failed, sending inline: %s", self.mode, e)
+                kwargs = {"vehicle_crop_b64": base64.b64encode(jpeg_bytes).decode("utf-8")}
+        # kombu JSON-serializes kwargs again on send; count that in the CPU cost.
+        broker_bytes = len(json.dumps(kwargs))
+        self._record(len(jpeg_bytes), broker_bytes, time.perf_counter() - t0)
+        return kwargs
+
+    def _write_blob(self, key: str, data: bytes) -> None:
+        path = _blob_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self._maybe_sweep_blobs()
+
+    def _maybe_sweep_blobs(self) -> None:
+        """Delete blobs older than the TTL (no broker-side expiry for files)."""
+        now = time.time()
+        if now - self._last_sweep < max(60, self.ttl_sec // 10):
+            return
+        self._last_sweep = now
+        cutoff = now - self.ttl_sec
+        removed = 0
+        for path in _blob_dir().glob("*/*.jpg"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            log.info("CropPayloadCodec: swept %d expired blobs", removed)
+
+    # ----------------------------
+    # Stats
+    # ----------------------------
+    def _reset_window(self) -> None:
+        self._count = 0
+        self._crop_bytes = 0
+        self._broker_bytes = 0
+        self._encode_sec = 0.0
+
+    def _record(self, crop_bytes: int, broker_bytes: int, encode_sec: float) -> None:
+        with self._lock:
+            self._count += 1
+            self._crop_bytes += crop_bytes
+            self._broker_bytes += broker_bytes
+            self._encode_sec += encode_sec
+            if self._count < self.stats_every:
+                return
+            count, crop_total, broker_total, encode_total = (
+                self._count, self._crop_bytes, self._broker_bytes, self._encode_sec
+            )
+            self._reset_window()
+        self._report(count, crop_total, broker_total, encode_total)
+
+    def _report(self, count: int, crop_total: int, broker_total: int, encode_total: float) -> None:
+        used_memory = None
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(STATS_KEY, f"{self.mode}:tasks", count)
+            pipe.hincrby(STATS_KEY, f"{self.mode}:crop_bytes", crop_total)
+            pipe.hincrby(STATS_KEY, f"{self.mode}:broker_bytes", broker_total)
+            pipe.hincrbyfloat(STATS_KEY, f"{self.mode}:encode_ms", encode_total * 1000.0)
+            pipe.info("memory")
+            used_memory = pipe.execute()[-1].get("used_memory_human")
+        except Exception as e:
+            log.debug("CropPayloadCodec: stats publish failed: %s", e)
+
+        log.info(
+            "LPR payload stats (mode=%s, last %d tasks): avg_crop=%.1fKB avg_broker=%.1fKB "
+            "avg_encode=%.3fms redis_used_memory=%s",
+            self.mode, count,
+            crop_total / count / 1024.0, broker_total / count / 1024.0,
+            encode_total / count * 1000.0, used_memory or "n/a",
+        )
+
+
+# ----------------------------
+# Decode (worker side)
+# ----------------------------
+def load_crop_bytes(
+    vehicle_crop_b64: Optional[str] = None,
+    vehicle_crop_ref: Optional[str] = None,
+    redis_client=None,
+) -> bytes:
+    """Return the JPEG bytes for either payload form; raise ValueError if gone."""
+    if vehicle_crop_b64:
+        return base64.b64decode(vehicle_crop_b64)
+    if not vehicle_crop_ref:
+        raise ValueError("Task has neither vehicle_crop_b64 nor vehicle_crop_ref")
+
+    kind, _, key = vehicle_crop_ref.partition(":")
+    if kind == "blob":
+        path = _blob_path(key)
+        if not path.exists():
+            raise ValueError(f"Crop blob missing or expired: {vehicle_crop_ref}")
+        return path.read_bytes()
+    if kind == "redis":
+        data = (redis_client or _redis_client()).get(REDIS_KEY_PREFIX + key)
+        if data is None:
+            raise ValueError(f"Crop key missing or expired: {vehicle_crop_ref}")
+        return data
+    raise ValueError(f"Unknown crop reference: {vehicle_crop_ref}")
+
+
+def release_crop_ref(vehicle_crop_ref: Optional[str], redis_client=None) -> None:
+    """Drop an offloaded crop once the task no longer needs it (best effort).
+
+    The ref belongs to one task (see ``_payload_key``), so this never removes
+    a payload another task is still waiting for.
+    """
+    if not vehicle_crop_ref:
+        return
+    kind, _, key = vehicle_crop_ref.partition(":")
+    try:
+        if kind == "blob":
+            _blob_path(key).unlink(missing_ok=True)
+        elif kind == "redis":
+            (redis_client or _redis_client()).delete(REDIS_KEY_PREFIX + key)
+    except Exception as e:
+        log.debug("release_crop_ref(%s) failed: %s", vehicle_crop_ref, e)
+
+
+def describe_payload(kwargs: Dict[str, Any]) -> str:
+    if kwargs.get("vehicle_crop_ref"):
+        return str(kwargs["vehicle_crop_ref"])
+    return f"inline:{len(kwargs.get('vehicle_crop_b64') or '')}B"
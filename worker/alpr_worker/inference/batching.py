@@ -0,0 +1,189 @@
+"""
+batching.py — Micro-batched Detector / OCR
+============================================
+
+With a threaded Celery pool several ``process_lpr_task`` calls run at once,
+each doing one detect + one OCR. This module gathers those concurrent calls
+into small batches (``detect_batch`` / ``read_plates``) so the GPU sees one
+forward pass per batch instead of one per task.
+
+A batch is flushed when it reaches ``LPR_BATCH_MAX_SIZE`` items or when the
+oldest item has waited ``LPR_BATCH_MAX_WAIT_MS``. With ``pool=solo`` only one
+task runs at a time, so every batch has size 1 and the only cost is the wait
+— keep it disabled there.
+
+ENV:
+  LPR_BATCH_ENABLED=false       wrap detector/OCR singletons in batching proxies
+  LPR_BATCH_MAX_SIZE=8          max items per batch
+  LPR_BATCH_MAX_WAIT_MS=8       max time the first item waits for company
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect submitted items on a daemon thread and run ``batch_fn`` on them.
+
+    ``batch_fn`` receives a list of items and must return one result per item,
+    in order; a result that is an ``Exception`` is raised to that item's caller.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_size: int,
+        max_wait_ms: float,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name} batch returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                log.exception("%s batch of %d failed", self.name, len(items))
+                results = [e] * len(items)
+
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            if len(items) > 1:
+                log.debug("%s batch size=%d", self.name, len(items))
+
+
+class BatchedDetector:
+    """Drop-in for a plate detector whose ``detect`` calls are micro-batched."""
+
+    def __init__(self, detector: Any, max_size: int, max_wait_ms: float):
+        self._detector = detector
+        self._batcher = MicroBatcher("detect", detector.detect_batch, max_size, max_wait_ms)
+
+    def detect(self, bgr: np.ndarray):
+        return self._batcher(bgr)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._detector, name)
+
+
+class BatchedOCR:
+    """Drop-in for ``PlateOCR`` whose ``read_plate`` calls are micro-batched."""
+
+    def __init__(self, ocr: Any, max_size: int, max_wait_ms: float):
+        self._ocr = ocr
+        self._batcher = MicroBatcher("ocr", self._read_batch, max_size, max_wait_ms)
+
+    def read_plate(
+        self,
+        crop: Any,
+        debug_dir: Optional[Path] = None,
+        debug_id: Optional[str] = None,
+        camera_id: str = "",
+    ):
+        return self._batcher((crop, debug_dir, debug_id, camera_id))
+
+    def read(self, crop: Any):
+        return self.read_plate(crop)
+
+    def _read_batch(self, items: List[Tuple[Any, Optional[Path], Optional[str], str]]) -> List[Any]:
+        results: List[Any] = [None] * len(items)
+        # read_plates takes one debug_dir per call, so group on it.
+        groups: dict = {}
+        for i, (_, debug_dir, _, _) in enumerate(items):
+            groups.setdefault(debug_dir, []).append(i)
+
+        for debug_dir, indices in groups.items():
+            crops = [items[i][0] for i in indices]
+            debug_ids = [items[i][2] for i in indices]
+            camera_ids = [items[i][3] for i in indices]
+            try:
+                group_results = self._ocr.read_plates(
+                    crops, debug_dir=debug_dir, debug_ids=debug_ids, camera_ids=camera_ids
+                )
+            except Exception:
+                # One bad crop must not fail its neighbours; retry one by one.
+                group_results = []
+                for crop, debug_id, camera_id in zip(crops, debug_ids, camera_ids):
+                    try:
+                        group_results.append(
+                            self._ocr.read_plate(crop, debug_dir=debug_dir, debug_id=debug_id, camera_id=camera_id)
+                        )
+                    except Exception as e:
+                        group_results.append(e)
+            for i, result in zip(indices, group_results):
+                results[i] = result
+        return results
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._ocr, name)
+
+
+def batching_enabled() -> bool:
+    return os.getenv("LPR_BATCH_ENABLED", "false").lower() == "true"
+
+
+def _batch_settings() -> Tuple[int, float]:
+    return (
+        int(os.getenv("LPR_BATCH_MAX_SIZE", "8")),
+        float(os.getenv("LPR_BATCH_MAX_WAIT_MS", "8")),
+    )
+
+
+def wrap_detector(detector: Any) -> Any:
+    max_size, max_wait_ms = _batch_settings()
+    log.info("Detector micro-batching: max_size=%d max_wait_ms=%.1f", max_size, max_wait_ms)
+    return BatchedDetector(detector, max_size, max_wait_ms)
+
+
+def wrap_ocr(ocr: Any) -> Any:
+    max_size, max_wait_ms = _batch_settings()
+    log.info("OCR micro-batching: max_size=%d max_wait_ms=%.1f", max_size, max_wait_ms)
+    return BatchedOCR(ocr, max_size, max_wait_ms)
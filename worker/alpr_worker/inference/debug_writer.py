@@ -0,0 +1,291 @@
+"""
+debug_writer.py — Background OCR Debug Artifacts
+==================================================
+
+PlateOCR keeps a debug set (crop, every variant it built, ocr_summary.json)
+for reads that trip ``_should_debug`` — on bad-weather days most of them.
+Encoding and writing those PNGs inside the task doubled its disk I/O, so the
+task now hands the already-built image buffers to a single background thread
+and never touches the disk itself:
+
+  sample   a per-camera fraction of debug-flagged reads is kept, chosen by a
+           hash of the debug id (stable across retries and worker children)
+  queue    bounded; when it is full the set is dropped, not written inline
+  quota    after each write the oldest read directories under the debug root
+           are deleted until it is back under OCR_DEBUG_MAX_MB
+
+Paths are decided up front, so ``raw["debug_artifacts"]`` lists them at once
+with ``status`` queued / written / sampled_out / dropped. Counts:
+``lpr_ocr_debug_total{result=...}`` when prometheus_client is installed, and
+``snapshot()``.
+
+The buffers are not copied: callers must not modify them after ``submit``
+(PlateOCR's variants and crop are not touched once the read is finished).
+
+ENV:
+  OCR_DEBUG_ASYNC=true
+  OCR_DEBUG_QUEUE_SIZE=32           pending debug sets (full → dropped)
+  OCR_DEBUG_SAMPLE_RATE=1.0         fraction of debug-flagged reads kept
+  OCR_DEBUG_SAMPLE_RATES=           per-camera overrides, JSON {"cam1": 0.1}
+  OCR_DEBUG_MAX_MB=2048             quota for the debug root (0 = no rotation)
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Counter
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# Other worker children write into the same root; re-measure it this often.
+_RESCAN_SEC = 60.0
+
+_debug_counter = None
+
+
+def _counter():
+    global _debug_counter
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if _debug_counter is None:
+        _debug_counter = Counter("lpr_ocr_debug", "OCR debug artifact sets", ["result"])
+    return _debug_counter
+
+
+@dataclass
+class DebugJob:
+    root: Path
+    image: np.ndarray
+    variant_images: List[Tuple[str, np.ndarray]]
+    summary: Dict[str, Any]
+
+
+def _load_sample_rates(raw: str) -> Dict[str, float]:
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        log.warning("Invalid OCR_DEBUG_SAMPLE_RATES JSON; ignoring.")
+        return {}
+    rates: Dict[str, float] = {}
+    for camera_id, rate in (data.items() if isinstance(data, dict) else []):
+        try:
+            rates[str(camera_id)] = max(0.0, min(1.0, float(rate)))
+        except (TypeError, ValueError):
+            continue
+    return rates
+
+
+class DebugArtifactWriter:
+    """Single daemon thread that encodes and writes OCR debug sets, within a disk quota."""
+
+    def __init__(self):
+        self.enabled = os.getenv("OCR_DEBUG_ASYNC", "true").lower() == "true"
+        self.queue_size = max(1, int(os.getenv("OCR_DEBUG_QUEUE_SIZE", "32")))
+        self.sample_rate = max(0.0, min(1.0, float(os.getenv("OCR_DEBUG_SAMPLE_RATE", "1.0"))))
+        self.sample_rates = _load_sample_rates(os.getenv("OCR_DEBUG_SAMPLE_RATES", ""))
+        self.max_bytes = int(float(os.getenv("OCR_DEBUG_MAX_MB", "2048")) * 1024 * 1024)
+
+        self._queue: "queue.Queue[Optional[DebugJob]]" = queue.Queue(maxsize=self.queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+        # quota bookkeeping, writer thread only: debug root -> {read dir: bytes}, oldest first
+        self._usage: Dict[Path, "OrderedDict[Path, int]"] = {}
+        self._scanned_at: Dict[Path, float] = {}
+
+        log.info(
+            "DebugArtifactWriter: async=%s queue_size=%d sample_rate=%.2f per_camera=%d max_mb=%.0f",
+            self.enabled, self.queue_size, self.sample_rate, len(self.sample_rates),
+            self.max_bytes / (1024 * 1024),
+        )
+
+    def submit(
+        self,
+        debug_dir: Path,
+        debug_id: str,
+        image: np.ndarray,
+        variant_images: List[Tuple[str, np.ndarray]],
+        summary: Dict[str, Any],
+        camera_id: str = "",
+    ) -> Dict[str, Any]:
+        """Queue a debug set; returns its planned paths and what happened to it."""
+        root = Path(debug_dir) / debug_id
+        paths = {"crop": str(root / "crop.png")}
+        paths.update((name, str(root / f"{name}.png")) for name, _ in variant_images)
+        paths["summary"] = str(root / "ocr_summary.json")
+        result: Dict[str, Any] = {"dir": str(root), "artifacts": paths}
+
+        if not self.sampled(debug_id, camera_id):
+            return self._record(result, "sampled_out")
+
+        job = DebugJob(root=root, image=image, variant_images=list(variant_images), summary=summary)
+        if not self.enabled:
+            self._write(job)
+            return self._record(result, "written")
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            log.debug("DebugArtifactWriter queue full; dropping %s", root)
+            return self._record(result, "dropped")
+        return self._record(result, "queued")
+
+    def sampled(self, debug_id: str, camera_id: str = "") -> bool:
+        rate = self.sample_rates.get(camera_id, self.sample_rate)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        return zlib.crc32(debug_id.encode("utf-8")) / 2 ** 32 < rate
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until every queued set has been attempted."""
+        if self._thread is None:
+            return
+        if timeout is None:
+            self._queue.join()
+            return
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        done.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["pending"] = self._queue.qsize()
+        return counts
+
+    def _record(self, result: Dict[str, Any], status: str) -> Dict[str, Any]:
+        self._count(status)
+        result["status"] = status
+        return result
+
+    def _count(self, status: str) -> None:
+        counter = _counter()
+        if counter is not None:
+            counter.labels(result=status).inc()
+        with self._lock:
+            self._counts[status] = self._counts.get(status, 0) + 1
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="ocr-debug-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(job)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, job: DebugJob) -> None:
+        try:
+            job.root.mkdir(parents=True, exist_ok=True)
+            written = 0
+            for name, image in [("crop", job.image)] + job.variant_images:
+                ok, encoded = cv2.imencode(".png", image)
+                if not ok:
+                    continue
+                (job.root / f"{name}.png").write_bytes(encoded.tobytes())
+                written += len(encoded)
+            summary = json.dumps(job.summary, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+            (job.root / "ocr_summary.json").write_bytes(summary)
+            written += len(summary)
+        except Exception as e:
+            log.error("DebugArtifactWriter failed to write %s: %s", job.root, e)
+            return
+        self._enforce_quota(job.root, written)
+
+    # ----------------------------
+    # Quota rotation
+    # ----------------------------
+    def _enforce_quota(self, read_dir: Path, written: int) -> None:
+        if self.max_bytes <= 0:
+            return
+        base = read_dir.parent
+        now = time.monotonic()
+        if base not in self._usage or now - self._scanned_at.get(base, 0.0) > _RESCAN_SEC:
+            self._usage[base] = self._scan(base)
+            self._scanned_at[base] = now
+        else:
+            usage = self._usage[base]
+            usage.pop(read_dir, None)
+            usage[read_dir] = written
+
+        usage = self._usage[base]
+        total = sum(usage.values())
+        while total > self.max_bytes and len(usage) > 1:
+            oldest, size = usage.popitem(last=False)
+            shutil.rmtree(oldest, ignore_errors=True)
+            total -= size
+            self._count("rotated")
+
+    @staticmethod
+    def _scan(base: Path) -> "OrderedDict[Path, int]":
+        """Read directories under ``base`` by mtime, oldest first, with their sizes."""
+        entries = []
+        try:
+            listing = list(os.scandir(base))
+        except OSError as e:
+            log.warning("Could not measure debug dir %s: %s", base, e)
+            listing = []
+        for entry in listing:
+            try:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                size = 0
+                mtime = entry.stat().st_mtime
+                for sub in os.scandir(entry.path):
+                    if sub.is_file(follow_symlinks=False):
+                        stat = sub.stat()
+                        size += stat.st_size
+                        mtime = max(mtime, stat.st_mtime)
+            except OSError:
+                # removed by another worker child's rotation meanwhile
+                continue
+            entries.append((mtime, Path(entry.path), size))
+        entries.sort()
+        return OrderedDict((path, size) for _, path, size in entries)
+
+
+_writer: Optional[DebugArtifactWriter] = None
+
+
+def get_debug_writer() -> DebugArtifactWriter:
+    global _writer
+    if _writer is None:
+        _writer = DebugArtifactWriter()
+        atexit.register(_writer.flush, 10.0)
+    return _writer
@@ -3,8 +3,9 @@ import uuid
 import logging
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional, Union
 import cv2
+import numpy as np
 
 
 @dataclass
@@ -12,6 +13,7 @@ class DetectionResult:
     crop_path: str
     det_conf: float
     bbox: dict
+    crop: Optional[np.ndarray] = None
 
 
 class PlateDetector:
@@ -34,6 +36,8 @@ class PlateDetector:
         self.iou = float(os.getenv("DETECTOR_IOU", "0.45"))
         self.imgsz = int(os.getenv("DETECTOR_IMGSZ", "640"))
         self.class_id = int(os.getenv("DETECTOR_CLASS_ID", "0"))
+        # "0" = first GPU, "cpu" for laptops / CI; empty = GPU 0 if CUDA is available
+        self.device = os.getenv("DETECTOR_DEVICE", "").strip() or self._default_device()
 
         preferred_fallbacks = ["/models/best.engine", "/models/best.pt", "/models/best.onnx"]
 
@@ -95,6 +99,14 @@ class PlateDetector:
         # IMPORTANT: Specify task explicitly
         self.yolo = self._load_yolo_model(self.model_path)
 
+    @staticmethod
+    def _default_device() -> str:
+        try:
+            import torch
+            return "0" if torch.cuda.is_available() else "cpu"
+        except ImportError:
+            return "cpu"
+
     def _find_non_engine_fallback(self) -> Optional[str]:
         for fallback in ["/models/best.pt", "/models/best.onnx"]:
             if Path(fallback).exists():
@@ -121,25 +133,20 @@ class PlateDetector:
             raise
 
 
-    def detect_and_crop(self, image_path: str) -> DetectionResult:
-        img_path = Path(image_path)
-        if not img_path.exists():
-            raise RuntimeError(f"Image not found: {image_path}")
-
-        # Fallback conf: ถ้า detect ไม่เจอที่ conf ปกติ ลองลด conf ลง
-        fallback_conf = max(0.15, self.conf * 0.5)
+    def _predict(self, source, conf: float):
+        return self.yolo.predict(
+            source=source,
+            imgsz=self.imgsz,
+            conf=conf,
+            iou=self.iou,
+            classes=[self.class_id],
+            verbose=False,
+            device=self.device,
+        )
 
-        # Run prediction (works for .engine and .pt)
+    def _predict_with_engine_fallback(self, source, conf: float):
         try:
-            results = self.yolo.predict(
-                source=str(img_path),
-                imgsz=self.imgsz,
-                conf=self.conf,
-                iou=self.iou,
-                classes=[self.class_id],
-                verbose=False,
-                device=0,  # change if needed
-            )
+            return self._predict(source, conf)
         except Exception as e:
             if self.model_path.endswith(".engine"):
                 fallback = self._find_non_engine_fallback()
@@ -151,41 +158,79 @@ class PlateDetector:
                         fallback,
                     )
                     self.yolo = self._load_yolo_model(fallback)
-                    results = self.yolo.predict(
-                        source=str(img_path),
-                        imgsz=self.imgsz,
-                        conf=self.conf,
-                        iou=self.iou,
-                        classes=[self.class_id],
-                        verbose=False,
-                        device=0,
-                    )
-                else:
-                    raise
-            else:
-                raise
+                    return self._predict(source, conf)
+            raise
+
+    def detect(self, bgr: np.ndarray) -> DetectionResult:
+        """Detect the best plate in an in-memory BGR image.
+
+        Returns the plate crop as an ndarray (``crop``) without touching disk;
+        ``crop_path`` stays empty until the caller persists the crop.
+        """
+        result = self.detect_batch([bgr])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
 
-        if not results or results[0] is None:
+    def detect_batch(self, images: List[np.ndarray]) -> List[Union[DetectionResult, Exception]]:
+        """Detect plates for several BGR images with one batched predict call.
+
+        Per-image failures are returned in place as exceptions. If the model
+        rejects a multi-image batch (e.g. a static-batch engine), the images
+        are predicted one by one instead.
+        """
+        results: List[Union[DetectionResult, Exception]] = [
+            RuntimeError("Empty image passed to detector") for _ in images
+        ]
+        valid = [(i, img) for i, img in enumerate(images) if img is not None and img.size > 0]
+        if not valid:
+            return results
+
+        sources = [img for _, img in valid]
+        try:
+            preds = self._predict_with_engine_fallback(sources if len(sources) > 1 else sources[0], self.conf)
+        except Exception as e:
+            if len(sources) == 1:
+                results[valid[0][0]] = e
+                return results
+            self.log.warning("Batched predict failed (%s); predicting %d images one by one", e, len(sources))
+            preds = []
+            for img in sources:
+                try:
+                    preds.append(self._predict_with_engine_fallback(img, self.conf)[0])
+                except Exception as single_error:
+                    preds.append(single_error)
+
+        if not preds or len(preds) != len(valid):
+            for i, _ in valid:
+                results[i] = RuntimeError("No YOLO results returned")
+            return results
+
+        for (i, bgr), r0 in zip(valid, preds):
+            if isinstance(r0, Exception):
+                results[i] = r0
+                continue
+            try:
+                results[i] = self._crop_best(bgr, r0)
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def _crop_best(self, bgr: np.ndarray, r0) -> DetectionResult:
+        # Fallback conf: ถ้า detect ไม่เจอที่ conf ปกติ ลองลด conf ลง
+        fallback_conf = max(0.15, self.conf * 0.5)
+
+        if r0 is None:
             raise RuntimeError("No YOLO results returned")
 
-        r0 = results[0]
         if r0.boxes is None or len(r0.boxes) == 0:
             # FALLBACK: ลอง detect อีกครั้งที่ conf ต่ำลง
             if fallback_conf < self.conf:
-                results = self.yolo.predict(
-                    source=str(img_path),
-                    imgsz=self.imgsz,
-                    conf=fallback_conf,
-                    iou=self.iou,
-                    classes=[self.class_id],
-                    verbose=False,
-                    device=0,
-                )
+                results = self._predict(bgr, fallback_conf)
                 if results and results[0] is not None:
                     r0 = results[0]
                     if r0.boxes is not None and len(r0.boxes) > 0:
-                        import logging
-                        logging.getLogger(__name__).info(
+                        self.log.info(
                             "FALLBACK detection succeeded at conf=%.2f (primary=%.2f)",
                             fallback_conf, self.conf
                         )
@@ -203,11 +248,6 @@ class PlateDetector:
 
         x1, y1, x2, y2 = [int(round(v)) for v in xyxy]
 
-        # load original image for cropping
-        bgr = cv2.imread(str(img_path))
-        if bgr is None:
-            raise RuntimeError(f"Cannot read image: {image_path}")
-
         h, w = bgr.shape[:2]
         x1 = max(0, min(x1, w - 1))
         x2 = max(0, min(x2, w - 1))
@@ -217,10 +257,6 @@ class PlateDetector:
         if x2 <= x1 or y2 <= y1:
             raise RuntimeError(f"Invalid crop box: {(x1, y1, x2, y2)}")
 
-        crop = bgr[y1:y2, x1:x2]
-        out_path = self.crop_dir / f"{uuid.uuid4().hex}.jpg"
-        cv2.imwrite(str(out_path), crop)
-
         meta = {
             "xyxy": [x1, y1, x2, y2],
             "score": score,
@@ -229,7 +265,30 @@ class PlateDetector:
         }
 
         return DetectionResult(
-            crop_path=str(out_path),
+            crop_path="",
             det_conf=score,
             bbox=meta,
+            crop=bgr[y1:y2, x1:x2],
         )
+
+    def detect_and_crop(self, image: Union[str, np.ndarray]) -> DetectionResult:
+        """Detect a plate and write the crop to ``STORAGE_DIR/crops``.
+
+        Accepts an image path or an in-memory BGR image. Callers that keep the
+        pipeline in memory should use :meth:`detect` instead.
+        """
+        if isinstance(image, np.ndarray):
+            bgr = image
+        else:
+            img_path = Path(image)
+            if not img_path.exists():
+                raise RuntimeError(f"Image not found: {image}")
+            bgr = cv2.imread(str(img_path))
+            if bgr is None:
+                raise RuntimeError(f"Cannot read image: {image}")
+
+        det = self.detect(bgr)
+        out_path = self.crop_dir / f"{uuid.uuid4().hex}.jpg"
+        cv2.imwrite(str(out_path), det.crop)
+        det.crop_path = str(out_path)
+        return det
@@ -0,0 +1,278 @@
+"""
+easyocr_batch.py — Batched EasyOCR recognition
+================================================
+
+``easyocr.Reader.readtext`` runs CRAFT + recognizer for one image at a time,
+and the recognizer only batches boxes of that single image. For many small
+plate images (variants × plates) this module runs CRAFT per image and then
+feeds *all* text boxes from *all* images through one ``get_text`` call.
+
+Relies on easyocr 1.7 internals (``get_image_list`` / ``get_text``); if they
+are missing, or the reader runs on CPU (where easyocr itself recognizes box by
+box), it falls back to per-image ``readtext`` so results stay identical.
+
+Shared boxes (``detect_text_boxes`` + ``readtext_shared_boxes``): plate
+variants that are photometric transforms or plain rescales of one crop have
+the same text geometry, so CRAFT runs once on the crop and its boxes are
+scaled onto each variant; only the recognizer runs per variant.
+
+``recognize_line_probabilities`` returns the recognizer's per-step softmax
+for whole-line strips instead of decoded text, for the grammar-constrained
+CTC decoder (plate_grammar.py).
+
+When a stage trace is active (timing.py), per-image ``readtext`` calls are
+timed as ``ocr.variant.<label>``; the batched path records ``ocr.craft`` and
+``ocr.recognize_batched`` instead.
+
+``map_fn`` (e.g. ``VariantPool.map``, variant_pool.py) runs the per-image
+CPU calls in parallel; it must return results in input order.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .timing import current_timer
+
+log = logging.getLogger(__name__)
+
+try:
+    from easyocr.config import imgH as _EASYOCR_IMG_H
+    from easyocr.recognition import AlignCollate as _EasyocrAlignCollate
+    from easyocr.recognition import get_text as _easyocr_get_text
+    from easyocr.utils import get_image_list as _easyocr_get_image_list
+    from easyocr.utils import reformat_input as _easyocr_reformat_input
+    EASYOCR_INTERNALS_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on installed easyocr
+    EASYOCR_INTERNALS_AVAILABLE = False
+
+Detection = Tuple[Any, str, float]
+# ordered map: map_fn(fn, items) == [fn(item) for item in items]
+MapFn = Callable[[Callable[[Any], Any], Sequence[Any]], List[Any]]
+
+
+def _map_each(fn: Callable[[Any], Any], items: Sequence[Any]) -> List[Any]:
+    return [fn(item) for item in items]
+
+# readtext() keyword arguments that belong to the CRAFT detection step.
+_DETECT_KWARGS = {
+    "min_size", "text_threshold", "low_text", "link_threshold", "canvas_size",
+    "mag_ratio", "slope_ths", "ycenter_ths", "height_ths", "width_ths",
+    "add_margin", "threshold", "bbox_min_score", "bbox_min_size", "max_candidates",
+}
+
+
+@dataclass
+class TextBoxes:
+    """CRAFT output for one image: ``[x_min, x_max, y_min, y_max]`` boxes and
+    free-form 4-point boxes, plus the size of the image they belong to."""
+
+    horizontal: List[List[int]]
+    free: List[List[List[float]]]
+    height: int
+    width: int
+
+    def scaled_to(self, height: int, width: int) -> Tuple[List[List[int]], List[List[List[float]]]]:
+        sx = width / float(self.width)
+        sy = height / float(self.height)
+        if sx == 1.0 and sy == 1.0:
+            return self.horizontal, self.free
+        horizontal = [
+            [int(round(x0 * sx)), int(round(x1 * sx)), int(round(y0 * sy)), int(round(y1 * sy))]
+            for x0, x1, y0, y1 in self.horizontal
+        ]
+        free = [[[x * sx, y * sy] for x, y in box] for box in self.free]
+        return horizontal, free
+
+
+def can_batch(reader: Any, batch_size: int) -> bool:
+    return (
+        EASYOCR_INTERNALS_AVAILABLE
+        and batch_size > 1
+        and str(getattr(reader, "device", "cpu")) != "cpu"
+    )
+
+
+def readtext_batch(
+    reader: Any,
+    images: Sequence[np.ndarray],
+    *,
+    allowlist: str,
+    batch_size: int = 1,
+    labels: Optional[Sequence[str]] = None,
+    map_fn: Optional[MapFn] = None,
+    **kwargs: Any,
+) -> List[List[Detection]]:
+    """``reader.readtext(img, detail=1, allowlist=...)`` for every image, batched.
+
+    Returns one detection list per input image, in input order. ``labels``
+    (e.g. variant names) only name the per-image timing stages.
+    """
+    if not images:
+        return []
+    if not can_batch(reader, batch_size):
+        return _readtext_each(reader, images, labels, allowlist, kwargs, map_fn)
+
+    timer = current_timer()
+    detect_kwargs = {k: v for k, v in kwargs.items() if k in _DETECT_KWARGS}
+    try:
+        image_lists: List[List[Tuple[Any, np.ndarray]]] = []
+        max_width = 0
+        with timer.stage("ocr.craft"):
+            for img in images:
+                img_color, img_grey = _easyocr_reformat_input(img)
+                horizontal_list, free_list = reader.detect(img_color, reformat=False, **detect_kwargs)
+                image_list, width = _easyocr_get_image_list(
+                    horizontal_list[0], free_list[0], img_grey, model_height=_EASYOCR_IMG_H
+                )
+                image_lists.append(image_list)
+                if image_list:
+                    max_width = max(max_width, int(width))
+        with timer.stage("ocr.recognize_batched"):
+            return recognize_image_lists(reader, image_lists, max_width, allowlist=allowlist, batch_size=batch_size)
+    except Exception as e:
+        log.warning("Batched EasyOCR recognition failed (%s); falling back to readtext", e)
+        return _readtext_each(reader, images, labels, allowlist, kwargs, map_fn)
+
+
+def _readtext_each(
+    reader: Any,
+    images: Sequence[np.ndarray],
+    labels: Optional[Sequence[str]],
+    allowlist: str,
+    kwargs: Any,
+    map_fn: Optional[MapFn] = None,
+) -> List[List[Detection]]:
+    timer = current_timer()
+    labels = list(labels) if labels is not None else [str(i) for i in range(len(images))]
+
+    def read(item: Tuple[np.ndarray, str]) -> List[Detection]:
+        img, label = item
+        with timer.stage(f"ocr.variant.{label}"):
+            return reader.readtext(img, detail=1, allowlist=allowlist, paragraph=False, **kwargs)
+
+    return (map_fn or _map_each)(read, list(zip(images, labels)))
+
+
+def recognize_image_lists(
+    reader: Any,
+    image_lists: Sequence[List[Tuple[Any, np.ndarray]]],
+    max_width: int,
+    *,
+    allowlist: str,
+    batch_size: int,
+) -> List[List[Detection]]:
+    """Run one recognizer pass over pre-cropped boxes of several images."""
+    flat = [item for image_list in image_lists for item in image_list]
+    if not flat:
+        return [[] for _ in image_lists]
+
+    ignore_char = "".join(set(reader.character) - set(allowlist))
+    recognized = _easyocr_get_text(
+        reader.character, _EASYOCR_IMG_H, int(max_width), reader.recognizer, reader.converter, flat,
+        ignore_char, "greedy", 5, batch_size, 0.1, 0.5, 0.003, 0, reader.device,
+    )
+
+    out: List[List[Detection]] = []
+    offset = 0
+    for image_list in image_lists:
+        count = len(image_list)
+        out.append([(box, text, float(conf)) for box, text, conf in recognized[offset:offset + count]])
+        offset += count
+    return out
+
+
+def detect_text_boxes(reader: Any, image: np.ndarray, **kwargs: Any) -> TextBoxes:
+    """Run CRAFT once (same options as ``readtext``) and keep the raw boxes."""
+    detect_kwargs = {k: v for k, v in kwargs.items() if k in _DETECT_KWARGS}
+    img_color, img_grey = _easyocr_reformat_input(image)
+    horizontal_list, free_list = reader.detect(img_color, reformat=False, **detect_kwargs)
+    height, width = img_grey.shape[:2]
+    return TextBoxes(horizontal_list[0], free_list[0], height, width)
+
+
+def readtext_shared_boxes(
+    reader: Any,
+    items: Sequence[Tuple[TextBoxes, np.ndarray]],
+    *,
+    allowlist: str,
+    batch_size: int = 1,
+    labels: Optional[Sequence[str]] = None,
+    map_fn: Optional[MapFn] = None,
+) -> List[List[Detection]]:
+    """Recognize each image on boxes detected elsewhere (see ``TextBoxes``).
+
+    Output matches ``readtext(img, detail=1, paragraph=False)`` minus the
+    CRAFT pass: boxes are in each image's own coordinates. Batched across
+    images when ``can_batch``; otherwise box by box, as easyocr does on CPU.
+    """
+    if not items:
+        return []
+    timer = current_timer()
+    scaled = []
+    for boxes, img in items:
+        _, img_grey = _easyocr_reformat_input(img)
+        scaled.append((img_grey, *boxes.scaled_to(*img_grey.shape[:2])))
+
+    if can_batch(reader, batch_size):
+        with timer.stage("ocr.recognize_shared"):
+            image_lists: List[List[Tuple[Any, np.ndarray]]] = []
+            max_width = 0
+            for img_grey, horizontal, free in scaled:
+                image_list, width = _easyocr_get_image_list(horizontal, free, img_grey, model_height=_EASYOCR_IMG_H)
+                image_lists.append(image_list)
+                if image_list:
+                    max_width = max(max_width, int(width))
+            return recognize_image_lists(reader, image_lists, max_width, allowlist=allowlist, batch_size=batch_size)
+
+    labels = list(labels) if labels is not None else [str(i) for i in range(len(items))]
+
+    def recognize(item: Tuple[Tuple[np.ndarray, Any, Any], str]) -> List[Detection]:
+        (img_grey, horizontal, free), label = item
+        with timer.stage(f"ocr.variant.{label}"):
+            detections: List[Detection] = []
+            for h_list, f_list in [([box], []) for box in horizontal] + [([], [box]) for box in free]:
+                image_list, width = _easyocr_get_image_list(h_list, f_list, img_grey, model_height=_EASYOCR_IMG_H)
+                detections.extend(
+                    recognize_image_lists(reader, [image_list], width, allowlist=allowlist, batch_size=1)[0]
+                )
+            return detections
+
+    return (map_fn or _map_each)(recognize, list(zip(scaled, labels)))
+
+
+def recognize_line_probabilities(reader: Any, images: Sequence[np.ndarray], *, allowlist: str) -> List[np.ndarray]:
+    """Recognizer softmax (time x ``len(reader.converter.character)``) per image.
+
+    Each image is read as a single text line (no CRAFT), in one batch. As in
+    ``get_text``, characters outside ``allowlist`` get zero probability;
+    column 0 is the CTC blank.
+    """
+    import torch
+    from PIL import Image
+
+    crops: List[np.ndarray] = []
+    max_width = 0
+    for img in images:
+        _, img_grey = _easyocr_reformat_input(img)
+        h, w = img_grey.shape[:2]
+        image_list, width = _easyocr_get_image_list([[0, w, 0, h]], [], img_grey, model_height=_EASYOCR_IMG_H)
+        if not image_list:
+            raise ValueError("empty strip")
+        crops.append(image_list[0][1])
+        max_width = max(max_width, int(width))
+
+    charset = reader.converter.character
+    ignore = [i for i, ch in enumerate(charset) if i and ch not in allowlist]
+    collate = _EasyocrAlignCollate(imgH=_EASYOCR_IMG_H, imgW=max_width, keep_ratio_with_pad=True)
+    batch = collate([Image.fromarray(crop, "L") for crop in crops])
+    with torch.no_grad():
+        preds = reader.recognizer(batch.to(reader.device), None)
+    probs = torch.softmax(preds.float(), dim=2).cpu().numpy()
+    probs[:, :, ignore] = 0.0
+    probs /= np.maximum(probs.sum(axis=2, keepdims=True), 1e-12)
+    return [probs[i] for i in range(len(crops))]
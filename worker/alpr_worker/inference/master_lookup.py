@@ -23,6 +23,12 @@ def best_master_match(db: Session, plate_norm: str, max_dist: int = 1):
         return best, best_d
     return None, None
 
+def exact_master_match(db: Session, plate_norm: str):
+    # unique index on plate_text_norm: one indexed lookup (OCR fast tier)
+    if not plate_norm:
+        return None
+    return db.query(models.MasterPlate).filter(models.MasterPlate.plate_text_norm == plate_norm).first()
+
 def assist_with_master(db: Session, plate_text: str, province: str, conf: float):
     norm = normalize_plate_text(plate_text)
     prov = normalize_province(province)
@@ -46,3 +52,15 @@ def assist_with_master(db: Session, plate_text: str, province: str, conf: float)
         "assisted": False,
         "dist": None,
     }
+
+def assist_from_master_hit(hit: dict, province: str, conf: float):
+    """assist_with_master for a read the OCR fast tier already matched exactly
+    (``raw["master_hit"]``), without querying master_plates again."""
+    return {
+        "plate_text": hit["display_text"] or hit["plate_text_norm"],
+        "plate_text_norm": hit["plate_text_norm"],
+        "province": hit["province"] or normalize_province(province),
+        "confidence": max(conf, float(hit["confidence"]) * 0.99),
+        "assisted": True,
+        "dist": 0,
+    }
@@ -1,13 +1,12 @@
 from __future__ import annotations
 
-import itertools
-import json
 import logging
 import os
 import re
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import cv2
 import easyocr
@@ -15,7 +14,20 @@ import numpy as np
 import torch
 from PIL import Image
 
-from .provinces import match_province, normalize_province, province_candidates
+from .debug_writer import get_debug_writer
+from .easyocr_batch import (
+    EASYOCR_INTERNALS_AVAILABLE,
+    TextBoxes,
+    detect_text_boxes,
+    readtext_batch,
+    readtext_shared_boxes,
+    recognize_line_probabilities,
+)
+from .onnx_backend import load_onnx_sessions, use_onnx_backend
+from .plate_grammar import decode_ctc, decode_greedy, decode_positions
+from .plate_layout import PlateLayout, segment_plate
+from .timing import current_timer
+from .provinces import match_province, normalize_province, province_candidates, rank_provinces
 from .postprocess_thai_plate import (
     load_province_prior,
     normalize_plate_text,
@@ -23,6 +35,9 @@ from .postprocess_thai_plate import (
     resolve_province,
 )
 from .validate import is_valid_plate
+from .variant_pool import ThreadBudget, VariantPool
+from .variant_scheduler import VariantScheduler
+from .variants import PlateVariants, capped_scale, normalize_char_height, select_variant_names
 
 log = logging.getLogger(__name__)
 
@@ -120,6 +135,12 @@ _DEFAULT_VARIANT_NAMES = (
     "upscale_otsu_x2",
 )
 _DEFAULT_VARIANT_LIMIT = len(_DEFAULT_VARIANT_NAMES)
+# Variants whose pixels move relative to the crop (not just recolor/rescale)
+# keep their own CRAFT pass in OCR_SHARED_BOXES mode.
+_GEOMETRY_VARIANTS = frozenset({"deskew"})
+# Registration glyphs are roughly this share of a tight plate crop's height;
+# used when the layout segmenter cannot measure them.
+_CHAR_HEIGHT_RATIO = 0.42
 _DEFAULT_TOP_K = 3
 _DEFAULT_CONSENSUS_MIN = 0.55
 _DEFAULT_MARGIN_MIN = 0.16
@@ -137,12 +158,45 @@ class OCRResult:
 
 class PlateOCR:
     def __init__(self) -> None:
-        use_gpu = torch.cuda.is_available()
+        # CPU: variant readtext calls on a thread pool, inside a per-process
+        # thread budget (variant_pool.py); GPU batches them instead.
+        budget = ThreadBudget.from_env()
+        # ONNX Runtime recognizer/detector for CPU-only sites (onnx_backend.py).
+        # Sessions load before any reader exists: on failure every reader is
+        # torch on the device it would have used without OCR_BACKEND=onnx.
+        self.backend = os.getenv("OCR_BACKEND", "torch").strip().lower()
+        onnx_sessions = None
+        if self.backend == "onnx":
+            model_dir = Path(os.getenv("OCR_ONNX_DIR", "/models/easyocr_onnx"))
+            quantized = os.getenv("OCR_ONNX_QUANTIZED", "true").lower() == "true"
+            threads = int(os.getenv("OCR_ONNX_THREADS", "0"))
+            if threads <= 0 and budget.workers > 1:
+                threads = budget.intra_op
+            onnx_sessions = load_onnx_sessions(model_dir, quantized, threads)
+            if onnx_sessions is None:
+                self.backend = "torch"
+        use_gpu = torch.cuda.is_available() and onnx_sessions is None
         self.reader = easyocr.Reader(["th", "en"], gpu=use_gpu, verbose=False)
-        self.thai_reader = easyocr.Reader(["th"], gpu=use_gpu, verbose=False)
+        # ["th"] and ["th","en"] load the same CRAFT + thai_g1 weights and only differ
+        # in the default charset; the province passes always pass the Thai-only
+        # allowlist, so one model set serves both (bin/bench_ocr_memory.py).
+        if os.getenv("OCR_SHARED_READER", "true").lower() == "true":
+            self.thai_reader = self.reader
+        else:
+            self.thai_reader = easyocr.Reader(["th"], gpu=use_gpu, verbose=False)
+        if onnx_sessions is not None:
+            for reader in {id(r): r for r in (self.reader, self.thai_reader)}.values():
+                use_onnx_backend(reader, onnx_sessions)
+        if use_gpu and budget.workers > 1:
+            log.info("OCR_VARIANT_WORKERS ignored on GPU; use OCR_RECOGNIZER_BATCH_SIZE")
+            budget = ThreadBudget(workers=1, intra_op=budget.total, total=budget.total)
+        self.variant_pool = VariantPool(budget)
+        self.variant_pool.apply_budget()
 
         self.variant_names = self._load_variant_names()
         self.variant_limit = int(os.getenv("OCR_VARIANT_LIMIT", str(_DEFAULT_VARIANT_LIMIT)))
+        # Only these are ever built (variants.py builds them lazily per crop)
+        self.selected_variants = select_variant_names(self.variant_names, self.variant_limit)
 
         self.top_k = int(os.getenv("OCR_TOP_K", str(_DEFAULT_TOP_K)))
         self.consensus_min = float(os.getenv("OCR_CONSENSUS_MIN", str(_DEFAULT_CONSENSUS_MIN)))
@@ -150,8 +204,53 @@ class PlateOCR:
         self.debug_confidence_threshold = float(
             os.getenv("OCR_DEBUG_CONFIDENCE_THRESHOLD", str(_DEFAULT_DEBUG_CONFIDENCE_THRESHOLD))
         )
+        # Debug sets are sampled per camera and written off-thread (debug_writer.py)
+        self.debug_writer = get_debug_writer()
         self.province_min_score = float(os.getenv("OCR_PROVINCE_MIN_SCORE", str(_DEFAULT_PROVINCE_MIN_SCORE)))
         self.province_prior = load_province_prior(os.getenv("OCR_PROVINCE_PRIOR", ""))
+        # >1 lets GPU readers recognize the text boxes of many variant images in one batch.
+        self.recognizer_batch_size = int(os.getenv("OCR_RECOGNIZER_BATCH_SIZE", "1"))
+        # Usefulness-ordered variants + consensus early exit (OCR_EARLY_EXIT)
+        self.scheduler = VariantScheduler()
+        # CRAFT once per plate, recognizer per variant on the scaled boxes
+        self.shared_boxes = os.getenv("OCR_SHARED_BOXES", "false").lower() == "true"
+        if self.shared_boxes and not EASYOCR_INTERNALS_AVAILABLE:
+            log.warning("OCR_SHARED_BOXES needs easyocr internals (get_image_list/get_text); disabled")
+            self.shared_boxes = False
+        # Projection / connected-component line segmenter instead of CRAFT
+        self.layout_enabled = os.getenv("OCR_LAYOUT_SEGMENT", "false").lower() == "true"
+        self.layout_min_confidence = float(os.getenv("OCR_LAYOUT_MIN_CONFIDENCE", "0.6"))
+        if self.layout_enabled and not EASYOCR_INTERNALS_AVAILABLE:
+            log.warning("OCR_LAYOUT_SEGMENT needs easyocr internals (get_image_list/get_text); disabled")
+            self.layout_enabled = False
+        # Size normalisation: canonical glyph height + per-variant pixel budget (0 = off)
+        self.target_char_height = float(os.getenv("OCR_TARGET_CHAR_HEIGHT", "0"))
+        self.max_variant_pixels = int(os.getenv("OCR_MAX_VARIANT_PIXELS", "0"))
+        # Grammar-constrained search for confusable swaps (plate_grammar.py)
+        self.grammar_beam_width = int(os.getenv("OCR_GRAMMAR_BEAM_WIDTH", "8"))
+        self.grammar_top_k = int(os.getenv("OCR_GRAMMAR_TOP_K", "6"))
+        # Layout registration strips: decode recognizer output under the plate grammar
+        self.grammar_ctc = os.getenv("OCR_GRAMMAR_CTC", "false").lower() == "true"
+        self.grammar_ctc_beam = int(os.getenv("OCR_GRAMMAR_CTC_BEAM", "10"))
+        if self.grammar_ctc and not EASYOCR_INTERNALS_AVAILABLE:
+            log.warning("OCR_GRAMMAR_CTC needs easyocr internals (AlignCollate/get_image_list); disabled")
+            self.grammar_ctc = False
+        # Province ROI reads ranked against the province trie (provinces.ProvinceLexicon);
+        # a decisive ranking skips the second (line) province pass
+        self.province_lexicon = os.getenv("OCR_PROVINCE_LEXICON", "false").lower() == "true"
+        self.province_decisive_score = float(os.getenv("OCR_PROVINCE_DECISIVE_SCORE", "90"))
+        self.province_decisive_margin = float(os.getenv("OCR_PROVINCE_DECISIVE_MARGIN", "15"))
+        # Two-tier cascade: the first few variants + grammar check; a valid, confident
+        # plate that is already a master plate returns without the full ensemble
+        self.cascade_enabled = os.getenv("OCR_CASCADE", "false").lower() == "true"
+        self.cascade_variants = max(1, int(os.getenv("OCR_CASCADE_VARIANTS", "2")))
+        self.cascade_min_confidence = float(os.getenv("OCR_CASCADE_MIN_CONFIDENCE", "0.9"))
+        # plate text -> master plate dict (tasks.master_hit) or None; set by tasks.load_local_ocr.
+        # A fast-tier read carries the dict as raw["master_hit"] so the task need not query again
+        self.master_lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+
+    def set_master_lookup(self, lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]]) -> None:
+        self.master_lookup = lookup
 
     def _load_variant_names(self) -> List[str]:
         raw = os.getenv("OCR_VARIANTS", "")
@@ -160,23 +259,280 @@ class PlateOCR:
         names = [name.strip() for name in raw.split(",") if name.strip()]
         return names or list(_DEFAULT_VARIANT_NAMES)
 
-    def read(self, crop_path: str) -> OCRResult:
-        return self.read_plate(crop_path)
+    def read(self, crop: Union[str, np.ndarray]) -> OCRResult:
+        return self.read_plate(crop)
 
-    def read_plate(self, crop_path: str, debug_dir: Optional[Path] = None, debug_id: Optional[str] = None) -> OCRResult:
-        img = cv2.imread(crop_path)
-        if img is None:
-            raise RuntimeError(f"Cannot read crop: {crop_path}")
+    def read_plate(
+        self,
+        crop: Union[str, np.ndarray],
+        debug_dir: Optional[Path] = None,
+        debug_id: Optional[str] = None,
+        camera_id: str = "",
+    ) -> OCRResult:
+        """OCR a plate crop given as a file path or an in-memory BGR image."""
+        return self.read_plates([crop], debug_dir=debug_dir, debug_ids=[debug_id], camera_ids=[camera_id])[0]
+
+    def read_plates(
+        self,
+        crops: Sequence[Union[str, np.ndarray]],
+        debug_dir: Optional[Path] = None,
+        debug_ids: Optional[Sequence[Optional[str]]] = None,
+        camera_ids: Optional[Sequence[str]] = None,
+    ) -> List[OCRResult]:
+        """OCR several plate crops, recognizing all their variants in one batch.
+
+        The per-plate ROI / province passes and aggregation still run plate by
+        plate; only the main variant loop is shared across crops. With
+        OCR_EARLY_EXIT the variants run in waves (still batched across the
+        crops that are not yet decided) and a plate stops as soon as its
+        leading candidate is decisive.
+
+        With OCR_CASCADE a fast tier (the first OCR_CASCADE_VARIANTS variants)
+        runs first; plates it settles (``_fast_tier_result``) skip everything
+        else, the rest continue the full read without redoing those variants.
+        With OCR_EARLY_EXIT their exit checks still fall after the same numbers
+        of variants as without the cascade, so an escalated read is the full read.
+        ``raw["ocr_tier"]`` is fast / escalated / full.
+        """
+        debug_ids = list(debug_ids or [None] * len(crops))
+        camera_ids = list(camera_ids or [""] * len(crops))
+        images: List[np.ndarray] = []
+        default_debug_ids: List[str] = []
+        for crop in crops:
+            if isinstance(crop, np.ndarray):
+                img = crop
+                default_debug_ids.append("crop")
+            else:
+                img = cv2.imread(crop)
+                default_debug_ids.append(Path(crop).stem)
+            if img is None or img.size == 0:
+                raise RuntimeError(f"Cannot read crop: {crop if isinstance(crop, str) else 'ndarray'}")
+            images.append(img)
+
+        timer = current_timer()
+        scheduler = self.scheduler
+        measured: List[Optional[PlateLayout]] = [None] * len(images)
+        normalized: List[Optional[Dict[str, float]]] = [None] * len(images)
+        if self.target_char_height > 0:
+            with timer.stage("ocr.normalize"):
+                for i, img in enumerate(images):
+                    layout = segment_plate(img)
+                    if layout.registration is not None and layout.confidence >= self.layout_min_confidence:
+                        char_height = layout.char_height
+                    else:
+                        layout, char_height = None, _CHAR_HEIGHT_RATIO * img.shape[0]
+                    images[i], scale = normalize_char_height(img, char_height, self.target_char_height)
+                    measured[i] = layout.scaled(scale) if layout is not None else None
+                    normalized[i] = {"char_height": round(char_height, 1), "scale": round(scale, 3)}
+
+        # Variant images are built on first use, so an early exit skips the rest.
+        plate_variants = [PlateVariants(img, max_pixels=self.max_variant_pixels) for img in images]
+        variant_order = scheduler.order(self.selected_variants)
+        variant_sets = [variant_order for _ in images]
+
+        variant_results: List[List[Dict[str, Any]]] = [[] for _ in images]
+        early_exit = [False] * len(images)
+        text_boxes: Dict[int, TextBoxes] = {}
+        layouts: List[Optional[PlateLayout]] = [None] * len(images)
+        if self.layout_enabled:
+            with timer.stage("ocr.layout"):
+                for i, img in enumerate(images):
+                    layout = measured[i] or segment_plate(img)
+                    # below the threshold the plate goes through CRAFT as before
+                    if layout.registration is not None and layout.confidence >= self.layout_min_confidence:
+                        layouts[i] = layout
+                        text_boxes[i] = layout.text_boxes()
+
+        fast: Dict[int, OCRResult] = {}
+        cascade = self.cascade_enabled and self.master_lookup is not None
+        if cascade:
+            with timer.stage("ocr.fast_tier"):
+                wave = [
+                    (i, name, plate_variants[i].get(name))
+                    for i, variants in enumerate(variant_sets)
+                    for name in variants[: self.cascade_variants]
+                ]
+                for (i, name, _), detections in zip(wave, self._readtext_wave(images, wave, text_boxes)):
+                    variant_results[i].append(self._evaluate_variant(name, detections))
+                for i in range(len(images)):
+                    schedule = {
+                        "variants_run": len(variant_results[i]),
+                        "variants_available": len(variant_sets[i]),
+                        "early_exit": False,
+                        "layout": layouts[i],
+                        "normalize": normalized[i],
+                    }
+                    result = self._fast_tier_result(variant_results[i], schedule)
+                    if result is not None:
+                        fast[i] = result
+
+        active = [i for i, variants in enumerate(variant_sets) if variants and i not in fast]
+        if cascade and scheduler.enabled:
+            # Escalated plates: make the exit checks a run from zero would have made
+            # within the fast-tier variants, so the read is the same as without the cascade
+            still_active = []
+            for i in active:
+                stop = self._early_exit_within(scheduler, variant_results[i], len(variant_sets[i]))
+                if stop is None:
+                    still_active.append(i)
+                    continue
+                del variant_results[i][stop:]
+                early_exit[i] = True
+            active = still_active
+        while active:
+            wave: List[Tuple[int, str, np.ndarray]] = []
+            for i in active:
+                done = len(variant_results[i])
+                take = scheduler.wave_size(done) if scheduler.enabled else len(variant_sets[i])
+                wave.extend((i, name, plate_variants[i].get(name)) for name in variant_sets[i][done:done + take])
+
+            flat_detections = self._readtext_wave(images, wave, text_boxes)
+            for (i, name, _), detections in zip(wave, flat_detections):
+                variant_results[i].append(self._evaluate_variant(name, detections))
+
+            still_active = []
+            for i in active:
+                if len(variant_results[i]) >= len(variant_sets[i]):
+                    continue
+                best = self._aggregate_plate_candidates(variant_results[i])["best"]
+                if scheduler.is_decisive(best, len(variant_results[i])):
+                    early_exit[i] = True
+                    continue
+                still_active.append(i)
+            active = still_active
 
-        variant_results: List[Dict[str, Any]] = []
-        for variant_name, variant_img in self._build_variants(img):
-            detections = self.reader.readtext(variant_img, detail=1, allowlist=_THAI_ALLOWLIST, width_ths=0.7, paragraph=False)
-            candidate = self._evaluate_variant(variant_name, detections)
-            variant_results.append(candidate)
+        results: List[OCRResult] = []
+        for i, (img, debug_id, default_debug_id) in enumerate(zip(images, debug_ids, default_debug_ids)):
+            if i in fast:
+                results.append(fast[i])
+                continue
+            schedule = {
+                "variants_run": len(variant_results[i]),
+                "variants_available": len(variant_sets[i]),
+                "early_exit": early_exit[i],
+                "layout": layouts[i],
+                "normalize": normalized[i],
+                "tier": "escalated" if cascade else "full",
+            }
+            results.append(
+                self._finish_read(
+                    img, variant_results[i], debug_dir=debug_dir, debug_id=debug_id or default_debug_id,
+                    schedule=schedule, variant_images=plate_variants[i].built(), camera_id=camera_ids[i],
+                )
+            )
+        return results
+
+    def _early_exit_within(
+        self, scheduler: VariantScheduler, results: List[Dict[str, Any]], available: int
+    ) -> Optional[int]:
+        """Variants after which a run from zero stops, if that is within ``results``."""
+        done = 0
+        while True:
+            done += scheduler.wave_size(done)
+            if done > len(results) or done >= available:
+                return None
+            if scheduler.is_decisive(self._aggregate_plate_candidates(results[:done])["best"], done):
+                return done
+
+    def _readtext_wave(
+        self,
+        images: Sequence[np.ndarray],
+        wave: Sequence[Tuple[int, str, np.ndarray]],
+        text_boxes: Dict[int, TextBoxes],
+    ) -> List[List[Any]]:
+        """readtext for ``(plate_index, variant_name, variant_img)`` items, in order.
 
-        topline_variant = self._topline_roi_pass(img)
-        if topline_variant:
-            variant_results.append(topline_variant)
+        ``text_boxes`` caches each plate's CRAFT (or layout) boxes across waves.
+        """
+        shared = [
+            k for k, (i, name, _) in enumerate(wave)
+            if (self.shared_boxes or i in text_boxes) and name not in _GEOMETRY_VARIANTS
+        ]
+        own = [k for k in range(len(wave)) if k not in set(shared)]
+        out: List[List[Any]] = [[] for _ in wave]
+
+        if shared:
+            try:
+                with current_timer().stage("ocr.craft_shared"):
+                    for i in sorted({wave[k][0] for k in shared} - set(text_boxes)):
+                        text_boxes[i] = detect_text_boxes(self.reader, images[i], width_ths=0.7)
+                recognized = readtext_shared_boxes(
+                    self.reader,
+                    [(text_boxes[wave[k][0]], wave[k][2]) for k in shared],
+                    allowlist=_THAI_ALLOWLIST,
+                    batch_size=self.recognizer_batch_size,
+                    labels=[wave[k][1] for k in shared],
+                    map_fn=self.variant_pool.map,
+                )
+                for k, detections in zip(shared, recognized):
+                    out[k] = detections
+            except Exception as e:
+                log.warning("Shared-box OCR failed (%s); running full readtext per variant", e)
+                own = list(range(len(wave)))
+
+        if own:
+            recognized = readtext_batch(
+                self.reader,
+                [wave[k][2] for k in own],
+                allowlist=_THAI_ALLOWLIST,
+                batch_size=self.recognizer_batch_size,
+                labels=[wave[k][1] for k in own],
+                map_fn=self.variant_pool.map,
+                width_ths=0.7,
+            )
+            for k, detections in zip(own, recognized):
+                out[k] = detections
+        return out
+
+    def _readtext_strips(
+        self,
+        reader: Any,
+        variants: Sequence[Tuple[str, np.ndarray]],
+        allowlist: str,
+    ) -> List[List[Any]]:
+        """Recognize each variant image as one text line, without CRAFT."""
+        try:
+            return readtext_shared_boxes(
+                reader,
+                [
+                    (TextBoxes([[0, img.shape[1], 0, img.shape[0]]], [], img.shape[0], img.shape[1]), img)
+                    for _, img in variants
+                ],
+                allowlist=allowlist,
+                batch_size=self.recognizer_batch_size,
+                labels=[name for name, _ in variants],
+                map_fn=self.variant_pool.map,
+            )
+        except Exception as e:
+            log.warning("Strip recognition failed (%s); running full readtext", e)
+            return self.variant_pool.map(
+                lambda variant: reader.readtext(variant[1], detail=1, allowlist=allowlist), variants
+            )
+
+    def _finish_read(
+        self,
+        img: np.ndarray,
+        variant_results: List[Dict[str, Any]],
+        debug_dir: Optional[Path],
+        debug_id: str,
+        schedule: Optional[Dict[str, Any]] = None,
+        variant_images: Optional[List[Tuple[str, np.ndarray]]] = None,
+        camera_id: str = "",
+    ) -> OCRResult:
+        timer = current_timer()
+        schedule = schedule or {
+            "variants_run": len(variant_results),
+            "variants_available": len(variant_results),
+            "early_exit": False,
+        }
+        layout: Optional[PlateLayout] = schedule.get("layout")
+        # An early exit already has a decisive, valid plate; the top-line ROI
+        # pass would only add another vote for it.
+        if not schedule["early_exit"]:
+            with timer.stage("ocr.roi.topline"):
+                topline_variant = self._topline_roi_pass(img, layout)
+            if topline_variant:
+                variant_results.append(topline_variant)
 
         # Digit recovery: ถ้าทุก variant ได้ text < 4 chars ลอง OCR ด้วย upscale สูง
         _max_tlen = max(
@@ -186,30 +542,43 @@ class PlateOCR:
             default=0,
         )
         if _max_tlen < 4:
-            _dr = self._digit_recovery_pass(img)
+            with timer.stage("ocr.roi.digit_recovery"):
+                _dr = self._digit_recovery_pass(img)
             if _dr:
                 variant_results.append(_dr)
 
-        aggregated = self._aggregate_plate_candidates(variant_results)
+        with timer.stage("ocr.aggregate"):
+            aggregated = self._aggregate_plate_candidates(variant_results)
         best = aggregated["best"]
+        self.scheduler.record(
+            variant_results,
+            best["text"],
+            variants_available=schedule["variants_available"],
+            early_exit=schedule["early_exit"],
+        )
 
-        roi_province = self._province_roi_pass(img)
-        line_province = self._province_line_pass(img)
+        with timer.stage("ocr.province.roi"):
+            roi_province = self._province_roi_pass(img, layout)
+        # A layout strip is the same image for both passes, and a decisive lexicon
+        # ranking would not be overturned by the line pass: reuse the ROI reads.
+        if roi_province.get("strip"):
+            province_line_pass = "reused_strip"
+            line_texts = roi_province["line_texts"]
+        elif roi_province.get("decisive"):
+            province_line_pass = "skipped_decisive"
+            line_texts = roi_province["line_texts"]
+        else:
+            province_line_pass = "run"
+            with timer.stage("ocr.province.line"):
+                line_texts = self._province_line_pass(img, layout)["texts"]
         province_info = self._aggregate_province_candidates(
             variant_results,
             roi_province=roi_province,
-            line_texts=line_province["texts"],
+            line_texts=line_texts,
         )
         final_province = province_info["province"]
 
-        flags: List[str] = []
-        if best["consensus_ratio"] < self.consensus_min or best["margin_ratio"] < self.margin_min:
-            flags.append("low_consensus")
-        if self._has_confusable_char(best["text"]):
-            flags.append("confusable_chars")
-        if best["text"]:
-            flags.append("plate_present")
-
+        flags = self._confidence_flags(best)
         confidence = self._calibrate_confidence(best, flags)
 
         if confidence < 0.6:
@@ -223,15 +592,18 @@ class PlateOCR:
         debug_flags = self._should_debug(confidence, best, aggregated)
         debug_artifacts: Dict[str, Any] = {}
         if debug_flags and debug_dir:
-            debug_artifacts = self._save_debug_artifacts(
-                debug_dir=debug_dir,
-                debug_id=debug_id or Path(crop_path).stem,
-                image=img,
-                variant_images=self._build_variants(img),
-                aggregated=aggregated,
-                province_info=province_info,
-                flags=debug_flags,
-            )
+            with timer.stage("ocr.debug"):
+                # only the variants this read built; nothing is rebuilt for debugging
+                debug_artifacts = self._save_debug_artifacts(
+                    debug_dir=debug_dir,
+                    debug_id=debug_id,
+                    image=img,
+                    variant_images=variant_images or [],
+                    aggregated=aggregated,
+                    province_info=province_info,
+                    flags=debug_flags,
+                    camera_id=camera_id,
+                )
 
         display_text = self._format_plate_display(best["text"])
         plate_candidates = [
@@ -258,6 +630,7 @@ class PlateOCR:
                 "line_province_score": province_info.get("line_province_score", 0.0),
                 "roi_province": roi_province,
                 "province_source": province_info.get("source", ""),
+                "province_line_pass": province_line_pass,
                 "plate_candidates": plate_candidates[: self.top_k],
                 "province_candidates": province_info["candidates"][: self.top_k],
                 "plate_suggestions": aggregated.get("suggestions", []),
@@ -266,121 +639,106 @@ class PlateOCR:
                     "margin_ratio": best["margin_ratio"],
                     "variant_count": aggregated["variant_count"],
                 },
+                "variants_run": schedule["variants_run"],
+                "variants_available": schedule["variants_available"],
+                "early_exit": schedule["early_exit"],
+                "ocr_tier": schedule.get("tier", "full"),
+                "normalize": schedule.get("normalize"),
+                "layout": self._layout_summary(layout),
                 "confidence_flags": flags,
                 "debug_flags": debug_flags,
                 "debug_artifacts": debug_artifacts,
             },
         )
 
-    def _build_variants(self, image: np.ndarray) -> List[Tuple[str, np.ndarray]]:
-        h, w = image.shape[:2]
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        clahe = cv2.createCLAHE(clipLimit=2.8, tileGridSize=(8, 8)).apply(gray)
-        adaptive = cv2.adaptiveThreshold(clahe, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 3)
-        otsu = cv2.threshold(clahe, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-        up2 = cv2.resize(clahe, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
-        up2_adaptive = cv2.resize(adaptive, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_NEAREST)
-        up2_otsu = cv2.resize(otsu, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_NEAREST)
-
-        # Green plate mask
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        green_mask = cv2.inRange(hsv, lower_green, upper_green)
-        green_inv = cv2.bitwise_not(green_mask)
-
-        # Yellow plate mask (แท็กซี่, รถสาธารณะ)
-        lower_yellow = np.array([18, 80, 120])
-        upper_yellow = np.array([35, 255, 255])
-        yellow_mask = cv2.inRange(hsv, lower_yellow, upper_yellow)
-        yellow_area = cv2.countNonZero(yellow_mask)
-        is_yellow_plate = yellow_area > (h * w * 0.15)
-        if is_yellow_plate:
-            # สำหรับป้ายเหลือง: แปลงเป็น grayscale แล้ว invert
-            # เพราะตัวอักษรดำบนพื้นเหลือง
-            yellow_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            yellow_inv = cv2.bitwise_not(yellow_gray)
-            yellow_clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(yellow_inv)
-            yellow_thresh = cv2.threshold(yellow_inv, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-        else:
-            yellow_clahe = gray  # fallback — ไม่เพิ่ม variant ถ้าไม่ใช่ป้ายเหลือง
-            yellow_thresh = gray
-            
-        up3 = cv2.resize(clahe, None, fx=3.0, fy=3.0, interpolation=cv2.INTER_CUBIC)
-        up4 = cv2.resize(clahe, None, fx=4.0, fy=4.0, interpolation=cv2.INTER_CUBIC)
-        up4_sharp = cv2.filter2D(up4, -1, np.array([[0,-1,0],[-1,5,-1],[0,-1,0]], dtype=np.float32))
-
-        kernel_close = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        morph_close = cv2.morphologyEx(otsu, cv2.MORPH_CLOSE, kernel_close)
-
-        # Deskew: แก้ป้ายเอียงจาก perspective ของกล้อง
-        deskewed = self._deskew_plate(gray)
-
-        # Sharpen: เพิ่มขอบตัวอักษรให้ชัดขึ้น
-        _sharpen_kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
-        sharpened = cv2.filter2D(clahe, -1, _sharpen_kernel)
-
-        bilateral = cv2.bilateralFilter(gray, 9, 75, 75)
-        bilateral_clahe = cv2.createCLAHE(clipLimit=3.5, tileGridSize=(6, 6)).apply(bilateral)
-
-        variants = [
-            ("gray", gray),
-            ("clahe", clahe),
-            ("adaptive", adaptive),
-            ("otsu", otsu),
-            ("green_mask", green_inv),
-            ("deskew", deskewed),
-            ("sharpen", sharpened),
-            ("bilateral_clahe", bilateral_clahe),
-            ("morph_close", morph_close),
-            ("yellow_clahe", yellow_clahe),
-            ("yellow_thresh", yellow_thresh),
-            ("upscale_x2", up2),
-            ("upscale_adaptive_x2", up2_adaptive),
-            ("upscale_otsu_x2", up2_otsu),
-            ("upscale_x3", up3),
-            ("upscale_x4_sharp", up4_sharp),
-        ]
-
-        if self.variant_names:
-            variants = [variant for variant in variants if variant[0] in self.variant_names]
-        if self.variant_limit:
-            variants = variants[: self.variant_limit]
-        return variants
-    
-    def _deskew_plate(self, gray: np.ndarray) -> np.ndarray:
-        """Deskew a grayscale plate crop using the dominant contour angle.
-
-        Returns the original image when a stable angle cannot be estimated.
+    def _fast_tier_result(
+        self,
+        variant_results: List[Dict[str, Any]],
+        schedule: Dict[str, Any],
+    ) -> Optional[OCRResult]:
+        """Fast-tier read, or None when the plate needs the full ensemble.
+
+        Accepted only if the leading candidate passes the plate grammar, its
+        calibrated confidence reaches OCR_CASCADE_MIN_CONFIDENCE and it is
+        already a master plate; the province comes from the master row, so
+        the ROI / province passes are skipped as well.
         """
-        if gray.size == 0:
-            return gray
-
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
-
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if not contours:
-            return gray
-
-        contour = max(contours, key=cv2.contourArea)
-        if cv2.contourArea(contour) < 0.05 * gray.shape[0] * gray.shape[1]:
-            return gray
-
-        rect = cv2.minAreaRect(contour)
-        angle = float(rect[-1])
+        if not variant_results:
+            return None
+        aggregated = self._aggregate_plate_candidates(variant_results)
+        best = aggregated["best"]
+        if not is_valid_plate(best["text"]):
+            return None
+        flags = self._confidence_flags(best)
+        confidence = self._calibrate_confidence(best, flags)
+        if confidence < self.cascade_min_confidence:
+            return None
+        try:
+            master = self.master_lookup(best["text"]) if self.master_lookup else None
+        except Exception as e:
+            log.warning("Master lookup for the OCR fast tier failed (%s); escalating", e)
+            return None
+        if not master or not master.get("province"):
+            return None
 
-        # minAreaRect returns angles in [-90, 0): normalize to a small correction.
-        if angle < -45.0:
-            angle += 90.0
-        angle = max(min(angle, 30.0), -30.0)
-        if abs(angle) < 0.25:
-            return gray
+        self.scheduler.record(
+            variant_results,
+            best["text"],
+            variants_available=schedule["variants_available"],
+            early_exit=False,
+        )
+        province = master["province"]
+        plate_candidates = [
+            {
+                "text": self._format_plate_display(cand["text"]),
+                "normalized_text": cand["text"],
+                "score": cand["score"],
+                "preprocess_id": "consensus",
+            }
+            for cand in aggregated["candidates"]
+        ]
+        layout: Optional[PlateLayout] = schedule.get("layout")
+        return OCRResult(
+            plate_text=self._format_plate_display(best["text"]),
+            province=province,
+            confidence=confidence,
+            raw={
+                "chosen_variant": best.get("variant"),
+                "lines": best.get("lines", []),
+                "candidates": aggregated["candidates"],
+                "variant_candidates": aggregated["variant_candidates"],
+                "plate_text_normalized": best["text"],
+                "province_source": "master",
+                "plate_candidates": plate_candidates[: self.top_k],
+                "province_candidates": [{"name": province, "score": 100.0}],
+                "plate_suggestions": aggregated.get("suggestions", []),
+                "consensus_metrics": {
+                    "consensus_ratio": best["consensus_ratio"],
+                    "margin_ratio": best["margin_ratio"],
+                    "variant_count": aggregated["variant_count"],
+                },
+                "variants_run": schedule["variants_run"],
+                "variants_available": schedule["variants_available"],
+                "early_exit": False,
+                "ocr_tier": "fast",
+                "master_hit": master,
+                "normalize": schedule.get("normalize"),
+                "layout": self._layout_summary(layout),
+                "confidence_flags": flags,
+                "debug_flags": [],
+                "debug_artifacts": {},
+            },
+        )
 
-        h, w = gray.shape[:2]
-        center = (w / 2.0, h / 2.0)
-        matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
-        return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    @staticmethod
+    def _layout_summary(layout: Optional[PlateLayout]) -> Optional[Dict[str, Any]]:
+        if layout is None:
+            return None
+        return {
+            "registration": layout.registration,
+            "province": layout.province,
+            "confidence": layout.confidence,
+        }
 
     def _evaluate_variant(
         self,
@@ -483,15 +841,25 @@ class PlateOCR:
             "score": base_conf + valid_bonus + format_adjust,
         }]
 
-        for alt_text, swaps, reduction in self._expand_confusion_candidates(normalized):
-            penalty = max(0.01, (0.06 * swaps) - reduction)
-            alt_bonus = 0.1 if is_valid_plate(alt_text) else 0.0
+        # Confusable-letter / digit-prefix swaps, top-k valid plates only (plate_grammar.py)
+        for alt_text, thai_swaps, digit_swaps, reduction in self._grammar_alternatives(normalized):
             alt_format = self._plate_format_adjustment(alt_text)
+            if digit_swaps:
+                swaps = thai_swaps + digit_swaps
+                penalty = 0.05 * swaps
+                candidates.append({
+                    "name": f"digit_prefix_swap_{swaps}",
+                    "text": alt_text,
+                    "confidence": max(0.0, min(base_conf + 0.12 + alt_format - penalty, 1.0)),
+                    "score": base_conf + 0.18 + alt_format - penalty,
+                })
+                continue
+            penalty = max(0.01, (0.06 * thai_swaps) - reduction)
             candidates.append({
-                "name": f"confusion_swap_{swaps}",
+                "name": f"confusion_swap_{thai_swaps}",
                 "text": alt_text,
-                "confidence": max(0.0, min(base_conf + valid_bonus + alt_bonus + alt_format - penalty, 1.0)),
-                "score": base_conf + valid_bonus + alt_bonus + alt_format - penalty,
+                "confidence": max(0.0, min(base_conf + valid_bonus + 0.1 + alt_format - penalty, 1.0)),
+                "score": base_conf + valid_bonus + 0.1 + alt_format - penalty,
             })
 
         if re.match(r"^[ก-ฮ]{1,2}\d{4}$", normalized):
@@ -515,25 +883,14 @@ class PlateOCR:
                         "score": base_conf + 0.18,
                     })
 
-        for alt_text, swaps in self._expand_digit_prefix_candidates(normalized):
-            if not is_valid_plate(alt_text):
-                continue
-            penalty = 0.05 * swaps
-            alt_format = self._plate_format_adjustment(alt_text)
-            candidates.append({
-                "name": f"digit_prefix_swap_{swaps}",
-                "text": alt_text,
-                "confidence": max(0.0, min(base_conf + 0.12 + alt_format - penalty, 1.0)),
-                "score": base_conf + 0.18 + alt_format - penalty,
-            })
 
         candidates.sort(key=lambda x: x["score"], reverse=True)
         return candidates
 
-    def _topline_roi_pass(self, image: np.ndarray) -> Optional[Dict[str, Any]]:
+    def _topline_roi_pass(self, image: np.ndarray, layout: Optional[PlateLayout] = None) -> Optional[Dict[str, Any]]:
         h, w = image.shape[:2]
-        end = int(h * 0.65)
-        roi = image[0:end, 0:w]
+        strip = layout.crop(image, "registration") if layout is not None else None
+        roi = strip if strip is not None else image[0:int(h * 0.65), 0:w]
         if roi.size == 0:
             return None
 
@@ -551,15 +908,46 @@ class PlateOCR:
             ("roi_topline_upscale", up2),
         ]
 
+        if strip is not None:
+            all_detections = (
+                self._decode_strips_ctc(variants) if self.grammar_ctc else None
+            ) or self._readtext_strips(self.reader, variants, _THAI_ALLOWLIST)
+        else:
+            all_detections = self.variant_pool.map(
+                lambda variant: self.reader.readtext(variant[1], detail=1, allowlist=_THAI_ALLOWLIST), variants
+            )
+
         best_variant: Optional[Dict[str, Any]] = None
-        for name, variant in variants:
-            detections = self.reader.readtext(variant, detail=1, allowlist=_THAI_ALLOWLIST)
+        for (name, _), detections in zip(variants, all_detections):
             candidate = self._evaluate_variant(name, detections, score_boost=0.12)
             if not best_variant or candidate["score"] > best_variant["score"]:
                 best_variant = candidate
 
         return best_variant
 
+    def _decode_strips_ctc(self, variants: Sequence[Tuple[str, np.ndarray]]) -> Optional[List[List[Any]]]:
+        """Registration strips decoded straight to valid plates (grammar-constrained CTC).
+
+        Same single recognizer batch as ``_readtext_strips``; a strip with no
+        valid decoding keeps its greedy text. None if the recognizer can't be
+        driven directly (callers fall back to ``_readtext_strips``).
+        """
+        try:
+            probs = recognize_line_probabilities(self.reader, [img for _, img in variants], allowlist=_THAI_ALLOWLIST)
+        except Exception as e:
+            log.warning("CTC strip decoding unavailable (%s); using greedy strips", e)
+            return None
+
+        charset = self.reader.converter.character
+        out: List[List[Any]] = []
+        for (_, img), p in zip(variants, probs):
+            h, w = img.shape[:2]
+            box = [[0, 0], [w, 0], [w, h], [0, h]]
+            decoded = decode_ctc(p, charset, beam_width=self.grammar_ctc_beam, top_k=1)
+            text, conf = decoded[0] if decoded else decode_greedy(p, charset)
+            out.append([(box, text, conf)] if text else [])
+        return out
+
     def _digit_recovery_pass(self, image: np.ndarray) -> Optional[Dict[str, Any]]:
         """OCR pass เน้นตัวเลข — ใช้เมื่อ text สั้นผิดปกติ"""
         h, w = image.shape[:2]
@@ -567,63 +955,110 @@ class PlateOCR:
         if roi.size == 0:
             return None
         gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        up = cv2.resize(gray, None, fx=4.0, fy=4.0, interpolation=cv2.INTER_CUBIC)
+        f = capped_scale(gray.shape, 4.0, self.max_variant_pixels)
+        up = cv2.resize(gray, None, fx=f, fy=f, interpolation=cv2.INTER_CUBIC)
         cl = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(6, 6)).apply(up)
         sk = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
         sh = cv2.filter2D(cl, -1, sk)
         ot = cv2.threshold(sh, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        variants = [("digit_up4_sharp", sh), ("digit_up4_otsu", ot)]
+        all_detections = self.variant_pool.map(
+            lambda variant: self.reader.readtext(variant[1], detail=1, allowlist=_THAI_ALLOWLIST,
+                                                 paragraph=False, min_size=10, width_ths=0.8),
+            variants,
+        )
         best: Optional[Dict[str, Any]] = None
-        for name, v in [("digit_up4_sharp", sh), ("digit_up4_otsu", ot)]:
-            dets = self.reader.readtext(v, detail=1, allowlist=_THAI_ALLOWLIST,
-                                        paragraph=False, min_size=10, width_ths=0.8)
+        for (name, _), dets in zip(variants, all_detections):
             c = self._evaluate_variant(name, dets, score_boost=0.08)
             if not best or c["score"] > best["score"]:
                 best = c
         return best
 
-    def _province_roi_pass(self, image: np.ndarray) -> Dict[str, Any]:
-        h, w = image.shape[:2]
-        start = int(h * 0.55)
-        roi = image[start:h, 0:w]
+    def _province_roi_pass(self, image: np.ndarray, layout: Optional[PlateLayout] = None) -> Dict[str, Any]:
+        roi, is_strip = self._province_roi(image, layout, start_ratio=0.55)
+        best: Dict[str, Any] = {"province": "", "score": 0.0, "variant": "", "texts": []}
         if roi.size == 0:
-            return {"province": "", "score": 0.0, "variant": "", "texts": []}
+            return best
 
         roi_threshold = max(50, int(self.province_min_score - 7))
-        best = {"province": "", "score": 0.0, "variant": "", "texts": []}
+        ranked: Dict[str, Tuple[float, str]] = {}
+        # every read, as _province_line_pass collects them (reused when that pass is skipped)
+        line_texts: List[str] = []
 
-        for name, variant in self._build_province_roi_variants(roi):
-            detections = self.thai_reader.readtext(variant, detail=1, allowlist=_THAI_ONLY_ALLOWLIST)
+        variants = self._build_province_roi_variants(roi)
+        for (name, _), detections in zip(variants, self._readtext_province(variants, is_strip)):
             texts = [self._normalize_text(t) for _, t, c in detections if float(c or 0.0) >= 0.1]
             texts = [t for t in texts if t]
+            line_texts.extend(texts)
             if not texts:
                 continue
 
             for text in ["".join(texts)] + texts:
+                if self.province_lexicon:
+                    for province, score in rank_provinces(text, limit=self.top_k, min_score=roi_threshold):
+                        if score > ranked.get(province, (0.0, ""))[0]:
+                            ranked[province] = (score, name)
+                        if score > best["score"]:
+                            best = {"province": province, "score": score, "variant": name, "texts": texts}
+                    continue
                 province, score = match_province(text, threshold=roi_threshold)
                 province = normalize_province(province or text, threshold=roi_threshold)
                 if province and score > best["score"]:
                     best = {"province": province, "score": float(score), "variant": name, "texts": texts}
 
+        merged = "".join(line_texts)
+        if merged:
+            line_texts.append(merged)
+        best["line_texts"] = line_texts
+        best["strip"] = is_strip
+        if self.province_lexicon:
+            candidates = [
+                {"name": province, "score": score, "variant": variant}
+                for province, (score, variant) in sorted(ranked.items(), key=lambda item: item[1][0], reverse=True)
+            ]
+            runner_up = candidates[1]["score"] if len(candidates) > 1 else 0.0
+            best["candidates"] = candidates[: self.top_k]
+            best["decisive"] = bool(
+                candidates
+                and candidates[0]["score"] >= self.province_decisive_score
+                and candidates[0]["score"] - runner_up >= self.province_decisive_margin
+            )
         return best
 
     def _build_province_roi_variants(self, roi: np.ndarray) -> List[Tuple[str, np.ndarray]]:
         gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        up = cv2.resize(gray, None, fx=2.6, fy=2.6, interpolation=cv2.INTER_CUBIC)
+        f = capped_scale(gray.shape, 2.6, self.max_variant_pixels)
+        up = cv2.resize(gray, None, fx=f, fy=f, interpolation=cv2.INTER_CUBIC)
         clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(up)
         sharpen = cv2.filter2D(clahe, -1, np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32))
         adaptive = cv2.adaptiveThreshold(sharpen, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 3)
         return [("roi_upscale", up), ("roi_clahe_sharpen", sharpen), ("roi_adaptive", adaptive)]
 
-    def _province_line_pass(self, image: np.ndarray) -> Dict[str, Any]:
+    def _province_roi(
+        self, image: np.ndarray, layout: Optional[PlateLayout], start_ratio: float
+    ) -> Tuple[np.ndarray, bool]:
+        """Province strip from the layout segmenter, else the bottom of the crop."""
+        strip = layout.crop(image, "province") if layout is not None else None
+        if strip is not None:
+            return strip, True
         h, w = image.shape[:2]
-        start = int(h * 0.58)
-        roi = image[start:h, 0:w]
+        return image[int(h * start_ratio):h, 0:w], False
+
+    def _readtext_province(self, variants: Sequence[Tuple[str, np.ndarray]], is_strip: bool) -> List[List[Any]]:
+        if is_strip:
+            return self._readtext_strips(self.thai_reader, variants, _THAI_ONLY_ALLOWLIST)
+        return self.variant_pool.map(
+            lambda variant: self.thai_reader.readtext(variant[1], detail=1, allowlist=_THAI_ONLY_ALLOWLIST), variants
+        )
+
+    def _province_line_pass(self, image: np.ndarray, layout: Optional[PlateLayout] = None) -> Dict[str, Any]:
+        roi, is_strip = self._province_roi(image, layout, start_ratio=0.58)
         if roi.size == 0:
             return {"texts": []}
 
         texts: List[str] = []
-        for _, variant in self._build_province_roi_variants(roi):
-            detections = self.thai_reader.readtext(variant, detail=1, allowlist=_THAI_ONLY_ALLOWLIST)
+        variants = self._build_province_roi_variants(roi)
+        for detections in self._readtext_province(variants, is_strip):
             for _, text, conf in detections:
                 if float(conf or 0.0) < 0.1:
                     continue
@@ -832,6 +1267,16 @@ class PlateOCR:
             "source": resolved.source,
         }
 
+    def _confidence_flags(self, best: Dict[str, Any]) -> List[str]:
+        flags: List[str] = []
+        if best["consensus_ratio"] < self.consensus_min or best["margin_ratio"] < self.margin_min:
+            flags.append("low_consensus")
+        if self._has_confusable_char(best["text"]):
+            flags.append("confusable_chars")
+        if best["text"]:
+            flags.append("plate_present")
+        return flags
+
     def _calibrate_confidence(self, best: Dict[str, Any], flags: List[str]) -> float:
         base_conf = max(0.0, min(float(best.get("avg_conf", 0.0)), 1.0))
         consensus_ratio = float(best.get("consensus_ratio") or 0.0)
@@ -883,30 +1328,16 @@ class PlateOCR:
         aggregated: Dict[str, Any],
         province_info: Dict[str, Any],
         flags: List[str],
+        camera_id: str = "",
     ) -> Dict[str, Any]:
-        debug_root = Path(debug_dir) / debug_id
-        debug_root.mkdir(parents=True, exist_ok=True)
-
-        artifact_paths: Dict[str, str] = {}
-        original_path = debug_root / "crop.png"
-        cv2.imwrite(str(original_path), image)
-        artifact_paths["crop"] = str(original_path)
-
-        for name, variant in variant_images:
-            path = debug_root / f"{name}.png"
-            cv2.imwrite(str(path), variant)
-            artifact_paths[name] = str(path)
-
-        summary_path = debug_root / "ocr_summary.json"
         summary = {
             "flags": flags,
             "plate_candidates": aggregated.get("candidates", [])[: self.top_k],
             "province_candidates": province_info.get("candidates", [])[: self.top_k],
         }
-        summary_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
-        artifact_paths["summary"] = str(summary_path)
-
-        return {"dir": str(debug_root), "artifacts": artifact_paths}
+        return self.debug_writer.submit(
+            debug_dir, debug_id, image, variant_images, summary, camera_id=camera_id
+        )
 
     def _has_confusable_char(self, text: str) -> bool:
         return any(ch in _CONFUSABLE_CHARS for ch in text or "")
@@ -968,39 +1399,8 @@ class PlateOCR:
         norm = re.sub(r"[^0-9ก-ฮ]", "", norm)
         return norm
 
-    def _expand_confusion_candidates(self, text: str) -> Iterable[Tuple[str, int, float]]:
-        match = re.match(r"^([ก-ฮ]{1,2})(\d+)$", text)
-        if not match:
-            return []
-
-        prefix, digits = match.groups()
-        options: List[List[str]] = []
-        for ch in prefix:
-            alts = [ch]
-            alts.extend(_THAI_CONFUSION_MAP.get(ch, ()))
-            options.append(alts)
-
-        variants: List[Tuple[str, int, float]] = []
-        for choice in itertools.product(*options):
-            swapped = sum(1 for orig, alt in zip(prefix, choice) if orig != alt)
-            if swapped == 0:
-                continue
-            reduction = sum(
-                _THAI_CONFUSION_PENALTY_REDUCTION.get((orig, alt), 0.0)
-                for orig, alt in zip(prefix, choice)
-                if orig != alt
-            )
-            variants.append(("".join(choice) + digits, swapped, reduction))
-
-        seen = set()
-        unique: List[Tuple[str, int, float]] = []
-        for variant, swaps, reduction in variants:
-            if variant in seen:
-                continue
-            seen.add(variant)
-            unique.append((variant, swaps, reduction))
-
-        return unique[:6]
+    def _grammar_alternatives(self, text: str) -> Tuple[Tuple[str, int, int, float], ...]:
+        return _grammar_alternatives(text, self.grammar_beam_width, self.grammar_top_k)
 
     def _find_leading_digit(
         self,
@@ -1025,36 +1425,49 @@ class PlateOCR:
         candidates.sort(key=lambda t: t["conf"], reverse=True)
         return candidates[0]["text"]
 
-    def _expand_digit_prefix_candidates(self, text: str) -> Iterable[Tuple[str, int]]:
-        if not text:
-            return []
-        prefix_start = 1 if text[0].isdigit() else 0
-        prefix = text[prefix_start:prefix_start + 2]
-        if not prefix or not any(ch.isdigit() for ch in prefix):
-            return []
 
-        options: List[List[str]] = []
-        swap_positions = 0
-        for ch in prefix:
-            if ch.isdigit() and ch in _DIGIT_PREFIX_CONFUSION_MAP:
-                options.append(list(_DIGIT_PREFIX_CONFUSION_MAP[ch]))
-                swap_positions += 1
-            else:
-                options.append([ch])
-
-        variants: List[Tuple[str, int]] = []
-        for choice in itertools.product(*options):
-            if "".join(choice) == prefix:
-                continue
-            swaps = sum(1 for orig, alt in zip(prefix, choice) if orig != alt)
-            fixed = text[:prefix_start] + "".join(choice) + text[prefix_start + len(prefix):]
-            variants.append((fixed, swaps))
-
-        seen = set()
-        unique: List[Tuple[str, int]] = []
-        for variant, swaps in variants:
-            if variant in seen:
+@lru_cache(maxsize=4096)
+def _grammar_alternatives(text: str, beam_width: int, top_k: int) -> Tuple[Tuple[str, int, int, float], ...]:
+    """Valid plates one or more confusable swaps away from ``text``.
+
+    Two searches, as the swap expansions they replace: letters of a plate
+    without a digit prefix may swap for their _THAI_CONFUSION_MAP look-alikes;
+    separately, every digit in the two slots after the optional leading digit
+    that has _DIGIT_PREFIX_CONFUSION_MAP letters is read as one of them (the
+    digit itself is not an option there). A beam search constrained by the
+    plate grammar returns the cheapest valid results of each, up to ``top_k``
+    per search: ``(text, letter swaps, digit swaps, penalty reduction)``.
+    Cached: the variants of one plate mostly read the same text.
+    """
+    if not text:
+        return ()
+    prefix_start = 1 if text[0].isdigit() else 0
+
+    letter_dists: List[Dict[str, float]] = []
+    digit_dists: List[Dict[str, float]] = []
+    for i, ch in enumerate(text):
+        dist = {ch: 0.0}
+        if prefix_start == 0 and ch in _THAI_CONFUSION_MAP:
+            for alt in _THAI_CONFUSION_MAP[ch]:
+                cost = max(0.01, 0.06 - _THAI_CONFUSION_PENALTY_REDUCTION.get((ch, alt), 0.0))
+                dist.setdefault(alt, -cost)
+        letter_dists.append(dist)
+        if prefix_start <= i < prefix_start + 2 and ch in _DIGIT_PREFIX_CONFUSION_MAP:
+            digit_dists.append({alt: -0.05 for alt in _DIGIT_PREFIX_CONFUSION_MAP[ch]})
+        else:
+            digit_dists.append({ch: 0.0})
+
+    alternatives: List[Tuple[str, int, int, float]] = []
+    for distributions in (letter_dists, digit_dists):
+        if all(len(dist) == 1 and text[i] in dist for i, dist in enumerate(distributions)):
+            continue
+        found = 0
+        for alt_text, _ in decode_positions(distributions, beam_width=beam_width, top_k=top_k + 1):
+            if alt_text == text or found == top_k:
                 continue
-            seen.add(variant)
-            unique.append((variant, swaps))
-        return unique[:6]
+            pairs = [(orig, alt) for orig, alt in zip(text, alt_text) if orig != alt]
+            digit_swaps = sum(1 for orig, _ in pairs if orig.isdigit())
+            reduction = sum(_THAI_CONFUSION_PENALTY_REDUCTION.get(pair, 0.0) for pair in pairs)
+            alternatives.append((alt_text, len(pairs) - digit_swaps, digit_swaps, reduction))
+            found += 1
+    return tuple(alternatives)
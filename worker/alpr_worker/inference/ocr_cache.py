@@ -0,0 +1,307 @@
+"""
+ocr_cache.py — Near-Duplicate OCR Result Cache
+================================================
+
+The same vehicle often reaches OCR more than once: a tracker ID switch, the
+per-track trigger cooldown expiring while the car is still in view, or an
+upload re-submission. The plate crops differ by a few pixels, so the result
+of the first read is reused for a later crop from the same camera when both
+of its perceptual hashes are close to the stored ones:
+
+  key     64-bit DCT pHash of the grayscale plate crop (+ camera_id scope),
+          within OCR_CACHE_MAX_DISTANCE bits
+  verify  256-bit DCT pHash of the same crop stored with the entry, within
+          OCR_CACHE_VERIFY_DISTANCE bits
+  value   the ``OCRResult`` as JSON; ``raw["ocr_cache"]`` marks a hit
+  evict   entries older than OCR_CACHE_TTL_SEC, and the least recently used
+          beyond OCR_CACHE_MAX_ENTRIES per camera
+
+Shared through Redis (a sorted set of hashes by last use + a hash of
+results per camera) so every worker child sees every read; falls back to an
+in-process LRU when Redis is not reachable. Only reads at or above
+OCR_CACHE_MIN_CONFIDENCE are stored, so a bad read is not pinned.
+
+A whole-crop hash barely moves when one digit changes, so the coarse key
+alone is not safe: on synthetic plates re-cropped by ±1 px, 64-bit distance
+≤ 6 matched 69% of plates differing in one or two digits (≤ 2: 18%). With
+the 256-bit check at ≤ 16 none matched, and 37% of same-plate re-crops still
+hit. Tune on real traffic by raising one limit at a time and checking every
+hit's ``raw["ocr_cache"]`` distances against a full read; keep both low when
+different plates share a camera within OCR_CACHE_TTL_SEC.
+
+Hit rate: ``lpr_ocr_cache_total{result=hit|miss}`` when prometheus_client is
+installed, ``snapshot()``, and a log line every OCR_CACHE_LOG_EVERY lookups.
+
+ENV:
+  OCR_CACHE_ENABLED=false
+  OCR_CACHE_MAX_DISTANCE=2          max Hamming distance (of 64 bits) to consider an entry
+  OCR_CACHE_VERIFY_DISTANCE=16      max Hamming distance (of 256 bits) for a hit
+  OCR_CACHE_TTL_SEC=300
+  OCR_CACHE_MAX_ENTRIES=256         per camera
+  OCR_CACHE_MIN_CONFIDENCE=0.5
+  OCR_CACHE_LOG_EVERY=500
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .timing import current_timer
+
+log = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Counter
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+_lookup_counter = None
+
+
+def _counter():
+    global _lookup_counter
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if _lookup_counter is None:
+        _lookup_counter = Counter("lpr_ocr_cache", "OCR result cache lookups", ["result"])
+    return _lookup_counter
+
+
+def phash(image: np.ndarray, side: int = 8) -> int:
+    """``side``²-bit perceptual hash: sign of the low side x side DCT terms vs. their median."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (side * 4, side * 4), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:side, :side].flatten()
+    # DC term is overall brightness — leave it out of the median
+    bits = low > np.median(low[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class OCRResultCache:
+    def __init__(self, redis_client=None):
+        self.enabled = os.getenv("OCR_CACHE_ENABLED", "false").lower() == "true"
+        self.max_distance = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "2"))
+        self.verify_distance = int(os.getenv("OCR_CACHE_VERIFY_DISTANCE", "16"))
+        self.ttl_sec = int(os.getenv("OCR_CACHE_TTL_SEC", "300"))
+        self.max_entries = max(1, int(os.getenv("OCR_CACHE_MAX_ENTRIES", "256")))
+        self.min_confidence = float(os.getenv("OCR_CACHE_MIN_CONFIDENCE", "0.5"))
+        self.log_every = max(1, int(os.getenv("OCR_CACHE_LOG_EVERY", "500")))
+        self.redis = redis_client
+
+        self._lock = threading.Lock()
+        # camera_id -> OrderedDict[hash -> (stored_at, payload)], oldest first
+        self._local: Dict[str, "OrderedDict[int, Tuple[float, str]]"] = {}
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+
+        log.info(
+            "OCRResultCache: enabled=%s max_distance=%d verify_distance=%d ttl=%ds max_entries=%d "
+            "min_conf=%.2f redis=%s",
+            self.enabled, self.max_distance, self.verify_distance, self.ttl_sec, self.max_entries,
+            self.min_confidence, redis_client is not None,
+        )
+
+    # ----------------------------
+    # Read-through
+    # ----------------------------
+    def read_plate(self, ocr: Any, crop: np.ndarray, camera_id: str = "", **kwargs: Any):
+        """``ocr.read_plate(crop, camera_id=..., **kwargs)``, answered from the cache when a near-duplicate was read."""
+        if not self.enabled:
+            return ocr.read_plate(crop, camera_id=camera_id, **kwargs)
+
+        with current_timer().stage("ocr.cache_lookup"):
+            key = phash(crop)
+            verify_key = phash(crop, side=16)
+            cached = self.lookup(key, verify_key, camera_id)
+        if cached is not None:
+            return cached
+
+        result = ocr.read_plate(crop, camera_id=camera_id, **kwargs)
+        self.store(key, verify_key, camera_id, result)
+        return result
+
+    def lookup(self, key: int, verify_key: int, camera_id: str = ""):
+        from .ocr import OCRResult
+
+        found = None
+        if self.redis is not None:
+            try:
+                found = self._lookup_redis(key, verify_key, camera_id)
+            except Exception as e:
+                log.warning("OCR cache Redis lookup failed (%s); using local cache", e)
+                found = self._lookup_local(key, verify_key, camera_id)
+        else:
+            found = self._lookup_local(key, verify_key, camera_id)
+
+        self._count(found is not None)
+        if found is None:
+            return None
+        distance, verify_distance, data = found
+        raw = dict(data.get("raw") or {})
+        raw["ocr_cache"] = {
+            "hit": True, "distance": distance, "verify_distance": verify_distance, "phash": f"{key:016x}",
+        }
+        return OCRResult(
+            plate_text=data.get("plate_text", ""),
+            province=data.get("province", ""),
+            confidence=float(data.get("confidence", 0.0)),
+            raw=raw,
+        )
+
+    def store(self, key: int, verify_key: int, camera_id: str, result: Any) -> None:
+        if not result.plate_text or float(result.confidence or 0.0) < self.min_confidence:
+            return
+        payload = json.dumps(
+            {
+                "verify": f"{verify_key:064x}",
+                "plate_text": result.plate_text,
+                "province": result.province,
+                "confidence": float(result.confidence),
+                "raw": result.raw or {},
+            },
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            self._stores += 1
+        if self.redis is not None:
+            try:
+                self._store_redis(key, camera_id, payload)
+                return
+            except Exception as e:
+                log.warning("OCR cache Redis store failed (%s); using local cache", e)
+        self._store_local(key, camera_id, payload)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "stores": self._stores,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _count(self, hit: bool) -> None:
+        counter = _counter()
+        if counter is not None:
+            counter.labels(result="hit" if hit else "miss").inc()
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            lookups = self._hits + self._misses
+            if lookups % self.log_every == 0:
+                log.info(
+                    "OCR cache: lookups=%d hit_rate=%.1f%% stores=%d",
+                    lookups, 100.0 * self._hits / lookups, self._stores,
+                )
+
+    def _near(self, key: int, candidates: List[int]) -> List[Tuple[int, int]]:
+        """``(distance, candidate)`` within max_distance, nearest first."""
+        near = [(hamming(key, candidate), candidate) for candidate in candidates]
+        return sorted(item for item in near if item[0] <= self.max_distance)
+
+    def _verified(self, payload: str, verify_key: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """``(verify distance, entry)`` when the entry's 256-bit hash is close enough."""
+        data = json.loads(payload)
+        stored = data.get("verify")
+        if stored is None:
+            return None
+        distance = hamming(verify_key, int(stored, 16))
+        return (distance, data) if distance <= self.verify_distance else None
+
+    # ----------------------------
+    # Redis
+    # ----------------------------
+    def _redis_keys(self, camera_id: str) -> Tuple[str, str]:
+        base = f"ocr_cache:{camera_id or '-'}"
+        return f"{base}:lru", f"{base}:results"
+
+    def _lookup_redis(self, key: int, verify_key: int, camera_id: str) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        lru_key, results_key = self._redis_keys(camera_id)
+        now = time.time()
+        members = self.redis.zrangebyscore(lru_key, now - self.ttl_sec, "+inf")
+        near = self._near(key, [int(m, 16) for m in members])
+        if not near:
+            return None
+        fields = [f"{candidate:016x}" for _, candidate in near]
+        for (distance, _), field, payload in zip(near, fields, self.redis.hmget(results_key, fields)):
+            if payload is None:
+                continue
+            verified = self._verified(payload.decode() if isinstance(payload, bytes) else payload, verify_key)
+            if verified is None:
+                continue
+            # a hit refreshes the entry's LRU position
+            self.redis.zadd(lru_key, {field: now})
+            return (distance, *verified)
+        return None
+
+    def _store_redis(self, key: int, camera_id: str, payload: str) -> None:
+        lru_key, results_key = self._redis_keys(camera_id)
+        field = f"{key:016x}"
+        now = time.time()
+
+        pipe = self.redis.pipeline()
+        pipe.hset(results_key, field, payload)
+        pipe.zadd(lru_key, {field: now})
+        pipe.expire(results_key, self.ttl_sec)
+        pipe.expire(lru_key, self.ttl_sec)
+        pipe.zrangebyscore(lru_key, "-inf", now - self.ttl_sec)
+        pipe.zrange(lru_key, 0, -(self.max_entries + 1))
+        expired, overflow = pipe.execute()[-2:]
+
+        evict = set(expired) | set(overflow)
+        if evict:
+            pipe = self.redis.pipeline()
+            pipe.zrem(lru_key, *evict)
+            pipe.hdel(results_key, *evict)
+            pipe.execute()
+
+    # ----------------------------
+    # In-process fallback
+    # ----------------------------
+    def _lookup_local(self, key: int, verify_key: int, camera_id: str) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            entries = self._local.get(camera_id)
+            if not entries:
+                return None
+            for stale in [k for k, (stored_at, _) in entries.items() if now - stored_at > self.ttl_sec]:
+                del entries[stale]
+            for distance, candidate in self._near(key, list(entries)):
+                payload = entries[candidate][1]
+                verified = self._verified(payload, verify_key)
+                if verified is None:
+                    continue
+                entries[candidate] = (now, payload)
+                entries.move_to_end(candidate)
+                return (distance, *verified)
+            return None
+
+    def _store_local(self, key: int, camera_id: str, payload: str) -> None:
+        with self._lock:
+            entries = self._local.setdefault(camera_id, OrderedDict())
+            entries[key] = (time.time(), payload)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
@@ -0,0 +1,181 @@
+"""
+onnx_backend.py — ONNX Runtime Backend for EasyOCR
+====================================================
+
+On CPU-only sites the torch recognizer (run once per OCR variant) dominates
+OCR time. ``export_reader`` writes EasyOCR's recognizer (and CRAFT detector)
+to ONNX, with dynamic int8 quantization of the recognizer's LSTM / linear
+layers; ``load_onnx_sessions`` opens them and ``use_onnx_backend`` swaps a
+loaded ``easyocr.Reader``'s torch modules for those sessions.
+
+The sessions stand in for the torch modules EasyOCR calls (``eval()``, then
+``model(images, text)`` / ``net(x)`` on a batch), so ``readtext``, the
+batched recognizer path in easyocr_batch.py and the layout strips all run
+through ONNX Runtime unchanged — batch size is still OCR_RECOGNIZER_BATCH_SIZE.
+Only CPU execution is set up here; the reader must be created with
+``gpu=False``. PlateOCR loads the sessions before it creates any reader, so a
+missing model or runtime falls back to torch (GPU when available) for every
+reader instead of leaving a CPU torch reader, or a mix of backends.
+
+Model files (bin/export_easyocr_onnx.py):
+  <dir>/recognizer.onnx  recognizer.int8.onnx  detector.onnx  [detector.int8.onnx]
+
+ENV (read by PlateOCR):
+  OCR_BACKEND=torch              torch | onnx
+  OCR_ONNX_DIR=/models/easyocr_onnx
+  OCR_ONNX_QUANTIZED=true        prefer the *.int8.onnx files when present
+  OCR_ONNX_THREADS=0             intra-op threads per session (0 = ORT default)
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+_COMPONENTS = ("recognizer", "detector")
+
+
+# ----------------------------
+# Export
+# ----------------------------
+def _unwrap(module: Any) -> Any:
+    # Reader(gpu=True) wraps its models in DataParallel
+    return getattr(module, "module", module)
+
+
+def export_reader(
+    reader: Any,
+    out_dir: Path,
+    quantize: bool = True,
+    quantize_detector: bool = False,
+    opset: int = 13,
+) -> Dict[str, Path]:
+    """Export ``reader``'s recognizer and detector; returns ``{file stem: path}``."""
+    import torch
+
+    class _Recognizer(torch.nn.Module):
+        # EasyOCR calls model(image, text); the CTC models ignore ``text``
+        def __init__(self, model: Any) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            return self.model(image, None)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written: Dict[str, Path] = {}
+
+    from easyocr.config import imgH
+
+    recognizer = _Recognizer(_unwrap(reader.recognizer).float().cpu().eval())
+    path = out_dir / "recognizer.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            recognizer, torch.zeros(2, 1, imgH, 256), str(path),
+            input_names=["image"], output_names=["preds"],
+            dynamic_axes={"image": {0: "batch", 3: "width"}, "preds": {0: "batch", 1: "steps"}},
+            opset_version=opset,
+        )
+    written["recognizer"] = path
+
+    detector = _unwrap(reader.detector).float().cpu().eval()
+    path = out_dir / "detector.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            detector, torch.zeros(1, 3, 320, 640), str(path),
+            input_names=["image"], output_names=["score", "feature"],
+            dynamic_axes={
+                "image": {0: "batch", 2: "height", 3: "width"},
+                "score": {0: "batch", 1: "out_height", 2: "out_width"},
+                "feature": {0: "batch", 2: "out_height", 3: "out_width"},
+            },
+            opset_version=opset,
+        )
+    written["detector"] = path
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        for name in ("recognizer", "detector") if quantize_detector else ("recognizer",):
+            target = out_dir / f"{name}.int8.onnx"
+            quantize_dynamic(str(written[name]), str(target), weight_type=QuantType.QInt8)
+            written[f"{name}.int8"] = target
+    return written
+
+
+# ----------------------------
+# Runtime
+# ----------------------------
+class OnnxModule:
+    """Callable stand-in for an EasyOCR torch module backed by an ORT session."""
+
+    def __init__(self, path: Path, threads: int = 0) -> None:
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.path = path
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def eval(self) -> "OnnxModule":
+        return self
+
+    def __call__(self, image: Any, *unused: Any) -> Any:
+        import torch
+
+        batch = image.detach().cpu().numpy() if hasattr(image, "detach") else np.asarray(image)
+        outputs = self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})
+        tensors = tuple(torch.from_numpy(output) for output in outputs)
+        return tensors[0] if len(tensors) == 1 else tensors
+
+
+def model_path(model_dir: Path, name: str, quantized: bool) -> Optional[Path]:
+    candidates = [model_dir / f"{name}.int8.onnx"] if quantized else []
+    candidates.append(model_dir / f"{name}.onnx")
+    return next((p for p in candidates if p.exists()), None)
+
+
+def load_onnx_sessions(model_dir: Path, quantized: bool = True, threads: int = 0) -> Optional[Dict[str, OnnxModule]]:
+    """ORT sessions by component; None when the recognizer cannot be loaded.
+
+    The detector is optional: without detector*.onnx only the recognizer moves.
+    """
+    if not ONNXRUNTIME_AVAILABLE:
+        log.warning("OCR_BACKEND=onnx but onnxruntime is not installed; using torch")
+        return None
+
+    sessions: Dict[str, OnnxModule] = {}
+    for name in _COMPONENTS:
+        path = model_path(model_dir, name, quantized)
+        if path is None:
+            if name == "recognizer":
+                log.warning("No recognizer ONNX model in %s; using torch", model_dir)
+                return None
+            continue
+        try:
+            sessions[name] = OnnxModule(path, threads)
+        except Exception as e:
+            log.warning("Could not load %s: %s; using torch", path, e)
+            return None
+    return sessions
+
+
+def use_onnx_backend(reader: Any, sessions: Dict[str, OnnxModule]) -> None:
+    """Swap ``reader``'s torch models for ``sessions`` (see ``load_onnx_sessions``)."""
+    if str(getattr(reader, "device", "cpu")) != "cpu":
+        raise ValueError(f"ONNX backend only runs on CPU readers (device={reader.device})")
+    for name, session in sessions.items():
+        setattr(reader, name, session)
+        log.info("EasyOCR %s → ONNX Runtime (%s)", name, session.path.name)
@@ -0,0 +1,236 @@
+"""
+plate_grammar.py — Grammar-Constrained Plate Decoding
+=======================================================
+
+The normalized plate formats of ``validate.PATTERNS`` written as
+character-class segments (T = Thai consonant ก-ฮ, D = digit) and compiled
+into a small DFA, so a decoder can drop a hypothesis the moment it can no
+longer become a valid plate instead of enumerating every swap and calling
+``is_valid_plate`` afterwards.
+
+Two bounded beam searches use it:
+
+  decode_positions   one distribution per observed character (the OCR text
+                     plus its confusable alternatives) → top-k valid plates;
+                     replaces the itertools.product confusion / digit-prefix
+                     expansion in PlateOCR
+  decode_ctc         CTC prefix beam search over recognizer softmax output
+                     (T x charset) → top-k valid plates straight from the
+                     recognizer (layout registration strips, OCR_GRAMMAR_CTC;
+                     ``decode_greedy`` is the fallback when none is valid)
+
+Keep PLATE_GRAMMAR in step with validate.PATTERNS (dash-free forms).
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# (class, min, max) segments per format — validate.PATTERNS, same order
+PLATE_GRAMMAR: Tuple[Tuple[Tuple[str, int, int], ...], ...] = (
+    (("T", 2, 2), ("D", 1, 4)),                 # กก1234
+    (("T", 1, 1), ("D", 1, 4)),                 # ก1234
+    (("D", 1, 1), ("T", 2, 2), ("D", 1, 4)),    # 1กก1234
+    (("D", 1, 1), ("T", 1, 1), ("D", 1, 4)),    # 1ก1234
+    (("D", 2, 2), ("T", 1, 2), ("D", 1, 4)),    # 12กก1234
+    (("D", 6, 6),),                             # 320394
+    (("D", 5, 5),),                             # 36177
+    (("T", 1, 1), ("D", 5, 6)),                 # ท991234
+)
+
+_THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+# NFA state: (format index, segment index, chars in segment); -1 = not started
+_NfaState = Tuple[int, int, int]
+# DFA states are small ints; 0 is the start state
+State = int
+
+
+def char_class(ch: str) -> Optional[str]:
+    if "0" <= ch <= "9":
+        return "D"
+    if "ก" <= ch <= "ฮ":
+        return "T"
+    return None
+
+
+class PlateGrammar:
+    """DFA over character classes, compiled from ``PLATE_GRAMMAR``."""
+
+    def __init__(self, formats=PLATE_GRAMMAR) -> None:
+        self.formats = formats
+        self.start: State = 0
+        # (state, class) -> state; a missing key means no format can match any more
+        self.table: Dict[Tuple[State, str], State] = {}
+        self.accepting: Set[State] = set()
+
+        start = frozenset((i, -1, 0) for i in range(len(formats)))
+        ids: Dict[FrozenSet[_NfaState], State] = {start: 0}
+        pending = [start]
+        while pending:
+            nfa_states = pending.pop()
+            state = ids[nfa_states]
+            if self._accepts(nfa_states):
+                self.accepting.add(state)
+            for cls in ("T", "D"):
+                nxt = self._advance(nfa_states, cls)
+                if not nxt:
+                    continue
+                if nxt not in ids:
+                    ids[nxt] = len(ids)
+                    pending.append(nxt)
+                self.table[(state, cls)] = ids[nxt]
+
+    def _advance(self, nfa_states: FrozenSet[_NfaState], cls: str) -> FrozenSet[_NfaState]:
+        nxt = set()
+        for fmt, seg, count in nfa_states:
+            segments = self.formats[fmt]
+            if seg >= 0 and segments[seg][0] == cls and count < segments[seg][2]:
+                nxt.add((fmt, seg, count + 1))
+            if (seg < 0 or count >= segments[seg][1]) and seg + 1 < len(segments) \
+                    and segments[seg + 1][0] == cls:
+                nxt.add((fmt, seg + 1, 1))
+        return frozenset(nxt)
+
+    def _accepts(self, nfa_states: FrozenSet[_NfaState]) -> bool:
+        return any(
+            seg == len(self.formats[fmt]) - 1 and count >= self.formats[fmt][seg][1]
+            for fmt, seg, count in nfa_states
+        )
+
+    def step(self, state: State, ch: str) -> Optional[State]:
+        """State after ``ch``, or None once no format can match any more."""
+        cls = char_class(ch)
+        return self.table.get((state, cls)) if cls is not None else None
+
+    def accepts(self, state: State) -> bool:
+        return state in self.accepting
+
+    def matches(self, text: str) -> bool:
+        state: Optional[State] = self.start
+        for ch in text:
+            state = self.step(state, ch)
+            if state is None:
+                return False
+        return self.accepts(state)
+
+
+GRAMMAR = PlateGrammar()
+
+
+def decode_positions(
+    distributions: Sequence[Dict[str, float]],
+    beam_width: int = 8,
+    top_k: int = 6,
+    grammar: PlateGrammar = GRAMMAR,
+) -> List[Tuple[str, float]]:
+    """Top-k valid plates, one character per position.
+
+    ``distributions[i]`` maps candidate characters at position i to a
+    log-probability; returns ``(text, log-probability)`` best first.
+    """
+    table = grammar.table
+    # hypotheses: (log-probability, text, dfa state)
+    beam: List[Tuple[float, str, State]] = [(0.0, "", grammar.start)]
+    for dist in distributions:
+        if len(dist) == 1:
+            # the common case: no alternatives at this position
+            ((ch, logp),) = dist.items()
+            key_cls = char_class(ch)
+            beam = [
+                (score + logp, text + ch, table[(state, key_cls)])
+                for score, text, state in beam
+                if (state, key_cls) in table
+            ]
+            if not beam:
+                return []
+            continue
+        options = [(ch, char_class(ch), logp) for ch, logp in dist.items()]
+        extended = []
+        for score, text, state in beam:
+            for ch, cls, logp in options:
+                nxt = table.get((state, cls))
+                if nxt is not None:
+                    extended.append((score + logp, text + ch, nxt))
+        if not extended:
+            return []
+        extended.sort(key=lambda h: h[0], reverse=True)
+        beam = extended[:beam_width]
+    return [(text, score) for score, text, state in beam if state in grammar.accepting][:top_k]
+
+
+def decode_ctc(
+    probs: np.ndarray,
+    charset: Sequence[str],
+    beam_width: int = 10,
+    top_k: int = 3,
+    min_prob: float = 1e-3,
+    grammar: PlateGrammar = GRAMMAR,
+) -> List[Tuple[str, float]]:
+    """Grammar-constrained CTC prefix beam search.
+
+    ``probs`` is the recognizer's softmax output for one text line (time x
+    len(charset)), ``charset[0]`` the CTC blank. Characters outside the plate
+    alphabet (vowels, tone marks, Latin) are treated as blank, matching what
+    ``_normalize_plate`` strips. Returns ``(text, per-character confidence)``
+    best first; only texts the grammar accepts.
+    """
+    if probs.ndim != 2 or probs.shape[0] == 0:
+        return []
+    normalized = [c.translate(_THAI_DIGITS) if i else "" for i, c in enumerate(charset)]
+    plate_idx = [i for i, c in enumerate(normalized) if len(c) == 1 and char_class(c) is not None]
+    blank_mass = 1.0 - probs[:, plate_idx].sum(axis=1)
+
+    # prefix text -> [p_blank, p_non_blank, dfa state]
+    beams: Dict[str, List] = {"": [1.0, 0.0, grammar.start]}
+    for t in range(probs.shape[0]):
+        row = probs[t]
+        active = [i for i in plate_idx if row[i] >= min_prob]
+        blank = float(max(0.0, blank_mass[t]))
+        nxt: Dict[str, List] = {}
+
+        def entry(text: str, state: State) -> List:
+            if text not in nxt:
+                nxt[text] = [0.0, 0.0, state]
+            return nxt[text]
+
+        for text, (p_b, p_nb, state) in beams.items():
+            entry(text, state)[0] += (p_b + p_nb) * blank
+            last = text[-1] if text else ""
+            for i in active:
+                ch = normalized[i]
+                p = float(row[i])
+                if ch == last:
+                    # repeated character without a blank in between collapses
+                    entry(text, state)[1] += p_nb * p
+                    if p_b == 0.0:
+                        continue
+                    mass = p_b * p
+                else:
+                    mass = (p_b + p_nb) * p
+                new_state = grammar.step(state, ch)
+                if new_state is None:
+                    continue
+                entry(text + ch, new_state)[1] += mass
+
+        ranked = sorted(nxt.items(), key=lambda kv: kv[1][0] + kv[1][1], reverse=True)
+        beams = dict(ranked[:beam_width])
+
+    results = []
+    for text, (p_b, p_nb, state) in beams.items():
+        total = p_b + p_nb
+        if text and total > 0.0 and grammar.accepts(state):
+            results.append((text, math.exp(math.log(total) / len(text))))
+    results.sort(key=lambda r: r[1], reverse=True)
+    return results[:top_k]
+
+
+def decode_greedy(probs: np.ndarray, charset: Sequence[str]) -> Tuple[str, float]:
+    """Best-path CTC decode (what EasyOCR's greedy decoder returns)."""
+    best = probs.argmax(axis=1)
+    chars = [charset[i] for t, i in enumerate(best) if i and (t == 0 or i != best[t - 1])]
+    conf = float(probs.max(axis=1).mean()) if probs.size else 0.0
+    return "".join(chars), conf
@@ -0,0 +1,178 @@
+"""
+plate_layout.py — Registration / Province Line Segmenter
+==========================================================
+
+Plate crops from the detector are tight boxes with the usual Thai layout:
+registration (e.g. ``1กข 1234``) on top, province name underneath in smaller
+glyphs. Instead of letting CRAFT find the text and regrouping tokens
+afterwards, this segments the two lines directly:
+
+  1. CLAHE → Otsu, polarity picked so the glyphs are the minority pixels
+  2. connected components, dropping specks, frame lines and screws by size
+  3. components grouped into text lines by vertical overlap
+  4. registration = the line with the tallest glyphs, province = the next
+     line below it
+
+The resulting strips are fed straight to the EasyOCR recognizer (see
+``TextBoxes`` in easyocr_batch.py). ``confidence`` summarises how much the
+result looks like a two-line plate; callers fall back to CRAFT below
+OCR_LAYOUT_MIN_CONFIDENCE.
+
+ENV (read by PlateOCR):
+  OCR_LAYOUT_SEGMENT=false
+  OCR_LAYOUT_MIN_CONFIDENCE=0.6
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .easyocr_batch import TextBoxes
+
+# [x_min, x_max, y_min, y_max] — EasyOCR's horizontal box format
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class PlateLayout:
+    registration: Optional[Box]
+    province: Optional[Box]
+    confidence: float
+    height: int
+    width: int
+    # median glyph height of the registration line, in pixels
+    char_height: float = 0.0
+
+    def scaled(self, scale: float) -> "PlateLayout":
+        """The same layout on the crop resized by ``scale``."""
+        if scale == 1.0:
+            return self
+        height, width = int(round(self.height * scale)), int(round(self.width * scale))
+
+        def box(b: Optional[Box]) -> Optional[Box]:
+            if b is None:
+                return None
+            x0, x1, y0, y1 = (int(round(v * scale)) for v in b)
+            return (max(0, x0), min(width, x1), max(0, y0), min(height, y1))
+
+        return PlateLayout(
+            box(self.registration), box(self.province), self.confidence, height, width,
+            char_height=self.char_height * scale,
+        )
+
+    def text_boxes(self) -> TextBoxes:
+        boxes = [list(b) for b in (self.registration, self.province) if b is not None]
+        return TextBoxes(horizontal=boxes, free=[], height=self.height, width=self.width)
+
+    def crop(self, image: np.ndarray, which: str) -> Optional[np.ndarray]:
+        box = self.registration if which == "registration" else self.province
+        if box is None:
+            return None
+        x0, x1, y0, y1 = box
+        strip = image[y0:y1, x0:x1]
+        return strip if strip.size else None
+
+
+@dataclass
+class _Line:
+    components: List[Tuple[int, int, int, int]]  # x, y, w, h
+    top: int
+    bottom: int
+
+    @property
+    def glyph_height(self) -> float:
+        return float(np.median([c[3] for c in self.components]))
+
+    @property
+    def x_range(self) -> Tuple[int, int]:
+        return min(c[0] for c in self.components), max(c[0] + c[2] for c in self.components)
+
+
+def segment_plate(image: np.ndarray) -> PlateLayout:
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    if h < 16 or w < 32:
+        return PlateLayout(None, None, 0.0, h, w)
+
+    clahe = cv2.createCLAHE(clipLimit=2.8, tileGridSize=(8, 8)).apply(gray)
+    binary = cv2.threshold(clahe, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    # glyphs are the minority polarity (dark-on-light and light-on-dark plates)
+    if cv2.countNonZero(binary) > 0.5 * h * w:
+        binary = cv2.bitwise_not(binary)
+
+    n, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    components = []
+    for x, y, cw, ch, area in stats[1:n]:
+        if ch < 0.10 * h or ch > 0.75 * h:
+            continue  # specks / vowel marks / frame
+        if cw > 0.35 * w or area < 10:
+            continue  # border lines, noise
+        components.append((int(x), int(y), int(cw), int(ch)))
+    if len(components) < 3:
+        return PlateLayout(None, None, 0.0, h, w)
+
+    lines = _group_lines(components)
+    lines = [line for line in lines if len(line.components) >= 2]
+    if not lines:
+        return PlateLayout(None, None, 0.0, h, w)
+
+    reg_idx = max(range(len(lines)), key=lambda i: (lines[i].glyph_height, len(lines[i].components)))
+    registration = lines[reg_idx]
+    province = lines[reg_idx + 1] if reg_idx + 1 < len(lines) else None
+
+    confidence = min(1.0, len(registration.components) / 4.0)
+    reg_x0, reg_x1 = registration.x_range
+    if (reg_x1 - reg_x0) < 0.4 * w:
+        confidence *= 0.5
+    if province is not None:
+        if province.top < registration.bottom:
+            confidence *= 0.5
+        if province.glyph_height > registration.glyph_height:
+            confidence *= 0.5
+    else:
+        confidence *= 0.7
+    # lines above the registration (dealer headers) or a third line
+    # (motorcycle layout) are not the layout this segmenter assumes
+    if len(lines) > 2 or reg_idx > 0:
+        confidence *= 0.5
+
+    return PlateLayout(
+        registration=_padded_box(registration, h, w),
+        province=_padded_box(province, h, w) if province is not None else None,
+        confidence=float(confidence),
+        height=h,
+        width=w,
+        char_height=registration.glyph_height,
+    )
+
+
+def _group_lines(components: List[Tuple[int, int, int, int]]) -> List[_Line]:
+    lines: List[_Line] = []
+    for comp in sorted(components, key=lambda c: c[1] + c[3] / 2.0):
+        _, y, _, ch = comp
+        for line in lines:
+            overlap = min(line.bottom, y + ch) - max(line.top, y)
+            if overlap >= 0.5 * min(ch, line.bottom - line.top):
+                line.components.append(comp)
+                line.top = min(line.top, y)
+                line.bottom = max(line.bottom, y + ch)
+                break
+        else:
+            lines.append(_Line([comp], y, y + ch))
+    return sorted(lines, key=lambda line: line.top)
+
+
+def _padded_box(line: _Line, h: int, w: int) -> Box:
+    x0, x1 = line.x_range
+    pad_y = max(2, int(round(0.15 * (line.bottom - line.top))))
+    pad_x = max(2, int(round(0.03 * w)))
+    return (
+        max(0, x0 - pad_x),
+        min(w, x1 + pad_x),
+        max(0, line.top - pad_y),
+        min(h, line.bottom + pad_y),
+    )
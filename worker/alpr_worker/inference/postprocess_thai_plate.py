@@ -4,8 +4,11 @@ import json
 import logging
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
+
 from .provinces import match_province, normalize_province, province_candidates
 
 log = logging.getLogger(__name__)
@@ -29,6 +32,8 @@ _PLATE_PATTERNS = [
     # ป้ายรถบรรทุก (Thai char + digits: ท991234 = ท.99-1234)
     re.compile(r"^[ก-ฮ]\d{5,6}$"),
 ]
+# all of the above as one alternation (plate_pattern_match runs per candidate)
+_PLATE_PATTERN_RE = re.compile("^(?:" + "|".join(p.pattern[1:-1] for p in _PLATE_PATTERNS) + ")$")
 
 _CONFUSABLE_PAIRS = {
     ("ข", "ฆ"), ("ฆ", "ข"), ("ข", "ม"), ("ม", "ข"),
@@ -38,6 +43,16 @@ _CONFUSABLE_PAIRS = {
     ("ถ", "ก"), ("ก", "ถ"), ("ถ", "ค"), ("ค", "ถ"),
     ("ฎ", "ภ"), ("ภ", "ฎ"), ("ช", "ษ"), ("ษ", "ช"),
 }
+_CONFUSABLE_COST = 0.35
+
+# Substitution cost table over the normalized plate alphabet (digits + ก-ฮ)
+_PLATE_ALPHABET = "0123456789" + "".join(chr(c) for c in range(ord("ก"), ord("ฮ") + 1))
+_ALPHABET_INDEX = {ch: i for i, ch in enumerate(_PLATE_ALPHABET)}
+_SUBSTITUTION_COST = np.ones((len(_PLATE_ALPHABET), len(_PLATE_ALPHABET)), dtype=np.float64)
+np.fill_diagonal(_SUBSTITUTION_COST, 0.0)
+for _a, _b in _CONFUSABLE_PAIRS:
+    _SUBSTITUTION_COST[_ALPHABET_INDEX[_a], _ALPHABET_INDEX[_b]] = _CONFUSABLE_COST
+del _a, _b
 
 
 @dataclass
@@ -64,9 +79,9 @@ def normalize_plate_text(text: str) -> str:
     return cleaned
 
 
+@lru_cache(maxsize=32768)
 def plate_pattern_match(text: str) -> bool:
-    normalized = normalize_plate_text(text)
-    return any(pattern.match(normalized) for pattern in _PLATE_PATTERNS)
+    return bool(_PLATE_PATTERN_RE.match(normalize_plate_text(text)))
 
 
 def is_pure_numeric_plate(text: str) -> bool:
@@ -108,7 +123,7 @@ def confusion_aware_distance(a: str, b: str) -> float:
             if a_norm[i - 1] == b_norm[j - 1]:
                 cost = 0.0
             elif (a_norm[i - 1], b_norm[j - 1]) in _CONFUSABLE_PAIRS:
-                cost = 0.35
+                cost = _CONFUSABLE_COST
             else:
                 cost = 1.0
             dp[i][j] = min(
@@ -119,21 +134,59 @@ def confusion_aware_distance(a: str, b: str) -> float:
     return dp[-1][-1]
 
 
-def _confusable_bonus(text: str, peers: Sequence[str]) -> float:
-    best = None
-    for other in peers:
-        if other == text:
-            continue
-        dist = confusion_aware_distance(text, other)
-        if best is None or dist < best:
-            best = dist
-    if best is None:
-        return 0.0
-    if best <= 1.0:
-        return 0.08
-    if best <= 1.5:
-        return 0.04
-    return 0.0
+def confusion_distance_matrix(texts: Sequence[str]) -> np.ndarray:
+    """``confusion_aware_distance`` for every pair of normalized plate texts at once.
+
+    One Levenshtein DP for all pairs, row by row: substitution and deletion
+    are vectorized over pairs and columns, insertion is a running minimum
+    along the row (min_k dp[k] + (j - k)). Returns a symmetric n x n matrix.
+    """
+    n = len(texts)
+    dist = np.zeros((n, n), dtype=np.float64)
+    if n < 2:
+        return dist
+    lengths = np.array([len(t) for t in texts], dtype=np.int64)
+    width = max(int(lengths.max()), 1)
+    codes = np.zeros((n, width), dtype=np.int64)
+    for k, text in enumerate(texts):
+        codes[k, : len(text)] = [_ALPHABET_INDEX[ch] for ch in text]
+
+    left, right = np.triu_indices(n, k=1)
+    a_len, b_len = lengths[left], lengths[right]
+    # cost[p, i, j]: substituting b[j] for a[i] in pair p
+    cost = _SUBSTITUTION_COST[codes[left][:, :, None], codes[right][:, None, :]]
+    steps = np.arange(width + 1, dtype=np.float64)
+    pairs = np.arange(len(left))
+
+    row = np.broadcast_to(steps, (len(left), width + 1)).copy()
+    result = row[pairs, b_len].copy()  # a is empty
+    for i in range(1, int(a_len.max()) + 1):
+        diagonal = row[:, :-1] + cost[:, i - 1, :]
+        above = row[:, 1:] + 1.0
+        candidate = np.empty_like(row)
+        candidate[:, 0] = float(i)
+        candidate[:, 1:] = np.minimum(diagonal, above)
+        row = np.minimum.accumulate(candidate - steps, axis=1) + steps
+        done = a_len == i
+        result[done] = row[done, b_len[done]]
+
+    # the scalar DP adds the same terms in a different order; keep 0.35-step
+    # sums exact for the threshold comparisons
+    result = np.round(result, 6)
+    dist[left, right] = result
+    dist[right, left] = result
+    return dist
+
+
+def _confusable_bonuses(texts: Sequence[str]) -> List[float]:
+    """Per text: bonus for having a near (confusion-aware) peer among ``texts``."""
+    if not texts:
+        return []
+    dist = confusion_distance_matrix(texts)
+    same = np.array([[a == b for b in texts] for a in texts], dtype=bool)
+    dist[same] = np.inf
+    nearest = dist.min(axis=1)
+    return [0.08 if d <= 1.0 else 0.04 if d <= 1.5 else 0.0 for d in nearest]
 
 
 def rerank_plate_candidates(
@@ -154,29 +207,32 @@ def rerank_plate_candidates(
 
     max_score = max(float(c.get("score", 0.0)) for c in candidates) or 1.0
     variant_count = max(variant_count, 1)
-    peers = [normalize_plate_text(str(c.get("text", ""))) for c in candidates]
+    texts = [normalize_plate_text(str(c.get("text", ""))) for c in candidates]
+
+    # Everything but the two weights is the same in both scoring passes
+    avg_conf = np.array([float(c.get("avg_conf", 0.0)) for c in candidates])
+    consensus_ratio = np.array([float(c.get("consensus_ratio", 0.0)) for c in candidates])
+    count_ratio = np.array([float(c.get("count", 0)) for c in candidates]) / variant_count
+    score_ratio = np.array([float(c.get("score", 0.0)) for c in candidates]) / max_score
+    pattern_matched = [plate_pattern_match(text) for text in texts]
+    pattern_sign = np.array([1.0 if matched else -1.0 for matched in pattern_matched])
+    bonus = np.array(_confusable_bonuses(texts))
 
     def build_scores(consensus_weight: float, pattern_weight: float) -> List[Dict[str, object]]:
-        scored: List[Dict[str, object]] = []
-        for cand in candidates:
-            text = normalize_plate_text(str(cand.get("text", "")))
-            avg_conf = float(cand.get("avg_conf", 0.0))
-            consensus_ratio = float(cand.get("consensus_ratio", 0.0))
-            count_ratio = float(cand.get("count", 0)) / variant_count
-            score_ratio = float(cand.get("score", 0.0)) / max_score
-            base_score = (0.45 * avg_conf) + (consensus_weight * consensus_ratio) + (0.2 * count_ratio)
-            pattern_matched = plate_pattern_match(text)
-            final = base_score + (0.15 * score_ratio) + (pattern_weight * (1.0 if pattern_matched else -1.0))
-            final += _confusable_bonus(text, peers)
-            scored.append({
+        base_score = (0.45 * avg_conf) + (consensus_weight * consensus_ratio) + (0.2 * count_ratio)
+        final = base_score + (0.15 * score_ratio) + (pattern_weight * pattern_sign) + bonus
+        scored: List[Dict[str, object]] = [
+            {
                 "text": text,
-                "avg_conf": avg_conf,
-                "consensus_ratio": consensus_ratio,
+                "avg_conf": float(avg_conf[k]),
+                "consensus_ratio": float(consensus_ratio[k]),
                 "count": int(cand.get("count", 0)),
                 "score": float(cand.get("score", 0.0)),
-                "final_score": float(final),
-                "pattern_match": pattern_matched,
-            })
+                "final_score": float(final[k]),
+                "pattern_match": pattern_matched[k],
+            }
+            for k, (cand, text) in enumerate(zip(candidates, texts))
+        ]
         scored.sort(key=lambda item: item["final_score"], reverse=True)
         return scored
 
@@ -235,6 +291,11 @@ def resolve_province(
     roi_score = float(roi_province.get("score") or 0.0)
     if roi_name:
         candidates[roi_name] = max(candidates.get(roi_name, 0.0), roi_score)
+    # ranked runners-up from the province lexicon (OCR_PROVINCE_LEXICON)
+    for item in roi_province.get("candidates") or []:
+        name = str(item.get("name") or "")
+        if name:
+            candidates[name] = max(candidates.get(name, 0.0), float(item.get("score") or 0.0))
 
     resolved = [
         {"name": name, "score": score}
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import re
 import unicodedata
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from rapidfuzz import fuzz, process
 
@@ -47,6 +48,7 @@ PROVINCE_ALIASES: Dict[str, str] = {
 }
 
 
+@lru_cache(maxsize=4096)
 def normalize_thai_text(text: str) -> str:
     txt = unicodedata.normalize("NFKC", (text or "").strip().lower())
     txt = txt.replace("ฯ", "").replace("ํ", "")
@@ -59,28 +61,86 @@ def normalize_thai_text(text: str) -> str:
 _NORMALIZED_PROVINCES = {normalize_thai_text(name): name for name in THAI_PROVINCES}
 _NORMALIZED_ALIASES = {normalize_thai_text(alias): target for alias, target in PROVINCE_ALIASES.items()}
 
+# ----------------------------
+# Prebuilt matching index
+# ----------------------------
+# RapidFuzz choice lists, built once instead of per call
+_PROVINCE_CHOICES: Tuple[str, ...] = tuple(_NORMALIZED_PROVINCES)
+_ALIAS_CHOICES: Tuple[str, ...] = tuple(_NORMALIZED_ALIASES)
+_PROVINCE_SET = frozenset(THAI_PROVINCES)
 
-def match_province(text: str, threshold: int = 70) -> Tuple[str, float]:
-    cleaned = normalize_thai_text(text)
-    if not cleaned:
-        return "", 0.0
 
-    if "กรุงเทพ" in cleaned or "กรงเทพ" in cleaned or "มหานคร" in cleaned:
-        return "กรุงเทพมหานคร", 100.0
-    if cleaned in _NORMALIZED_ALIASES:
-        return _NORMALIZED_ALIASES[cleaned], 100.0
-    if cleaned in _NORMALIZED_PROVINCES:
-        return _NORMALIZED_PROVINCES[cleaned], 100.0
+def _bigrams(text: str) -> frozenset:
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
 
-    for normalized, province in _NORMALIZED_PROVINCES.items():
+# Inverted index for the substring / overlap rule: bigram (or, for one-character
+# reads, character) -> positions in _PROVINCE_CHOICES. Every normalized name has
+# at least two characters, so each one has a bigram.
+_CHOICE_BIGRAMS: Tuple[frozenset, ...] = tuple(_bigrams(key) for key in _PROVINCE_CHOICES)
+_BIGRAM_INDEX: Dict[str, Tuple[int, ...]] = {}
+_CHAR_INDEX: Dict[str, Tuple[int, ...]] = {}
+for _pos, _key in enumerate(_PROVINCE_CHOICES):
+    for _gram in _CHOICE_BIGRAMS[_pos]:
+        _BIGRAM_INDEX[_gram] = _BIGRAM_INDEX.get(_gram, ()) + (_pos,)
+    for _ch in set(_key):
+        _CHAR_INDEX[_ch] = _CHAR_INDEX.get(_ch, ()) + (_pos,)
+del _pos, _key, _gram, _ch
+
+
+def _overlap_hits(cleaned: str, threshold: float) -> List[Tuple[str, float]]:
+    """Provinces whose normalized name contains, or is contained in, ``cleaned``.
+
+    Same result and order as scanning every name: the bigram postings narrow
+    the scan to names that share all of the shorter string's bigrams, then
+    the substring test confirms.
+    """
+    grams = _bigrams(cleaned)
+    if grams:
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for pos in _BIGRAM_INDEX.get(gram, ()):
+                shared[pos] = shared.get(pos, 0) + 1
+        positions = sorted(
+            pos for pos, count in shared.items()
+            if count == len(grams) or count == len(_CHOICE_BIGRAMS[pos])
+        )
+    else:
+        positions = list(_CHAR_INDEX.get(cleaned, ()))
+
+    hits: List[Tuple[str, float]] = []
+    for pos in positions:
+        normalized = _PROVINCE_CHOICES[pos]
         if cleaned in normalized or normalized in cleaned:
             overlap = min(len(cleaned), len(normalized)) / max(len(cleaned), len(normalized))
             score = 74.0 + overlap * 20.0
             if score >= threshold:
-                return province, score
+                hits.append((_NORMALIZED_PROVINCES[normalized], score))
+    return hits
+
+
+def _exact_match(cleaned: str) -> str:
+    if "กรุงเทพ" in cleaned or "กรงเทพ" in cleaned or "มหานคร" in cleaned:
+        return "กรุงเทพมหานคร"
+    if cleaned in _NORMALIZED_ALIASES:
+        return _NORMALIZED_ALIASES[cleaned]
+    return _NORMALIZED_PROVINCES.get(cleaned, "")
+
+
+# OCR repeats the same few strings across variants and passes, so both lookups
+# are memoized on the normalized text.
+@lru_cache(maxsize=4096)
+def _match_normalized(cleaned: str, threshold: float) -> Tuple[str, float]:
+    exact = _exact_match(cleaned)
+    if exact:
+        return exact, 100.0
 
-    province_hit = process.extractOne(cleaned, list(_NORMALIZED_PROVINCES.keys()), scorer=fuzz.WRatio)
-    alias_hit = process.extractOne(cleaned, list(_NORMALIZED_ALIASES.keys()), scorer=fuzz.WRatio)
+    hits = _overlap_hits(cleaned, threshold)
+    if hits:
+        return hits[0]
+
+    province_hit = process.extractOne(cleaned, _PROVINCE_CHOICES, scorer=fuzz.WRatio)
+    alias_hit = process.extractOne(cleaned, _ALIAS_CHOICES, scorer=fuzz.WRatio)
 
     candidate = ""
     score = 0.0
@@ -101,31 +161,29 @@ def match_province(text: str, threshold: int = 70) -> Tuple[str, float]:
     return _NORMALIZED_PROVINCES.get(candidate, ""), score
 
 
-def province_candidates(text: str, limit: int = 3, threshold: int = 70) -> List[Tuple[str, float]]:
+def match_province(text: str, threshold: int = 70) -> Tuple[str, float]:
     cleaned = normalize_thai_text(text)
     if not cleaned:
-        return []
+        return "", 0.0
+    return _match_normalized(cleaned, threshold)
 
-    candidates: List[Tuple[str, float]] = []
-    if "กรุงเทพ" in cleaned or "กรงเทพ" in cleaned or "มหานคร" in cleaned:
-        return [("กรุงเทพมหานคร", 100.0)]
-    if cleaned in _NORMALIZED_ALIASES:
-        return [(_NORMALIZED_ALIASES[cleaned], 100.0)]
-    if cleaned in _NORMALIZED_PROVINCES:
-        return [(_NORMALIZED_PROVINCES[cleaned], 100.0)]
 
-    overlap_hits: List[Tuple[str, float]] = []
-    for normalized, province in _NORMALIZED_PROVINCES.items():
-        if cleaned in normalized or normalized in cleaned:
-            overlap = min(len(cleaned), len(normalized)) / max(len(cleaned), len(normalized))
-            score = 74.0 + overlap * 20.0
-            if score >= threshold:
-                overlap_hits.append((province, score))
+@lru_cache(maxsize=4096)
+def _candidates_normalized(cleaned: str, limit: int, threshold: float) -> Tuple[Tuple[str, float], ...]:
+    exact = _exact_match(cleaned)
+    if exact:
+        return ((exact, 100.0),)
+
+    candidates: List[Tuple[str, float]] = []
+    overlap_hits = _overlap_hits(cleaned, threshold)
     overlap_hits.sort(key=lambda item: item[1], reverse=True)
     candidates.extend(overlap_hits[:limit])
 
-    province_hits = process.extract(cleaned, list(_NORMALIZED_PROVINCES.keys()), scorer=fuzz.WRatio, limit=limit)
-    alias_hits = process.extract(cleaned, list(_NORMALIZED_ALIASES.keys()), scorer=fuzz.WRatio, limit=limit)
+    # hits below threshold are dropped anyway; the cutoff lets RapidFuzz skip them early
+    province_hits = process.extract(
+        cleaned, _PROVINCE_CHOICES, scorer=fuzz.WRatio, limit=limit, score_cutoff=threshold
+    )
+    alias_hits = process.extract(cleaned, _ALIAS_CHOICES, scorer=fuzz.WRatio, limit=limit, score_cutoff=threshold)
     for candidate, score, _ in province_hits or []:
         if float(score) < float(threshold):
             continue
@@ -144,9 +202,123 @@ def province_candidates(text: str, limit: int = 3, threshold: int = 70) -> List[
         deduped.append((name, score))
         if len(deduped) >= limit:
             break
-    return deduped
+    return tuple(deduped)
+
+
+def province_candidates(text: str, limit: int = 3, threshold: int = 70) -> List[Tuple[str, float]]:
+    cleaned = normalize_thai_text(text)
+    if not cleaned:
+        return []
+    return list(_candidates_normalized(cleaned, limit, threshold))
+
+
+class ProvinceLexicon:
+    """Trie of normalized province names + aliases, searched by edit distance.
+
+    ``rank`` walks the trie once per query with Levenshtein rows and scores
+    each entry three ways (best wins, per province):
+
+      whole      query vs name                                   100 * (1 - d / max len)
+      contains   name inside a longer read (plate digits, noise)  (74 + 20 * overlap) * (1 - d / len name)
+      prefix     truncated read of the start of a name            (74 + 20 * overlap) * (1 - d / len query)
+
+    which keeps scores on the same 0-100 scale as ``match_province``. A
+    branch is dropped as soon as none of the three can reach ``min_score``
+    for the longest name below it, so the floor prunes without changing
+    any score above it.
+    """
+
+    def __init__(self, entries: Dict[str, str]) -> None:
+        # node: [children {char: node}, province ending here or None, longest entry below]
+        self.root: List[Any] = [{}, None, 0]
+        for key, province in entries.items():
+            if not key:
+                continue
+            node = self.root
+            node[2] = max(node[2], len(key))
+            for ch in key:
+                node = node[0].setdefault(ch, [{}, None, 0])
+                node[2] = max(node[2], len(key))
+            node[1] = province
+
+    def rank(self, text: str, limit: int = 3, min_score: float = 50.0) -> List[Tuple[str, float]]:
+        query = normalize_thai_text(text)
+        if not query:
+            return []
+        n = len(query)
+        # largest edit distance each alignment may reach and still score min_score
+        whole_slack = 1.0 - min_score / 100.0
+        part_slack = 1.0 - min_score / 94.0
+        # every edit beyond the query length counts too: a name much longer than
+        # the read cannot reach min_score by the whole or contains alignment
+        whole_max_len = n / (1.0 - whole_slack) if min_score > 0 else float("inf")
+        part_max_len = n / (1.0 - part_slack) if min_score > 0 else float("inf")
+        prefix_limit = n * part_slack if n >= 3 else -1.0
+        best: Dict[str, float] = {}
+
+        whole_row = list(range(n + 1))   # key prefix vs query prefix
+        inside_row = [0] * (n + 1)       # key prefix vs any query substring ending here
+        stack: List[Tuple[List[Any], List[int], Optional[List[int]], int, int]] = [
+            (self.root, whole_row, inside_row, whole_row[n], 0)
+        ]
+        while stack:
+            node, whole, inside, prefix_d, depth = stack.pop()
+            children, province, _ = node
+            if province is not None:
+                score = 100.0 * (1.0 - whole[n] / max(n, depth))
+                d_inside = min(inside) if inside is not None else depth
+                if depth >= 3 and d_inside < depth:
+                    score = max(score, (74.0 + 20.0 * depth / max(n, depth)) * (1.0 - d_inside / depth))
+                if n >= 3 and prefix_d < n:
+                    score = max(score, (74.0 + 20.0 * n / max(n, depth)) * (1.0 - prefix_d / n))
+                if score > best.get(province, 0.0):
+                    best[province] = score
+
+            for ch, child in children.items():
+                longest = child[2]
+                next_whole = [whole[0] + 1]
+                for j in range(1, n + 1):
+                    a = whole[j - 1] if query[j - 1] == ch else whole[j - 1] + 1
+                    b = whole[j] + 1
+                    c = next_whole[j - 1] + 1
+                    next_whole.append(a if a <= b and a <= c else (b if b <= c else c))
+                next_inside = None
+                if inside is not None:
+                    # row minima only grow with depth, so a dropped alignment stays dropped
+                    next_inside = [inside[0] + 1]
+                    for j in range(1, n + 1):
+                        a = inside[j - 1] if query[j - 1] == ch else inside[j - 1] + 1
+                        b = inside[j] + 1
+                        c = next_inside[j - 1] + 1
+                        next_inside.append(a if a <= b and a <= c else (b if b <= c else c))
+                    if depth + 1 > part_max_len or min(next_inside) > part_slack * longest:
+                        next_inside = None
+                whole_min = min(next_whole)
+                child_prefix = min(prefix_d, next_whole[n])
+                if (
+                    next_inside is None
+                    and (depth + 1 > whole_max_len or whole_min > whole_slack * max(n, longest))
+                    and min(child_prefix, whole_min) > prefix_limit
+                ):
+                    continue
+                stack.append((child, next_whole, next_inside, child_prefix, depth + 1))
+
+        ranked = sorted(
+            ((name, round(score, 2)) for name, score in best.items() if score >= min_score),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return ranked[:limit]
+
+
+PROVINCE_LEXICON = ProvinceLexicon({**_NORMALIZED_PROVINCES, **_NORMALIZED_ALIASES})
+
+
+@lru_cache(maxsize=2048)
+def rank_provinces(text: str, limit: int = 3, min_score: float = 50.0) -> Tuple[Tuple[str, float], ...]:
+    """Ranked ``(province, score)`` for one recognizer read, best first."""
+    return tuple(PROVINCE_LEXICON.rank(text, limit=limit, min_score=min_score))
 
 
 def normalize_province(text: str, threshold: int = 70) -> str:
     matched, _ = match_province(text, threshold=threshold)
-    return matched if matched in THAI_PROVINCES else ""
+    return matched if matched in _PROVINCE_SET else ""
@@ -0,0 +1,239 @@
+"""
+server.py — Shared Local Inference Server
+===========================================
+
+One process owns the plate detector and the EasyOCR readers; Celery worker
+children send it images over a Unix socket instead of loading their own
+copies. This keeps a single model copy in (GPU) memory, survives
+``worker_max_tasks_per_child`` recycling without reloads, and gives
+micro-batching (``batching.py``) one central place to collect requests from
+every child.
+
+Run:  python -m alpr_worker.inference.server
+
+Clients (``RemoteDetector`` / ``RemoteOCR``) fall back to in-process models
+whenever the server is not reachable, and retry the server later.
+
+Each client connection has its own thread, but a model is never entered by
+two of them at once: the TensorRT context / device buffers and the EasyOCR
+reader are not thread-safe, so every model has its own lock (a detect and
+an OCR call still overlap). With LPR_BATCH_ENABLED the models are batching
+proxies whose single batch thread already serialises the calls; they are
+not locked, so concurrent requests can still meet in one batch.
+
+ENV:
+  INFERENCE_SOCKET=/tmp/alpr-inference.sock   socket path (unset → clients stay in-process)
+  INFERENCE_AUTHKEY=                          optional shared secret for the socket
+  INFERENCE_RETRY_SEC=30                      how long clients stay in-process after a failure
+"""
+
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .batching import BatchedDetector, BatchedOCR
+
+log = logging.getLogger(__name__)
+
+
+def _socket_path() -> str:
+    return os.getenv("INFERENCE_SOCKET", "").strip()
+
+
+def _authkey() -> Optional[bytes]:
+    key = os.getenv("INFERENCE_AUTHKEY", "")
+    return key.encode() if key else None
+
+
+class InferenceUnavailable(RuntimeError):
+    """The inference server could not be reached; callers should run locally."""
+
+
+# ----------------------------
+# Server
+# ----------------------------
+def _exclusive(model: Any, method: Callable[..., Any]) -> Callable[..., Any]:
+    """``method`` behind a lock of its own, unless ``model`` is a batching proxy."""
+    if isinstance(model, (BatchedDetector, BatchedOCR)):
+        return method
+    lock = threading.Lock()
+
+    def call(*args: Any, **kwargs: Any) -> Any:
+        with lock:
+            return method(*args, **kwargs)
+
+    return call
+
+
+class InferenceServer:
+    """Serve ``detect`` / ``read_plate`` calls, one thread per client connection."""
+
+    def __init__(self, detector: Any, ocr: Any, address: str):
+        self.detector = detector
+        self.ocr = ocr
+        self.address = address
+        self._handlers = {
+            "ping": lambda: "pong",
+            "detect": _exclusive(self.detector, self.detector.detect),
+            "read_plate": _exclusive(self.ocr, self.ocr.read_plate),
+        }
+
+    def serve_forever(self) -> None:
+        path = Path(self.address)
+        if path.exists():
+            path.unlink()
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with Listener(self.address, family="AF_UNIX", authkey=_authkey()) as listener:
+            os.chmod(self.address, 0o600)
+            log.info("Inference server listening on %s", self.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    log.warning("Inference server rejected a connection: %s", e)
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                handler = self._handlers.get(method)
+                try:
+                    if handler is None:
+                        raise RuntimeError(f"Unknown inference method: {method}")
+                    reply = ("ok", handler(*args, **kwargs))
+                except Exception as e:
+                    reply = ("err", f"{type(e).__name__}: {e}" if not isinstance(e, RuntimeError) else str(e))
+
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+
+# ----------------------------
+# Client
+# ----------------------------
+class InferenceClient:
+    """Thread-safe client: each thread keeps its own connection to the server."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._local = threading.local()
+
+    def _connection(self) -> Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        try:
+            conn = self._connection()
+            conn.send((method, args, kwargs))
+            status, payload = conn.recv()
+        except (EOFError, OSError) as e:
+            self._drop_connection()
+            raise InferenceUnavailable(f"inference server unavailable: {e}") from e
+
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def ping(self) -> bool:
+        try:
+            return self.call("ping") == "pong"
+        except Exception:
+            return False
+
+
+class _RemoteModel:
+    """Forward calls to the server; run the local model while it is down."""
+
+    def __init__(self, client: InferenceClient, local_factory: Callable[[], Any]):
+        self._client = client
+        self._local_factory = local_factory
+        self._local: Optional[Any] = None
+        self._local_lock = threading.Lock()
+        self._retry_after = 0.0
+        self._retry_sec = float(os.getenv("INFERENCE_RETRY_SEC", "30"))
+
+    def _local_model(self) -> Any:
+        if self._local is None:
+            with self._local_lock:
+                if self._local is None:
+                    self._local = self._local_factory()
+        return self._local
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if time.monotonic() >= self._retry_after:
+            try:
+                return self._client.call(method, *args, **kwargs)
+            except InferenceUnavailable as e:
+                log.warning("%s; running %s in-process for %.0fs", e, method, self._retry_sec)
+                self._retry_after = time.monotonic() + self._retry_sec
+        return getattr(self._local_model(), method)(*args, **kwargs)
+
+
+class RemoteDetector(_RemoteModel):
+    def detect(self, bgr):
+        return self._call("detect", bgr)
+
+
+class RemoteOCR(_RemoteModel):
+    def read_plate(self, crop, debug_dir=None, debug_id=None, camera_id=""):
+        return self._call("read_plate", crop, debug_dir=debug_dir, debug_id=debug_id, camera_id=camera_id)
+
+    def read(self, crop):
+        return self.read_plate(crop)
+
+
+def connect_remote(kind: str, local_factory: Callable[[], Any]) -> Optional[Any]:
+    """Return a Remote{Detector,OCR} if ``INFERENCE_SOCKET`` points at a live server."""
+    address = _socket_path()
+    if not address or not Path(address).exists():
+        return None
+
+    client = InferenceClient(address)
+    if not client.ping():
+        log.warning("Inference server at %s did not answer; using in-process %s", address, kind)
+        return None
+
+    log.info("Using shared inference server at %s for %s", address, kind)
+    remote_cls = RemoteDetector if kind == "detector" else RemoteOCR
+    return remote_cls(client, local_factory)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    address = _socket_path() or "/tmp/alpr-inference.sock"
+
+    # Load exactly the models a worker would load in-process.
+    from ..tasks import load_local_detector, load_local_ocr
+
+    server = InferenceServer(load_local_detector(), load_local_ocr(), address)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+timing.py — Sampled Per-stage Latency Tracing
+===============================================
+
+``process_lpr_task`` opens a trace for a sampled fraction of tasks; code on
+the same thread (including ``PlateOCR.read_plate``) records stages into it
+via ``current_timer()``. Unsampled tasks get a no-op timer, so the cost when
+tracing is off is one context-variable lookup per stage.
+
+Sampled timings are attached to the task result as ``timings_ms`` and
+observed into the ``lpr_stage_seconds`` Prometheus histogram (label
+``stage``). Work that runs on another thread or process (micro-batching,
+shared inference server) shows up only as the enclosing task-level stage;
+the exception is VariantPool (variant_pool.py), whose threads record into the
+caller's trace, so parallel ``ocr.variant.*`` stages can sum to more than the
+wall time of ``ocr``.
+
+ENV:
+  LPR_TRACE_SAMPLE_RATE=0      fraction of tasks to trace (0 = off, 1 = all)
+  LPR_METRICS_PORT=            serve /metrics on this port from the first traced process
+"""
+
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional, Union
+
+log = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Histogram, start_http_server
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_stage_histogram = None
+_metrics_started = False
+
+
+def _histogram():
+    global _stage_histogram, _metrics_started
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if _stage_histogram is None:
+        _stage_histogram = Histogram(
+            "lpr_stage_seconds", "Latency of process_lpr_task / OCR stages", ["stage"],
+            buckets=_STAGE_BUCKETS,
+        )
+    port = os.getenv("LPR_METRICS_PORT", "").strip()
+    if port and not _metrics_started:
+        _metrics_started = True
+        try:
+            start_http_server(int(port))
+            log.info("Stage metrics served on :%s/metrics", port)
+        except OSError as e:
+            # another worker child already owns the port
+            log.debug("Stage metrics server not started: %s", e)
+    return _stage_histogram
+
+
+class StageTimer:
+    """Accumulates wall time per stage name (repeated stages are summed)."""
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        out = {name: round(sec * 1000.0, 2) for name, sec in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self._started) * 1000.0, 2)
+        return out
+
+    def export(self) -> None:
+        histogram = _histogram()
+        if histogram is None:
+            return
+        for name, seconds in self.stages.items():
+            histogram.labels(stage=name).observe(seconds)
+        histogram.labels(stage="total").observe(time.perf_counter() - self._started)
+
+
+class _NoopTimer:
+    enabled = False
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def add(self, name: str, seconds: float) -> None:
+        pass
+
+    def as_dict(self) -> Dict[str, float]:
+        return {}
+
+    def export(self) -> None:
+        pass
+
+
+NOOP_TIMER = _NoopTimer()
+AnyTimer = Union[StageTimer, _NoopTimer]
+
+_current: "contextvars.ContextVar[Optional[StageTimer]]" = contextvars.ContextVar("lpr_stage_timer", default=None)
+
+
+def current_timer() -> AnyTimer:
+    return _current.get() or NOOP_TIMER
+
+
+def _sample_rate() -> float:
+    try:
+        return float(os.getenv("LPR_TRACE_SAMPLE_RATE", "0"))
+    except ValueError:
+        return 0.0
+
+
+@contextmanager
+def trace(sample_rate: Optional[float] = None) -> Iterator[AnyTimer]:
+    """Make a timer current for this block if the task is sampled."""
+    rate = _sample_rate() if sample_rate is None else sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        yield NOOP_TIMER
+        return
+
+    timer = StageTimer()
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+        timer.export()
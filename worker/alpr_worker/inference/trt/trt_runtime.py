@@ -23,6 +23,7 @@ class _Binding:
     is_input: bool
     nbytes: int
     dptr: int  # device pointer (int)
+    capacity: int = 0  # allocated device bytes (>= nbytes)
 
 
 class TensorRTRuntime:
@@ -30,9 +31,13 @@ class TensorRTRuntime:
     TensorRT runtime wrapper without PyCUDA (uses cuda-python / cudart).
 
     Assumptions (typical for YOLOv8 detector):
-      - batch fixed 1
+      - batch fixed 1, or dynamic batch when the engine was built with a
+        batch optimisation profile (buffers are sized for ``max_batch``)
       - 1 input, >=1 output (we return the first output)
       - input dtype float32 NCHW
+
+    Env:
+      TRT_MAX_BATCH=8   cap for dynamic-batch engines
     """
 
     def __init__(self, engine_path: str):
@@ -67,15 +72,20 @@ class TensorRTRuntime:
         self.inputs: List[_Binding] = []
         self.outputs: List[_Binding] = []
 
-        # Resolve dynamic shapes for inputs if needed
+        # Resolve dynamic shapes for inputs if needed. Buffers are allocated
+        # at the largest batch the profile allows so infer() can run batches.
+        self.max_batch = 1
         for i in range(self.engine.num_bindings):
             if self.engine.binding_is_input(i):
                 shape = tuple(self.engine.get_binding_shape(i))
                 if any(d == -1 for d in shape):
                     in_h = int(os.getenv("TRT_INPUT_H", "640"))
                     in_w = int(os.getenv("TRT_INPUT_W", "640"))
+                    if shape[0] == -1:
+                        profile_max = self.engine.get_profile_shape(0, i)[2]
+                        self.max_batch = max(1, min(int(profile_max[0]), int(os.getenv("TRT_MAX_BATCH", "8"))))
                     # assume NCHW
-                    new_shape = (1, 3, in_h, in_w)
+                    new_shape = (self.max_batch, 3, in_h, in_w)
                     self.context.set_binding_shape(i, new_shape)
 
         # Allocate device buffers
@@ -100,6 +110,7 @@ class TensorRTRuntime:
                 is_input=is_input,
                 nbytes=nbytes,
                 dptr=int(dptr),
+                capacity=nbytes,
             )
             if is_input:
                 self.inputs.append(b)
@@ -111,7 +122,7 @@ class TensorRTRuntime:
         if not self.outputs:
             raise RuntimeError("No output bindings found.")
 
-        log.info("TensorRT engine loaded: %s", engine_path)
+        log.info("TensorRT engine loaded: %s (max_batch=%d)", engine_path, self.max_batch)
         for b in self.inputs + self.outputs:
             log.info("binding[%d] %s %s shape=%s dtype=%s nbytes=%d",
                      b.index, "IN " if b.is_input else "OUT", b.name, b.shape, b.dtype, b.nbytes)
@@ -139,10 +150,16 @@ class TensorRTRuntime:
 
         # If input shape differs and engine supports dynamic shapes, set binding shape
         if tuple(x.shape) != tuple(inp.shape):
+            nbytes = int(np.prod(x.shape) * inp.dtype.itemsize)
+            if nbytes > inp.capacity:
+                raise RuntimeError(
+                    f"Input shape {tuple(x.shape)} exceeds allocated buffer "
+                    f"({inp.capacity} bytes, max_batch={self.max_batch})"
+                )
             self.context.set_binding_shape(inp.index, tuple(x.shape))
             # update cached shapes for output too
             inp.shape = tuple(x.shape)
-            inp.nbytes = int(np.prod(inp.shape) * inp.dtype.itemsize)
+            inp.nbytes = nbytes
 
         # H2D
         host = np.ascontiguousarray(x).ravel()
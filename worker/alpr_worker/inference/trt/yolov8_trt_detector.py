@@ -7,7 +7,7 @@ import uuid
 import logging
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, List, Union
 
 import cv2
 import numpy as np
@@ -22,6 +22,7 @@ class TRTDetectionResult:
     crop_path: str
     det_conf: float
     bbox: Dict[str, Any]
+    crop: Optional[np.ndarray] = None
 
 
 # ----------------------------
@@ -298,16 +299,55 @@ class YOLOv8TRTPlateDetector:
         boxes[:, 3] = np.clip(boxes[:, 3], 0, h0 - 1)
         return boxes
 
-    def detect_and_crop(self, image_path: str) -> TRTDetectionResult:
-        bgr0 = cv2.imread(image_path)
-        if bgr0 is None:
-            raise RuntimeError(f"Cannot read image: {image_path}")
+    def detect(self, bgr0: np.ndarray) -> TRTDetectionResult:
+        """Detect the best plate in an in-memory BGR image (no disk I/O)."""
+        result = self.detect_batch([bgr0])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
 
-        h0, w0 = bgr0.shape[:2]
-        inp, lb = self._preprocess(bgr0)
+    def detect_batch(self, images: List[np.ndarray]) -> List[Union[TRTDetectionResult, Exception]]:
+        """
+        Detect plates for several images with batched letterbox + inference.
 
-        # TensorRT infer
-        y = self.trt.infer(inp)
+        Images are stacked up to the engine's ``max_batch`` (1 for static
+        engines, in which case this is a plain loop). Per-image failures are
+        returned in place as exceptions so one bad crop doesn't fail the batch.
+        """
+        results: List[Union[TRTDetectionResult, Exception]] = [
+            RuntimeError("Empty image passed to detector") for _ in images
+        ]
+        prepared: List[Tuple[int, np.ndarray, LetterboxResult, np.ndarray]] = []
+        for i, bgr0 in enumerate(images):
+            if bgr0 is None or bgr0.size == 0:
+                continue
+            try:
+                inp, lb = self._preprocess(bgr0)
+            except Exception as e:
+                results[i] = e
+                continue
+            prepared.append((i, inp, lb, bgr0))
+
+        max_batch = max(1, int(getattr(self.trt, "max_batch", 1)))
+        for start in range(0, len(prepared), max_batch):
+            chunk = prepared[start:start + max_batch]
+            try:
+                # TensorRT infer
+                y = np.asarray(self.trt.infer(np.concatenate([item[1] for item in chunk], axis=0)))
+            except Exception as e:
+                for i, _, _, _ in chunk:
+                    results[i] = e
+                continue
+
+            for j, (i, _, lb, bgr0) in enumerate(chunk):
+                try:
+                    results[i] = self._detect_from_output(y[j:j + 1], lb, bgr0)
+                except Exception as e:
+                    results[i] = e
+        return results
+
+    def _detect_from_output(self, y: np.ndarray, lb: LetterboxResult, bgr0: np.ndarray) -> TRTDetectionResult:
+        h0, w0 = bgr0.shape[:2]
 
         # Decode
         boxes_inp, scores, class_ids = self._decode_outputs(y)
@@ -341,10 +381,6 @@ class YOLOv8TRTPlateDetector:
         if x2 <= x1 or y2 <= y1:
             raise RuntimeError(f"Invalid crop box: {(x1, y1, x2, y2)}")
 
-        crop = bgr0[y1:y2, x1:x2]
-        out_path = self.crop_dir / f"{uuid.uuid4().hex}.jpg"
-        cv2.imwrite(str(out_path), crop)
-
         meta = {
             "xyxy": [x1, y1, x2, y2],
             "score": score,
@@ -356,7 +392,26 @@ class YOLOv8TRTPlateDetector:
         }
 
         return TRTDetectionResult(
-            crop_path=str(out_path),
+            crop_path="",
             det_conf=score,
             bbox=meta,
+            crop=bgr0[y1:y2, x1:x2],
         )
+
+    def detect_and_crop(self, image: Union[str, np.ndarray]) -> TRTDetectionResult:
+        """Detect a plate and write the crop to ``STORAGE_DIR/crops``.
+
+        Accepts an image path or an in-memory BGR image.
+        """
+        if isinstance(image, np.ndarray):
+            bgr0 = image
+        else:
+            bgr0 = cv2.imread(image)
+            if bgr0 is None:
+                raise RuntimeError(f"Cannot read image: {image}")
+
+        det = self.detect(bgr0)
+        out_path = self.crop_dir / f"{uuid.uuid4().hex}.jpg"
+        cv2.imwrite(str(out_path), det.crop)
+        det.crop_path = str(out_path)
+        return det
@@ -24,9 +24,15 @@ validate.py — Thai License Plate Format Validation (CORRECTED)
 - ป้ายเหลือง/น้ำเงินที่เป็นตัวเลขล้วน มี "ชส" "ชน" etc. เป็นประเภทรถ
 - ป้ายแท็กซี่ เช่น "1ฆข 1234" ใช้ format เดียวกับรถส่วนบุคคลที่มี digit prefix
 - "1ฆ 4048" เป็น OCR อ่านขาด — จริงๆ ต้องเป็น "1ฆ[ก-ฮ] 4048"
+
+classify_plate() คืน valid + ประเภทป้าย + อาจถูกตัด ในครั้งเดียว — regex รวม
+ที่ compile ครั้งเดียว + memo ต่อข้อความ (เรียกทุก candidate ทุก variant);
+is_valid_plate มี memo ของตัวเองเพราะเป็น hot path
 """
 
 import re
+from dataclasses import dataclass
+from functools import lru_cache
 
 # === Plate format patterns (normalized — no spaces, no dashes, no dots) ===
 
@@ -54,6 +60,63 @@ PATTERNS_WITH_DASH = [
 ]
 
 
+def _combine(patterns) -> "re.Pattern[str]":
+    """One regex matching whatever any of ``patterns`` (all ^...$) matches."""
+    return re.compile("^(?:" + "|".join(p.pattern[1:-1] for p in patterns) + ")$")
+
+
+_PLATE_RE = _combine(PATTERNS)
+_PLATE_WITH_DASH_RE = _combine(PATTERNS_WITH_DASH)
+_TRUNCATED_RE = re.compile(r"^\d[ก-ฮ]\d{3,4}$")
+_SHORT_RE = re.compile(r"^[ก-ฮ0-9]+$")
+_TRUCK_RE = re.compile(r"^[ก-ฮ]\d{5,6}$")
+
+
+@dataclass(frozen=True)
+class PlateClass:
+    valid: bool
+    plate_type: str
+    truncated: bool
+
+
+_EMPTY = PlateClass(valid=False, plate_type="unknown", truncated=False)
+
+
+@lru_cache(maxsize=32768)
+def classify_plate(norm: str) -> PlateClass:
+    """
+    ความถูกต้อง + ประเภทป้าย + อาจถูกตัด ในการเรียกครั้งเดียว
+
+    Returns:
+        PlateClass(valid=is_valid_plate, plate_type=classify_plate_type,
+                   truncated=is_possibly_truncated)
+    """
+    if not norm:
+        return _EMPTY
+
+    valid = is_valid_plate(norm)
+
+    clean = norm.replace("-", "").replace(".", "").replace(" ", "")
+
+    # digit + 1 Thai char + 3-4 digits → likely missing 2nd Thai char (1ฆ4048 → 1ฆข4048)
+    # or very short text that partially matches plate patterns
+    truncated = bool(_TRUNCATED_RE.match(clean)) or (len(clean) <= 3 and bool(_SHORT_RE.match(clean)))
+
+    thai_count = sum(1 for c in clean if "\u0e01" <= c <= "\u0e2e")
+    if thai_count >= 2:
+        plate_type = "personal"  # includes taxi plates like 1ฆข1234
+    elif thai_count == 1:
+        # ท.99-1234 = ท991234 → truck; single Thai char + short digits → motorcycle
+        plate_type = "truck" if _TRUCK_RE.match(clean) else "motorcycle"
+    elif clean.isdigit():
+        plate_type = "commercial"
+    else:
+        plate_type = "unknown"
+
+    return PlateClass(valid=valid, plate_type=plate_type, truncated=truncated)
+
+
+@lru_cache(maxsize=32768)
 def is_valid_plate(norm: str) -> bool:
     """
     ตรวจสอบว่าข้อความเป็นรูปแบบทะเบียนรถไทยที่ถูกต้องหรือไม่
@@ -66,20 +129,10 @@ def is_valid_plate(norm: str) -> bool:
     """
     if not norm:
         return False
-
-    # Check with-dash patterns first (before stripping)
-    for p in PATTERNS_WITH_DASH:
-        if p.match(norm):
-            return True
-
-    # Strip dash and dot for normalized patterns
-    clean = norm.replace("-", "").replace(".", "")
-
-    for p in PATTERNS:
-        if p.match(clean):
-            return True
-
-    return False
+    # with-dash patterns first (before stripping), then dash/dot-free formats
+    return bool(_PLATE_WITH_DASH_RE.match(norm)) or bool(
+        _PLATE_RE.match(norm.replace("-", "").replace(".", ""))
+    )
 
 
 def is_possibly_truncated(norm: str) -> bool:
@@ -93,21 +146,7 @@ def is_possibly_truncated(norm: str) -> bool:
     Returns:
         True ถ้าอาจถูกตัด
     """
-    if not norm:
-        return False
-
-    clean = norm.replace("-", "").replace(".", "").replace(" ", "")
-
-    # Pattern: digit + 1 Thai char + 3-4 digits → likely missing 2nd Thai char
-    # เช่น 1ฆ4048 → should be 1ฆข4048
-    if re.match(r"^\d[ก-ฮ]\d{3,4}$", clean):
-        return True
-
-    # Very short text that partially matches plate patterns
-    if len(clean) <= 3 and re.match(r"^[ก-ฮ0-9]+$", clean):
-        return True
-
-    return False
+    return classify_plate(norm).truncated
 
 
 def classify_plate_type(norm: str) -> str:
@@ -121,29 +160,7 @@ def classify_plate_type(norm: str) -> str:
         "truck"       — ป้ายรถบรรทุก (ก.XX-XXXX format)
         "unknown"     — ไม่สามารถจำแนกได้
     """
-    if not norm:
-        return "unknown"
-
-    clean = norm.replace("-", "").replace(".", "").replace(" ", "")
-
-    # Count Thai characters
-    thai_chars = [c for c in clean if "\u0e01" <= c <= "\u0e2e"]
-
-    if len(thai_chars) >= 2:
-        return "personal"  # includes taxi plates like 1ฆข1234
-
-    if len(thai_chars) == 1:
-        # Single Thai char + long digits: truck format (ท.99-1234 = ท991234)
-        if re.match(r"^[ก-ฮ]\d{5,6}$", clean):
-            return "truck"
-        # Single Thai char + short digits: motorcycle or possibly truncated
-        return "motorcycle"
-
-    # Pure numeric → commercial/government
-    if clean.isdigit():
-        return "commercial"
-
-    return "unknown"
+    return classify_plate(norm).plate_type
 
 
 def format_plate_display(text: str) -> str:
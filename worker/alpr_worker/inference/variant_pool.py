@@ -0,0 +1,131 @@
+"""
+variant_pool.py — Parallel Variant Recognition on CPU
+=======================================================
+
+On GPU the variant images of a plate are recognized in one batch
+(OCR_RECOGNIZER_BATCH_SIZE); on CPU easyocr reads them one ``readtext`` at a
+time, and a plate crop is too small for torch / OpenCV to keep every core
+busy inside one call. ``VariantPool`` runs those calls on a few threads of
+the worker process instead (torch, ONNX Runtime and most OpenCV kernels
+release the GIL).
+
+Threads are budgeted per process so the pool does not oversubscribe the
+machine: OCR_THREAD_BUDGET, or the cores divided among the worker processes,
+split as ``workers x intra-op threads``; torch, OpenCV and the ONNX sessions
+are pinned to the intra-op share. Only the prefork pool runs a process per
+child (``cores / CELERY_WORKER_CONCURRENCY`` each); solo and threads run one
+process whose task threads all share its OCR and VariantPool, so it gets
+every core.
+
+Results are deterministic: ``map`` returns in input order, and the intra-op
+thread count is fixed per process, so a read does not depend on which
+thread ran which variant or on the order they finished.
+
+ENV:
+  OCR_VARIANT_WORKERS=0         threads reading variants in parallel (0/1 = sequential)
+  OCR_THREAD_BUDGET=0           CPU threads for this process (0 = cores / worker processes)
+  CELERY_WORKER_POOL=solo       prefork: budget / CELERY_WORKER_CONCURRENCY (4, as start.sh)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+import cv2
+
+log = logging.getLogger(__name__)
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def available_cores() -> int:
+    """Cores this process may run on (cgroup/affinity aware where the OS says)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        return max(1, os.cpu_count() or 1)
+
+
+def worker_processes() -> int:
+    """Celery worker processes on this machine (prefork children; else one)."""
+    if os.getenv("CELERY_WORKER_POOL", "solo").strip().lower() != "prefork":
+        return 1
+    return max(1, int(os.getenv("CELERY_WORKER_CONCURRENCY", "4") or 4))
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    workers: int
+    intra_op: int
+    total: int
+
+    @classmethod
+    def from_env(cls) -> "ThreadBudget":
+        total = int(os.getenv("OCR_THREAD_BUDGET", "0"))
+        if total <= 0:
+            total = max(1, available_cores() // worker_processes())
+        workers = max(1, min(int(os.getenv("OCR_VARIANT_WORKERS", "0") or 1), total))
+        return cls(workers=workers, intra_op=max(1, total // workers), total=total)
+
+
+class VariantPool:
+    """Ordered ``map`` over a small thread pool; plain ``map`` when sequential."""
+
+    def __init__(self, budget: ThreadBudget) -> None:
+        self.budget = budget
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def parallel(self) -> bool:
+        return self.budget.workers > 1
+
+    def apply_budget(self) -> None:
+        """Pin this process's intra-op threads to the budget (parallel pools only)."""
+        if not self.parallel:
+            return
+        cv2.setNumThreads(self.budget.intra_op)
+        if TORCH_AVAILABLE:
+            torch.set_num_threads(self.budget.intra_op)
+        log.info(
+            "VariantPool: %d workers x %d intra-op threads (budget %d)",
+            self.budget.workers, self.budget.intra_op, self.budget.total,
+        )
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        items = list(items)
+        if not self.parallel or len(items) < 2:
+            return [fn(item) for item in items]
+        executor = self._get_executor()
+        # each call sees the caller's context (stage timer, see timing.py)
+        futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.budget.workers,
+                        thread_name_prefix="ocr-variant",
+                        initializer=self._init_thread,
+                    )
+        return self._executor
+
+    def _init_thread(self) -> None:
+        # OpenMP keeps the thread count per thread; set it for the pool threads too
+        if TORCH_AVAILABLE:
+            torch.set_num_threads(self.budget.intra_op)
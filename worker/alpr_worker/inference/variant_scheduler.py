@@ -0,0 +1,180 @@
+"""
+variant_scheduler.py — Adaptive OCR Variant Order + Early Exit
+================================================================
+
+``PlateOCR`` used to run ``readtext`` on every configured preprocessing
+variant (up to OCR_VARIANT_LIMIT=16) for every plate. On clean plates the
+first few variants already agree, so the scheduler:
+
+  1. orders variants by historical usefulness — how often a variant's top
+     candidate was the plate's final answer (Laplace-smoothed win rate,
+     ties keep the configured order);
+  2. runs them in waves (OCR_EARLY_EXIT_MIN_VARIANTS first, then
+     OCR_EARLY_EXIT_STEP at a time) and stops once the leading candidate is a
+     valid plate pattern with enough consensus and margin.
+
+Usefulness stats are per process; set OCR_VARIANT_STATS_FILE to share them
+across restarts (each process rewrites the file every
+OCR_VARIANT_STATS_SAVE_EVERY reads — last writer wins, which is fine for
+an ordering hint).
+
+ENV:
+  OCR_EARLY_EXIT=false
+  OCR_EARLY_EXIT_MIN_VARIANTS=3       variants in the first wave
+  OCR_EARLY_EXIT_STEP=1               variants per later wave
+  OCR_EARLY_EXIT_CONSENSUS=0.75       min consensus_ratio of the leading candidate
+  OCR_EARLY_EXIT_MARGIN=0.25          min margin_ratio over the runner-up
+  OCR_VARIANT_STATS_FILE=             optional JSON file for usefulness stats
+  OCR_VARIANT_STATS_SAVE_EVERY=200
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from .validate import is_valid_plate
+
+log = logging.getLogger(__name__)
+
+
+class VariantScheduler:
+    def __init__(self) -> None:
+        self.enabled = os.getenv("OCR_EARLY_EXIT", "false").lower() == "true"
+        self.min_variants = max(1, int(os.getenv("OCR_EARLY_EXIT_MIN_VARIANTS", "3")))
+        self.step = max(1, int(os.getenv("OCR_EARLY_EXIT_STEP", "1")))
+        self.consensus_min = float(os.getenv("OCR_EARLY_EXIT_CONSENSUS", "0.75"))
+        self.margin_min = float(os.getenv("OCR_EARLY_EXIT_MARGIN", "0.25"))
+        self.stats_path = os.getenv("OCR_VARIANT_STATS_FILE", "").strip()
+        self.save_every = max(1, int(os.getenv("OCR_VARIANT_STATS_SAVE_EVERY", "200")))
+
+        self._lock = threading.Lock()
+        # variant -> [runs, wins]
+        self._stats: Dict[str, List[int]] = {}
+        self._reads = 0
+        self._variants_run = 0
+        self._variants_available = 0
+        self._early_exits = 0
+        self._load()
+
+        log.info(
+            "VariantScheduler: early_exit=%s min=%d step=%d consensus>=%.2f margin>=%.2f stats=%s",
+            self.enabled, self.min_variants, self.step, self.consensus_min, self.margin_min,
+            self.stats_path or "memory",
+        )
+
+    # ----------------------------
+    # Scheduling
+    # ----------------------------
+    def usefulness(self, name: str) -> float:
+        runs, wins = self._stats.get(name, (0, 0))
+        return (wins + 1.0) / (runs + 2.0)
+
+    def order(self, names: Sequence[str]) -> List[str]:
+        """Most useful variants first (stable, so unseen variants keep config order)."""
+        if not self.enabled:
+            return list(names)
+        with self._lock:
+            return sorted(names, key=lambda name: -self.usefulness(name))
+
+    def wave_size(self, already_run: int) -> int:
+        """Variants to run next, up to the next exit check of a run from zero.
+
+        Checks fall after min_variants and then every ``step``, also when a
+        read resumes after some variants ran elsewhere (the OCR cascade).
+        """
+        if already_run < self.min_variants:
+            return self.min_variants - already_run
+        return self.step - (already_run - self.min_variants) % self.step
+
+    def is_decisive(self, best: Dict[str, Any], variants_run: int) -> bool:
+        return (
+            variants_run >= self.min_variants
+            and bool(best.get("text"))
+            and best.get("consensus_ratio", 0.0) >= self.consensus_min
+            and best.get("margin_ratio", 0.0) >= self.margin_min
+            and is_valid_plate(best["text"])
+        )
+
+    # ----------------------------
+    # Feedback
+    # ----------------------------
+    def record(
+        self,
+        variant_results: Sequence[Dict[str, Any]],
+        best_text: str,
+        variants_available: int,
+        early_exit: bool,
+    ) -> None:
+        """Credit variants whose own top candidate matched the final plate text."""
+        save = False
+        with self._lock:
+            variants_run = 0
+            for result in variant_results:
+                name = result.get("variant", "")
+                if not name or name.startswith("roi_"):
+                    continue
+                variants_run += 1
+                entry = self._stats.setdefault(name, [0, 0])
+                entry[0] += 1
+                candidates = result.get("candidates") or []
+                if best_text and candidates and candidates[0].get("text") == best_text:
+                    entry[1] += 1
+
+            self._reads += 1
+            self._variants_run += variants_run
+            self._variants_available += variants_available
+            self._early_exits += int(early_exit)
+            if self._reads % self.save_every == 0:
+                save = True
+                log.info(
+                    "Variant scheduler: reads=%d avg_variants_run=%.2f/%.2f early_exit=%.1f%%",
+                    self._reads,
+                    self._variants_run / self._reads,
+                    self._variants_available / self._reads,
+                    100.0 * self._early_exits / self._reads,
+                )
+        if save:
+            self._save()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "reads": self._reads,
+                "variants_run": self._variants_run,
+                "variants_available": self._variants_available,
+                "early_exits": self._early_exits,
+                "usefulness": {name: round(self.usefulness(name), 4) for name in self._stats},
+            }
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def _load(self) -> None:
+        if not self.stats_path:
+            return
+        try:
+            data = json.loads(Path(self.stats_path).read_text(encoding="utf-8"))
+            self._stats = {name: [int(v[0]), int(v[1])] for name, v in data.get("variants", {}).items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, IndexError) as e:
+            log.warning("Ignoring unreadable variant stats %s: %s", self.stats_path, e)
+
+    def _save(self) -> None:
+        if not self.stats_path:
+            return
+        with self._lock:
+            payload = json.dumps({"variants": self._stats}, indent=2)
+        path = Path(self.stats_path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(payload, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Could not save variant stats to %s: %s", path, e)
@@ -0,0 +1,233 @@
+"""
+variants.py — Lazy OCR Preprocessing Variants
+===============================================
+
+Registry of the preprocessing variants ``PlateOCR`` feeds to EasyOCR.
+``PlateVariants`` wraps one plate crop and builds a variant only when it is
+asked for; shared intermediates (gray, CLAHE, adaptive, Otsu, HSV, the
+yellow-plate check) are computed once per crop and reused, and every built
+variant is kept so debug output does not rebuild anything.
+
+Size control: ``normalize_char_height`` resizes a crop so its registration
+glyphs are a canonical height before any variant is built, and the upscale
+variants use ``capped_scale`` so no variant exceeds a pixel budget (their
+nominal x2/x3/x4 factor is an upper bound).
+
+Per-variant preprocessing time is recorded as ``ocr.preprocess.<name>``
+when a stage trace is active (timing.py); a shared intermediate is charged
+to the first variant that needs it.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .timing import current_timer
+
+_SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
+
+
+def capped_scale(shape: Sequence[int], factor: float, max_pixels: int) -> float:
+    """``factor``, lowered so ``shape`` scaled by it stays within ``max_pixels``.
+
+    Never below 1.0: an upscale variant of an already large crop is a copy.
+    """
+    if max_pixels <= 0:
+        return factor
+    h, w = shape[:2]
+    budget_scale = math.sqrt(max_pixels / float(max(1, h * w)))
+    return min(factor, max(1.0, budget_scale))
+
+
+def normalize_char_height(
+    image: np.ndarray,
+    char_height: float,
+    target: float,
+    min_scale: float = 0.25,
+    max_scale: float = 4.0,
+) -> Tuple[np.ndarray, float]:
+    """Resize ``image`` so glyphs of ``char_height`` px become ``target`` px."""
+    if target <= 0 or char_height <= 0:
+        return image, 1.0
+    scale = max(min_scale, min(max_scale, target / float(char_height)))
+    if abs(scale - 1.0) < 0.1:
+        return image, 1.0
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation), scale
+
+
+def deskew_plate(gray: np.ndarray) -> np.ndarray:
+    """Deskew a grayscale plate crop using the dominant contour angle.
+
+    Returns the original image when a stable angle cannot be estimated.
+    """
+    if gray.size == 0:
+        return gray
+
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return gray
+
+    contour = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(contour) < 0.05 * gray.shape[0] * gray.shape[1]:
+        return gray
+
+    rect = cv2.minAreaRect(contour)
+    angle = float(rect[-1])
+
+    # minAreaRect returns angles in [-90, 0): normalize to a small correction.
+    if angle < -45.0:
+        angle += 90.0
+    angle = max(min(angle, 30.0), -30.0)
+    if abs(angle) < 0.25:
+        return gray
+
+    h, w = gray.shape[:2]
+    center = (w / 2.0, h / 2.0)
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+class PlateVariants:
+    """Lazily built preprocessing variants of one BGR plate crop."""
+
+    def __init__(self, image: np.ndarray, max_pixels: int = 0) -> None:
+        self.image = image
+        self.max_pixels = max_pixels
+        self._cache: Dict[str, object] = {}
+        self._built: Dict[str, np.ndarray] = {}
+
+    def _memo(self, key: str, compute: Callable[[], object]):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # ----------------------------
+    # Shared intermediates
+    # ----------------------------
+    @property
+    def gray(self) -> np.ndarray:
+        return self._memo("gray", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def clahe(self) -> np.ndarray:
+        return self._memo("clahe", lambda: cv2.createCLAHE(clipLimit=2.8, tileGridSize=(8, 8)).apply(self.gray))
+
+    @property
+    def adaptive(self) -> np.ndarray:
+        return self._memo("adaptive", lambda: cv2.adaptiveThreshold(
+            self.clahe, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 3
+        ))
+
+    @property
+    def otsu(self) -> np.ndarray:
+        return self._memo("otsu", lambda: cv2.threshold(
+            self.clahe, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+        )[1])
+
+    @property
+    def hsv(self) -> np.ndarray:
+        return self._memo("hsv", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV))
+
+    @property
+    def is_yellow_plate(self) -> bool:
+        # ป้ายเหลือง (แท็กซี่, รถสาธารณะ)
+        def compute() -> bool:
+            h, w = self.image.shape[:2]
+            yellow_mask = cv2.inRange(self.hsv, np.array([18, 80, 120]), np.array([35, 255, 255]))
+            return cv2.countNonZero(yellow_mask) > (h * w * 0.15)
+        return self._memo("is_yellow_plate", compute)
+
+    @property
+    def yellow_inv(self) -> np.ndarray:
+        # ตัวอักษรดำบนพื้นเหลือง → invert
+        return self._memo("yellow_inv", lambda: cv2.bitwise_not(self.gray))
+
+    # ----------------------------
+    # Variants
+    # ----------------------------
+    def get(self, name: str) -> np.ndarray:
+        if name not in self._built:
+            with current_timer().stage(f"ocr.preprocess.{name}"):
+                self._built[name] = VARIANT_BUILDERS[name](self)
+        return self._built[name]
+
+    def build(self, names: Sequence[str]) -> List[Tuple[str, np.ndarray]]:
+        return [(name, self.get(name)) for name in names]
+
+    def built(self) -> List[Tuple[str, np.ndarray]]:
+        """Variants built so far, in build order (for debug output)."""
+        return list(self._built.items())
+
+
+def _green_mask(v: PlateVariants) -> np.ndarray:
+    green = cv2.inRange(v.hsv, np.array([35, 40, 40]), np.array([85, 255, 255]))
+    return cv2.bitwise_not(green)
+
+
+def _yellow_clahe(v: PlateVariants) -> np.ndarray:
+    if not v.is_yellow_plate:
+        return v.gray  # fallback — ไม่ใช่ป้ายเหลือง
+    return cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(v.yellow_inv)
+
+
+def _yellow_thresh(v: PlateVariants) -> np.ndarray:
+    if not v.is_yellow_plate:
+        return v.gray
+    return cv2.threshold(v.yellow_inv, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def _bilateral_clahe(v: PlateVariants) -> np.ndarray:
+    bilateral = cv2.bilateralFilter(v.gray, 9, 75, 75)
+    return cv2.createCLAHE(clipLimit=3.5, tileGridSize=(6, 6)).apply(bilateral)
+
+
+def _upscale(source: str, factor: float, interpolation: int) -> Callable[[PlateVariants], np.ndarray]:
+    def build(v: PlateVariants) -> np.ndarray:
+        f = capped_scale(v.image.shape, factor, v.max_pixels)
+        return cv2.resize(getattr(v, source), None, fx=f, fy=f, interpolation=interpolation)
+    return build
+
+
+def _upscale_x4_sharp(v: PlateVariants) -> np.ndarray:
+    f = capped_scale(v.image.shape, 4.0, v.max_pixels)
+    up4 = cv2.resize(v.clahe, None, fx=f, fy=f, interpolation=cv2.INTER_CUBIC)
+    return cv2.filter2D(up4, -1, _SHARPEN_KERNEL)
+
+
+# Registry order is the default variant order (and what OCR_VARIANT_LIMIT cuts).
+VARIANT_BUILDERS: Dict[str, Callable[[PlateVariants], np.ndarray]] = {
+    "gray": lambda v: v.gray,
+    "clahe": lambda v: v.clahe,
+    "adaptive": lambda v: v.adaptive,
+    "otsu": lambda v: v.otsu,
+    "green_mask": _green_mask,
+    # Deskew: แก้ป้ายเอียงจาก perspective ของกล้อง
+    "deskew": lambda v: deskew_plate(v.gray),
+    # Sharpen: เพิ่มขอบตัวอักษรให้ชัดขึ้น
+    "sharpen": lambda v: cv2.filter2D(v.clahe, -1, _SHARPEN_KERNEL),
+    "bilateral_clahe": _bilateral_clahe,
+    "morph_close": lambda v: cv2.morphologyEx(
+        v.otsu, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    ),
+    "yellow_clahe": _yellow_clahe,
+    "yellow_thresh": _yellow_thresh,
+    "upscale_x2": _upscale("clahe", 2.0, cv2.INTER_CUBIC),
+    "upscale_adaptive_x2": _upscale("adaptive", 2.0, cv2.INTER_NEAREST),
+    "upscale_otsu_x2": _upscale("otsu", 2.0, cv2.INTER_NEAREST),
+    "upscale_x3": _upscale("clahe", 3.0, cv2.INTER_CUBIC),
+    "upscale_x4_sharp": _upscale_x4_sharp,
+}
+
+
+def select_variant_names(names: Optional[Sequence[str]], limit: int) -> List[str]:
+    """Registry-ordered names kept by OCR_VARIANTS, cut to OCR_VARIANT_LIMIT."""
+    selected = [name for name in VARIANT_BUILDERS if not names or name in names]
+    return selected[:limit] if limit else selected
@@ -0,0 +1,332 @@
+"""
+persistence.py — LPR Read Persistence
+=======================================
+
+Writes one LPR result: ``captures`` → ``detections`` → ``plate_reads`` and,
+for high-confidence reads, the ``master_plates`` upsert.
+
+The default is the stepwise path: the original statement-per-table sequence
+with two commits. ``single`` (PostgreSQL only) writes everything as one
+chained-CTE statement and one commit, i.e. one network round trip instead of
+five or more. Compare both with ``bin/bench_db_writes.py`` against the real
+database before switching; off PostgreSQL (SQLite in replay/bench runs)
+``single`` falls back to stepwise.
+
+Checked on PostgreSQL 16 (create_all schema): both modes leave the same
+rows and master_plates values, including an idempotency_key replay and
+concurrent upserts of one plate. On a local socket their latency is the
+same; the gain from ``single`` grows with the DB round-trip time.
+
+ENV:
+  LPR_DB_WRITE_MODE=stepwise   stepwise | single
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class ReadRecord:
+    camera_id: str
+    track_id: int
+    original_path: str
+    sha256: str
+    crop_path: str
+    det_conf: float
+    plate_text: str
+    plate_text_norm: str
+    province: str
+    confidence: float
+    upsert_master: bool
+    bbox: Dict[str, Any] = field(default_factory=dict)
+    source: str = "LINE_CROSSING"
+    # Filled when the read goes through the write-behind spool (write_behind.py)
+    idempotency_key: Optional[str] = None
+    captured_at: Optional[datetime] = None
+
+
+@dataclass
+class PersistResult:
+    capture_id: int
+    detection_id: int
+    read_id: int
+
+
+_CAPTURE_COLUMNS = "source, camera_id, track_id, captured_at, original_path, sha256"
+_CAPTURE_VALUES = ":source, :camera_id, :track_id, :captured_at, :original_path, :sha256"
+_READ_COLUMNS = "detection_id, plate_text, plate_text_norm, province, confidence, status, created_at"
+_READ_VALUES = ":plate_text, :plate_text_norm, :province, :confidence, :status, :created_at"
+
+_MASTER_UPSERT = """
+    INSERT INTO master_plates (
+        plate_text_norm, display_text, province,
+        confidence, last_seen, count_seen, editable
+    )
+    VALUES (
+        :plate_text_norm, :display_text, :province,
+        :confidence, :last_seen, :count_seen, :editable
+    )
+    ON CONFLICT (plate_text_norm)
+    DO UPDATE SET
+        display_text = CASE
+            WHEN master_plates.display_text = '' AND EXCLUDED.display_text <> ''
+                THEN EXCLUDED.display_text
+            ELSE master_plates.display_text
+        END,
+        province = CASE
+            WHEN EXCLUDED.province <> '' THEN EXCLUDED.province
+            ELSE master_plates.province
+        END,
+        confidence = {greatest}(master_plates.confidence, EXCLUDED.confidence),
+        last_seen = EXCLUDED.last_seen,
+        count_seen = master_plates.count_seen + 1
+"""
+
+# Each CTE uses VALUES (not SELECT) so untyped parameters such as bbox JSON
+# and the status enum are coerced to the column types exactly as before.
+_CHAINED_INSERT = """
+    WITH cap AS (
+        INSERT INTO captures ({capture_columns})
+        VALUES ({capture_values})
+        RETURNING id
+    ),
+    det AS (
+        INSERT INTO detections (capture_id, crop_path, det_conf, bbox)
+        VALUES ((SELECT id FROM cap), :crop_path, :det_conf, :bbox)
+        RETURNING id, capture_id
+    ),
+    rd AS (
+        INSERT INTO plate_reads (""" + _READ_COLUMNS + """)
+        VALUES ((SELECT id FROM det), """ + _READ_VALUES + """)
+        RETURNING id
+    ){master_cte}
+    SELECT det.capture_id, det.id AS detection_id, rd.id AS read_id
+    FROM det, rd
+"""
+
+_MASTER_CTE = ",\n    mp AS (" + _MASTER_UPSERT.format(greatest="GREATEST") + "    RETURNING 1\n    )"
+
+
+def _params(rec: ReadRecord) -> Dict[str, Any]:
+    captured_at = rec.captured_at or datetime.now(timezone.utc)
+    return {
+        "source": rec.source,
+        "camera_id": rec.camera_id,
+        "track_id": rec.track_id,
+        "captured_at": captured_at,
+        "original_path": rec.original_path,
+        "sha256": rec.sha256,
+        "crop_path": rec.crop_path,
+        "det_conf": float(rec.det_conf),
+        "bbox": json.dumps(rec.bbox or {}, ensure_ascii=False),
+        "plate_text": (rec.plate_text[:32] if rec.plate_text else ""),
+        "plate_text_norm": (rec.plate_text_norm[:32] if rec.plate_text_norm else ""),
+        "province": (rec.province[:64] if rec.province else ""),
+        "confidence": float(rec.confidence),
+        "status": "PENDING",
+        "created_at": captured_at,
+        "idempotency_key": rec.idempotency_key,
+        # master_plates
+        "display_text": (rec.plate_text[:32] if rec.plate_text else rec.plate_text_norm),
+        "last_seen": captured_at.astimezone(timezone.utc).replace(tzinfo=None),
+        "count_seen": 1,
+        "editable": True,
+    }
+
+
+def should_upsert_master(rec: ReadRecord) -> bool:
+    return bool(rec.upsert_master and rec.plate_text_norm)
+
+
+def write_mode(db: Session, requested: Optional[str] = None) -> str:
+    mode = (requested or os.getenv("LPR_DB_WRITE_MODE", "stepwise")).strip().lower()
+    if mode == "single" and db.get_bind().dialect.name != "postgresql":
+        return "stepwise"
+    return mode if mode in ("single", "stepwise") else "stepwise"
+
+
+# engine -> (captures.idempotency_key exists, monotonic time of the check)
+_idempotency_column: Dict[Any, Tuple[bool, float]] = {}
+_SCHEMA_RECHECK_SEC = 60.0
+
+
+def idempotency_supported(db: Session) -> bool:
+    """Whether ``captures.idempotency_key`` exists in the worker's database.
+
+    The backend adds the column at startup (init_db.py / alembic 003); a worker
+    that reaches an older schema writes reads without the key until then. A
+    missing column is looked up again every ``_SCHEMA_RECHECK_SEC``.
+    """
+    bind = db.get_bind()
+    engine = getattr(bind, "engine", bind)
+    cached = _idempotency_column.get(engine)
+    now = time.monotonic()
+    if cached is not None and (cached[0] or now - cached[1] < _SCHEMA_RECHECK_SEC):
+        return cached[0]
+
+    columns = {column["name"] for column in inspect(engine).get_columns("captures")}
+    supported = "idempotency_key" in columns
+    if not supported and cached is None:
+        log.warning(
+            "captures.idempotency_key is missing; reads are written without it "
+            "(no write-behind) until the backend applies the schema"
+        )
+    elif supported and cached is not None:
+        log.info("captures.idempotency_key is now available")
+    _idempotency_column[engine] = (supported, now)
+    return supported
+
+
+def _capture_columns(rec: ReadRecord) -> Tuple[str, str]:
+    if rec.idempotency_key:
+        return f"{_CAPTURE_COLUMNS}, idempotency_key", f"{_CAPTURE_VALUES}, :idempotency_key"
+    return _CAPTURE_COLUMNS, _CAPTURE_VALUES
+
+
+def persist_read(db: Session, rec: ReadRecord, mode: Optional[str] = None) -> PersistResult:
+    """Insert capture/detection/read (+ master upsert) and commit.
+
+    With ``rec.idempotency_key`` set, a read that an earlier attempt already
+    committed is not inserted again; its existing row ids are returned.
+    """
+    try:
+        if write_mode(db, mode) == "single":
+            return _persist_single(db, rec)
+        return _persist_stepwise(db, rec)
+    except IntegrityError:
+        db.rollback()
+        existing = find_persisted(db, rec.idempotency_key) if rec.idempotency_key else None
+        if existing is None:
+            raise
+        log.info("Read %s already persisted (capture_id=%d); not inserting again",
+                 rec.idempotency_key, existing.capture_id)
+        return existing
+
+
+def find_persisted(db: Session, idempotency_key: str) -> Optional[PersistResult]:
+    row = db.execute(
+        text("""
+            SELECT c.id AS capture_id, d.id AS detection_id, r.id AS read_id
+            FROM captures c
+            JOIN detections d ON d.capture_id = c.id
+            JOIN plate_reads r ON r.detection_id = d.id
+            WHERE c.idempotency_key = :key
+            ORDER BY r.id
+            LIMIT 1
+        """),
+        {"key": idempotency_key},
+    ).first()
+    if row is None:
+        return None
+    return PersistResult(
+        capture_id=int(row.capture_id),
+        detection_id=int(row.detection_id),
+        read_id=int(row.read_id),
+    )
+
+
+def _persist_single(db: Session, rec: ReadRecord) -> PersistResult:
+    capture_columns, capture_values = _capture_columns(rec)
+    sql = _CHAINED_INSERT.format(
+        capture_columns=capture_columns,
+        capture_values=capture_values,
+        master_cte=_MASTER_CTE if should_upsert_master(rec) else "",
+    )
+    # A replayed idempotency_key fails the captures insert -> IntegrityError above.
+    row = db.execute(text(sql), _params(rec)).one()
+    db.commit()
+    return PersistResult(
+        capture_id=int(row.capture_id),
+        detection_id=int(row.detection_id),
+        read_id=int(row.read_id),
+    )
+
+
+def _persist_stepwise(db: Session, rec: ReadRecord) -> PersistResult:
+    result = insert_read_rows(db, rec)
+    if result is None:
+        # Already committed by an earlier attempt. The read rows and the master
+        # upsert share one commit when a key is set, so the count was applied then.
+        db.rollback()
+        existing = find_persisted(db, rec.idempotency_key)
+        if existing is None:
+            raise RuntimeError(f"Capture {rec.idempotency_key} exists without its read rows")
+        return existing
+
+    if rec.idempotency_key:
+        # One transaction: a retry after a failure replays both or neither.
+        if should_upsert_master(rec):
+            upsert_master(db, rec)
+        db.commit()
+        return result
+
+    db.commit()
+    if should_upsert_master(rec):
+        upsert_master(db, rec)
+        db.commit()
+    return result
+
+
+def insert_read_rows(db: Session, rec: ReadRecord) -> Optional[PersistResult]:
+    """Stepwise capture/detection/read INSERTs without committing.
+
+    With ``rec.idempotency_key`` set, a capture that already exists is skipped
+    and ``None`` is returned.
+    """
+    params = _params(rec)
+
+    if rec.idempotency_key:
+        capture_id = db.execute(
+            text(f"""
+                INSERT INTO captures ({_CAPTURE_COLUMNS}, idempotency_key)
+                VALUES ({_CAPTURE_VALUES}, :idempotency_key)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING id
+            """),
+            params,
+        ).scalar_one_or_none()
+        if capture_id is None:
+            return None
+    else:
+        capture_id = db.execute(
+            text(f"INSERT INTO captures ({_CAPTURE_COLUMNS}) VALUES ({_CAPTURE_VALUES}) RETURNING id"),
+            params,
+        ).scalar_one()
+
+    detection_id = db.execute(
+        text("""
+            INSERT INTO detections (capture_id, crop_path, det_conf, bbox)
+            VALUES (:capture_id, :crop_path, :det_conf, :bbox)
+            RETURNING id
+        """),
+        {**params, "capture_id": int(capture_id)},
+    ).scalar_one()
+
+    read_id = db.execute(
+        text(f"INSERT INTO plate_reads ({_READ_COLUMNS}) VALUES (:detection_id, {_READ_VALUES}) RETURNING id"),
+        {**params, "detection_id": int(detection_id)},
+    ).scalar_one()
+
+    return PersistResult(
+        capture_id=int(capture_id),
+        detection_id=int(detection_id),
+        read_id=int(read_id),
+    )
+
+
+def upsert_master(db: Session, rec: ReadRecord) -> None:
+    """master_plates upsert for one read, without committing."""
+    # SQLite has no GREATEST(); its two-argument MAX() is the same thing.
+    greatest = "GREATEST" if db.get_bind().dialect.name == "postgresql" else "MAX"
+    db.execute(text(_MASTER_UPSERT.format(greatest=greatest)), _params(rec))
@@ -1,21 +1,30 @@
 # worker/alpr_worker/tasks.py
 import os
-import json
-import base64
 import hashlib
 import logging
-from datetime import datetime, timezone
+import uuid
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
-from sqlalchemy import text, create_engine
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import cv2
 import numpy as np
 import re
+import threading
 
+from .artifact_writer import get_artifact_writer
 from .celery_app import celery_app
+from .checkpoint import CheckpointStore, checkpoint_key
+from .crop_payload import load_crop_bytes, release_crop_ref
 from .inference.ocr import PlateOCR
-from .inference.master_lookup import assist_with_master
+from .inference.ocr_cache import OCRResultCache
+from .inference.batching import batching_enabled, wrap_detector, wrap_ocr
+from .inference.server import connect_remote
+from .persistence import ReadRecord, idempotency_supported, persist_read
+from .write_behind import make_idempotency_key, spool_read, write_behind_enabled
+from .inference.master_lookup import assist_from_master_hit, assist_with_master, exact_master_match
+from .inference.timing import current_timer, trace
 
 # --- TensorRT Detector Import ---
 USE_TRT_DETECTOR = os.getenv("USE_TRT_DETECTOR", "false").lower() == "true"
@@ -73,6 +82,40 @@ def get_plate_dedup() -> Optional["PlateDedup"]:
     return _plate_dedup
 
 
+# --- OCR result cache ---
+_ocr_cache: Optional[OCRResultCache] = None
+
+
+def get_ocr_cache() -> OCRResultCache:
+    global _ocr_cache
+    if _ocr_cache is None:
+        redis_client = None
+        try:
+            from redis import Redis
+            redis_client = Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+        except ImportError:
+            pass
+        _ocr_cache = OCRResultCache(redis_client)
+    return _ocr_cache
+
+
+# --- Stage checkpoints ---
+_checkpoint_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        redis_client = None
+        try:
+            from redis import Redis
+            redis_client = Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+        except ImportError:
+            pass
+        _checkpoint_store = CheckpointStore(redis_client)
+    return _checkpoint_store
+
+
 log = logging.getLogger(__name__)
 
 
@@ -115,12 +158,8 @@ engine = create_engine(
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 
-def sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
 
 
 def now_utc() -> datetime:
@@ -132,20 +171,39 @@ def now_utc() -> datetime:
 # ----------------------------
 _detector: Optional[PlateDetector] = None
 _ocr: Optional[PlateOCR] = None
+# Threaded pools may race on first use; models must be loaded only once.
+_singleton_lock = threading.Lock()
+
+
+def load_local_detector() -> PlateDetector:
+    """Load the plate detector into this process (uses models/best.engine for TRT)"""
+    detector = PlateDetector()
+    return wrap_detector(detector) if batching_enabled() else detector
+
+
+def load_local_ocr() -> PlateOCR:
+    ocr = PlateOCR()
+    # OCR_CASCADE: a confident fast-tier read that is already a master plate returns early
+    ocr.set_master_lookup(master_hit)
+    return wrap_ocr(ocr) if batching_enabled() else ocr
 
 
 def get_detector() -> PlateDetector:
-    """Get singleton plate detector (uses models/best.engine for TRT)"""
+    """Get singleton plate detector — the shared inference server if running, else in-process"""
     global _detector
     if _detector is None:
-        _detector = PlateDetector()
+        with _singleton_lock:
+            if _detector is None:
+                _detector = connect_remote("detector", load_local_detector) or load_local_detector()
     return _detector
 
 
 def get_ocr() -> PlateOCR:
     global _ocr
     if _ocr is None:
-        _ocr = PlateOCR()
+        with _singleton_lock:
+            if _ocr is None:
+                _ocr = connect_remote("ocr", load_local_ocr) or load_local_ocr()
     return _ocr
 
 
@@ -158,22 +216,212 @@ def norm_plate_text(s: str) -> str:
     return s
 
 
+def master_hit(plate_text: str) -> Optional[Dict[str, Any]]:
+    """Exact master plate for a fast-tier OCR read (PlateOCR.set_master_lookup), or None."""
+    norm = norm_plate_text(plate_text)
+    if not norm:
+        return None
+    db = SessionLocal()
+    try:
+        m = exact_master_match(db, norm)
+        if m is None:
+            return None
+        return {
+            "plate_text_norm": m.plate_text_norm,
+            "display_text": m.display_text or m.plate_text_norm,
+            "province": m.province or "",
+            "confidence": float(m.confidence or 0.0),
+        }
+    finally:
+        db.close()
+
+
+def _decode_detect_ocr(
+    vehicle_crop_b64: Optional[str],
+    vehicle_crop_ref: Optional[str],
+    track_id: int,
+    vehicle_count: int,
+    camera_id: str,
+) -> Dict[str, Any]:
+    """
+    Steps 1-4 of process_lpr_task (decode → detect → validate → OCR).
+    
+    Returns the "ocr" checkpoint state, or a final result dict with
+    ok=False when the vehicle cannot be read.
+    """
+    timer = current_timer()
+    # =============================================
+    # 1) DECODE VEHICLE CROP (inline base64 or offloaded reference)
+    # =============================================
+    try:
+        with timer.stage("decode"):
+            img_bytes = load_crop_bytes(vehicle_crop_b64, vehicle_crop_ref)
+            img_array = np.frombuffer(img_bytes, dtype=np.uint8)
+            vehicle_img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+
+        if vehicle_img is None or vehicle_img.size == 0:
+            raise ValueError("Failed to decode vehicle crop image")
+
+        log.debug(
+            "Vehicle crop decoded: shape=%s, track_id=%d",
+            vehicle_img.shape, track_id
+        )
+    except Exception as e:
+        log.error("Failed to decode vehicle crop (track_id=%d): %s", track_id, e)
+        return {
+            "ok": False,
+            "error": f"decode_failed:{str(e)}",
+            "track_id": track_id,
+            "vehicle_count": vehicle_count,
+            "camera_id": camera_id,
+        }
+
+    # Persist the original JPEG bytes as-is (no re-encode) in the background
+    vehicle_crop_dir = STORAGE_DIR / "original" / "vehicle_crops"
+    vehicle_crop_path = vehicle_crop_dir / f"{camera_id}_{track_id}_{vehicle_count}.jpg"
+    with timer.stage("artifact_write"):
+        vehicle_crop_sha256 = sha256_bytes(img_bytes)
+        artifact_writer = get_artifact_writer()
+        artifact_writer.submit(vehicle_crop_path, img_bytes)
+
+    # =============================================
+    # 2) DETECT LICENSE PLATE USING models/best.engine
+    #    (TensorRT model for plate detection & crop)
+    # =============================================
+    detector = get_detector()
+
+    try:
+        # Run plate detection in memory (uses models/best.engine in TRT mode)
+        with timer.stage("detect"):
+            det = detector.detect(vehicle_img)
+        plate_crop_img = det.crop
+        det_conf = det.det_conf
+
+        log.info(
+            "Plate detected: track_id=%d, conf=%.2f, crop_shape=%s",
+            track_id, det_conf, plate_crop_img.shape
+        )
+
+    except Exception as e:
+        log.warning(
+            "Plate detection failed for track_id=%d: %s",
+            track_id, e
+        )
+        return {
+            "ok": False,
+            "error": f"detection_failed:{str(e)}",
+            "track_id": track_id,
+            "vehicle_count": vehicle_count,
+            "camera_id": camera_id,
+            "vehicle_crop_path": str(vehicle_crop_path),
+        }
+
+    # =============================================
+    # 3) CROP VALIDATION
+    # =============================================
+    crop_validator = get_crop_validator()
+    if crop_validator is not None:
+        with timer.stage("crop_validate"):
+            val_result = crop_validator.validate(plate_crop_img)
+        if not val_result.passed:
+            log.info(
+                "CropValidator REJECT track_id=%d: %s (aspect=%.2f size=%dx%d)",
+                track_id, val_result.reject_reason,
+                val_result.aspect_ratio, val_result.width, val_result.height,
+            )
+            return {
+                "ok": False,
+                "error": f"crop_rejected:{val_result.reject_reason}",
+                "track_id": track_id,
+                "vehicle_count": vehicle_count,
+                "camera_id": camera_id,
+                "vehicle_crop_path": str(vehicle_crop_path),
+                "crop_validation": {
+                    "aspect_ratio": val_result.aspect_ratio,
+                    "width": val_result.width,
+                    "height": val_result.height,
+                    "contrast": val_result.contrast,
+                    "edge_density": val_result.edge_density,
+                },
+            }
+
+    # Persist the validated plate crop (encoded once, written in background)
+    with timer.stage("artifact_write"):
+        ok, plate_crop_jpg = cv2.imencode(".jpg", plate_crop_img)
+        if not ok:
+            raise RuntimeError("Failed to encode plate crop")
+        plate_crop_path = STORAGE_DIR / "crops" / f"{uuid.uuid4().hex}.jpg"
+        artifact_writer.submit(plate_crop_path, plate_crop_jpg.tobytes())
+
+    # =============================================
+    # 4) OCR PLATE TEXT
+    # =============================================
+    ocr = get_ocr()
+    with timer.stage("ocr"):
+        # near-duplicate crops of the same camera reuse an earlier read (ocr_cache.py)
+        o = get_ocr_cache().read_plate(
+            ocr,
+            plate_crop_img,
+            camera_id=camera_id,
+            debug_dir=STORAGE_DIR / "debug",
+            debug_id=f"{camera_id}_{track_id}_{vehicle_count}",
+        )
+    
+    return {
+        "vehicle_crop_path": str(vehicle_crop_path),
+        "vehicle_crop_sha256": vehicle_crop_sha256,
+        "plate_crop_path": str(plate_crop_path),
+        "det_conf": float(det_conf),
+        "bbox": det.bbox or {},
+        "plate_text": (o.plate_text or "").strip(),
+        "province": (o.province or "").strip(),
+        "confidence": float(o.confidence or 0.0),
+        "raw": o.raw or {},
+    }
+
+
 @celery_app.task(name="tasks.process_lpr_task", bind=True, max_retries=3)
 def process_lpr_task(
     self,
-    vehicle_crop_b64: str,
+    vehicle_crop_b64: Optional[str] = None,
+    track_id: int = 0,
+    vehicle_count: int = 0,
+    camera_id: str = "",
+    vehicle_crop_ref: Optional[str] = None,
+):
+    """
+    Process LPR for a vehicle that crossed the counting line
+    
+    Sampled tasks (LPR_TRACE_SAMPLE_RATE) get per-stage ``timings_ms``
+    in the result; see inference/timing.py.
+    """
+    with trace() as timer:
+        result = _process_lpr(
+            self, vehicle_crop_b64, track_id, vehicle_count, camera_id, vehicle_crop_ref
+        )
+    if timer.enabled and isinstance(result, dict):
+        result = {**result, "timings_ms": timer.as_dict()}
+    return result
+
+
+def _process_lpr(
+    self,
+    vehicle_crop_b64: Optional[str],
     track_id: int,
     vehicle_count: int,
     camera_id: str,
+    vehicle_crop_ref: Optional[str],
 ):
     """
-    Process LPR for a vehicle that crossed the counting line
+    Body of process_lpr_task (``self`` is the bound Celery task)
     
     Args:
-        vehicle_crop_b64: Base64-encoded vehicle crop image
+        vehicle_crop_b64: Base64-encoded vehicle crop image (inline payload)
         track_id: ByteTrack track ID
         vehicle_count: Sequential count number
         camera_id: Camera identifier
+        vehicle_crop_ref: "blob:<sha256>" / "redis:<sha256>" offloaded payload
+            (see crop_payload.py); used when vehicle_crop_b64 is empty
     
     Returns:
         Dict with processing results
@@ -183,128 +431,55 @@ def process_lpr_task(
         track_id, vehicle_count, camera_id
     )
     
+    # Stages finished by an earlier attempt of this task (see checkpoint.py)
+    timer = current_timer()
+    checkpoints = get_checkpoint_store()
+    ckpt_key = checkpoint_key(camera_id, track_id, vehicle_count, vehicle_crop_b64, vehicle_crop_ref)
+    with timer.stage("checkpoint"):
+        stages = checkpoints.load(ckpt_key)
+    if "persist" in stages:
+        log.info("LPR task already completed for track_id=%d; returning checkpointed result", track_id)
+        release_crop_ref(vehicle_crop_ref)
+        return stages["persist"]
+    
     db = SessionLocal()
+    # Offloaded crops are kept while a retry may still need them.
+    release_payload = True
     
     try:
         # =============================================
-        # 1) DECODE BASE64 VEHICLE CROP
-        # =============================================
-        try:
-            img_bytes = base64.b64decode(vehicle_crop_b64)
-            img_array = np.frombuffer(img_bytes, dtype=np.uint8)
-            vehicle_img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            
-            if vehicle_img is None or vehicle_img.size == 0:
-                raise ValueError("Failed to decode vehicle crop image")
-            
-            log.debug(
-                "Vehicle crop decoded: shape=%s, track_id=%d",
-                vehicle_img.shape, track_id
-            )
-        except Exception as e:
-            log.error("Failed to decode vehicle crop (track_id=%d): %s", track_id, e)
-            return {
-                "ok": False,
-                "error": f"decode_failed:{str(e)}",
-                "track_id": track_id,
-                "vehicle_count": vehicle_count,
-                "camera_id": camera_id,
-            }
-        
-        # Save vehicle crop for debugging/records
-        vehicle_crop_dir = STORAGE_DIR / "original" / "vehicle_crops"
-        vehicle_crop_dir.mkdir(parents=True, exist_ok=True)
-        vehicle_crop_path = vehicle_crop_dir / f"{camera_id}_{track_id}_{vehicle_count}.jpg"
-        cv2.imwrite(str(vehicle_crop_path), vehicle_img)
-        
-        # =============================================
-        # 2) DETECT LICENSE PLATE USING models/best.engine
-        #    (TensorRT model for plate detection & crop)
+        # 1-4) DECODE → DETECT → VALIDATE → OCR
+        #      (skipped on a retry that already got this far)
         # =============================================
-        detector = get_detector()
-        
-        try:
-            # Save vehicle image to temp file for detector input
-            temp_vehicle_path = STORAGE_DIR / "crops" / f"temp_vehicle_{track_id}.jpg"
-            cv2.imwrite(str(temp_vehicle_path), vehicle_img)
-            
-            # Run plate detection (uses models/best.engine in TRT mode)
-            det = detector.detect_and_crop(str(temp_vehicle_path))
-            plate_crop_path = det.crop_path
-            det_conf = det.det_conf
-            
-            log.info(
-                "Plate detected: track_id=%d, conf=%.2f, crop=%s",
-                track_id, det_conf, plate_crop_path
+        state = stages.get("ocr")
+        if state is None:
+            state = _decode_detect_ocr(
+                vehicle_crop_b64, vehicle_crop_ref, track_id, vehicle_count, camera_id
             )
-            
-            # Cleanup temp file
-            if temp_vehicle_path.exists():
-                temp_vehicle_path.unlink()
+            if state.get("ok") is False:
+                return state
+            checkpoints.save(ckpt_key, "ocr", state)
+        else:
+            log.info("Resuming track_id=%d from checkpoint: skipping decode/detect/OCR", track_id)
         
-        except Exception as e:
-            log.warning(
-                "Plate detection failed for track_id=%d: %s",
-                track_id, e
-            )
-            return {
-                "ok": False,
-                "error": f"detection_failed:{str(e)}",
-                "track_id": track_id,
-                "vehicle_count": vehicle_count,
-                "camera_id": camera_id,
-                "vehicle_crop_path": str(vehicle_crop_path),
-            }
-        
-        # =============================================
-        # 3) CROP VALIDATION
-        # =============================================
-        crop_validator = get_crop_validator()
-        if crop_validator is not None:
-            plate_crop_img = cv2.imread(plate_crop_path)
-            if plate_crop_img is not None:
-                val_result = crop_validator.validate(plate_crop_img)
-                if not val_result.passed:
-                    log.info(
-                        "CropValidator REJECT track_id=%d: %s (aspect=%.2f size=%dx%d)",
-                        track_id, val_result.reject_reason,
-                        val_result.aspect_ratio, val_result.width, val_result.height,
-                    )
-                    return {
-                        "ok": False,
-                        "error": f"crop_rejected:{val_result.reject_reason}",
-                        "track_id": track_id,
-                        "vehicle_count": vehicle_count,
-                        "camera_id": camera_id,
-                        "vehicle_crop_path": str(vehicle_crop_path),
-                        "crop_validation": {
-                            "aspect_ratio": val_result.aspect_ratio,
-                            "width": val_result.width,
-                            "height": val_result.height,
-                            "contrast": val_result.contrast,
-                            "edge_density": val_result.edge_density,
-                        },
-                    }
-        
-        # =============================================
-        # 4) OCR PLATE TEXT
-        # =============================================
-        ocr = get_ocr()
-        o = ocr.read_plate(
-            plate_crop_path,
-            debug_dir=STORAGE_DIR / "debug",
-            debug_id=f"{camera_id}_{track_id}_{vehicle_count}",
-        )
-        
-        plate_text = (o.plate_text or "").strip()
-        province = (o.province or "").strip()
-        conf = float(o.confidence or 0.0)
-        raw = o.raw or {}
+        vehicle_crop_path = state["vehicle_crop_path"]
+        vehicle_crop_sha256 = state["vehicle_crop_sha256"]
+        plate_crop_path = state["plate_crop_path"]
+        det_conf = state["det_conf"]
+        plate_text = state["plate_text"]
+        province = state["province"]
+        conf = state["confidence"]
+        raw = state["raw"]
         
         plate_text_norm = norm_plate_text(plate_text)
         
         # Master lookup assistance
-        assisted = assist_with_master(db, plate_text, province, conf)
+        with timer.stage("master_lookup"):
+            if raw.get("ocr_tier") == "fast" and raw.get("master_hit"):
+                # the fast tier already looked the plate up in master_plates
+                assisted = assist_from_master_hit(raw["master_hit"], province, conf)
+            else:
+                assisted = assist_with_master(db, plate_text, province, conf)
         plate_text = assisted["plate_text"]
         plate_text_norm = assisted["plate_text_norm"]
         province = assisted["province"]
@@ -320,16 +495,21 @@ def process_lpr_task(
         
         # =============================================
         # 5) PLATE DEDUP CHECK
+        #    (decision is checkpointed: a retry must not see its own entry)
         # =============================================
         plate_dedup = get_plate_dedup()
-        if plate_dedup is not None and plate_text_norm:
-            dedup_result = plate_dedup.check(
-                plate_text_norm=plate_text_norm,
-                confidence=conf,
-                capture_id=track_id,  # Using track_id as pseudo capture_id
-                camera_id=camera_id,
-            )
+        if "dedup" in stages:
+            dedup_skip = stages["dedup"]
+        elif plate_dedup is not None and plate_text_norm:
+            with timer.stage("dedup"):
+                dedup_result = plate_dedup.check(
+                    plate_text_norm=plate_text_norm,
+                    confidence=conf,
+                    capture_id=track_id,  # Using track_id as pseudo capture_id
+                    camera_id=camera_id,
+                )
             
+            dedup_skip = None
             if dedup_result.is_duplicate and dedup_result.action == "skip":
                 log.info(
                     "PlateDedup SKIP track_id=%d plate=%s "
@@ -339,7 +519,7 @@ def process_lpr_task(
                     dedup_result.existing_confidence,
                     conf,
                 )
-                return {
+                dedup_skip = {
                     "ok": False,
                     "error": "plate_duplicate:skip",
                     "track_id": track_id,
@@ -349,139 +529,76 @@ def process_lpr_task(
                     "existing_confidence": dedup_result.existing_confidence,
                     "new_confidence": conf,
                 }
+            checkpoints.save(ckpt_key, "dedup", dedup_skip)
+        else:
+            dedup_skip = None
         
-        # =============================================
-        # 6) INSERT CAPTURES RECORD
-        # =============================================
-        capture_id = db.execute(
-            text("""
-                INSERT INTO captures (
-                    source, camera_id, track_id, captured_at,
-                    original_path, sha256
-                )
-                VALUES (
-                    :source, :camera_id, :track_id, :captured_at,
-                    :original_path, :sha256
-                )
-                RETURNING id
-            """),
-            {
-                "source": "LINE_CROSSING",
-                "camera_id": camera_id,
-                "track_id": track_id,
-                "captured_at": datetime.now(timezone.utc),
-                "original_path": str(vehicle_crop_path),
-                "sha256": sha256_file(vehicle_crop_path),
-            },
-        ).scalar_one()
+        if dedup_skip:
+            return dedup_skip
         
         # =============================================
-        # 7) INSERT DETECTIONS RECORD
-        # =============================================
-        detection_id = db.execute(
-            text("""
-                INSERT INTO detections (capture_id, crop_path, det_conf, bbox)
-                VALUES (:capture_id, :crop_path, :det_conf, :bbox)
-                RETURNING id
-            """),
-            {
-                "capture_id": int(capture_id),
-                "crop_path": str(plate_crop_path),
-                "det_conf": float(det_conf),
-                "bbox": json.dumps(det.bbox or {}, ensure_ascii=False),
-            },
-        ).scalar_one()
-        
+        # 6) PERSIST capture → detection → plate_read (+ master upsert)
+        #    stepwise or one chained statement (LPR_DB_WRITE_MODE),
+        #    or spooled for the write-behind writer (LPR_WRITE_BEHIND).
+        #    The idempotency key (once the schema has the column) makes a
+        #    retried insert a no-op.
         # =============================================
-        # 8) INSERT PLATE_READS RECORD
-        # =============================================
-        read_id = db.execute(
-            text("""
-                INSERT INTO plate_reads (
-                    detection_id, plate_text, plate_text_norm,
-                    province, confidence, status, created_at
-                )
-                VALUES (
-                    :detection_id, :plate_text, :plate_text_norm,
-                    :province, :confidence, :status, :created_at
-                )
-                RETURNING id
-            """),
-            {
-                "detection_id": int(detection_id),
-                "plate_text": (plate_text[:32] if plate_text else ""),
-                "plate_text_norm": (plate_text_norm[:32] if plate_text_norm else ""),
-                "province": (province[:64] if province else ""),
-                "confidence": conf,
-                "status": "PENDING",
-                "created_at": datetime.now(timezone.utc),
-            },
-        ).scalar_one()
-        
-        db.commit()
-        
-        # =============================================
-        # 9) MASTER PLATE UPSERT
-        # =============================================
-        if conf >= MASTER_CONF_THRESHOLD and plate_text_norm:
-            db.execute(
-                text("""
-                    INSERT INTO master_plates (
-                        plate_text_norm, display_text, province,
-                        confidence, last_seen, count_seen, editable
-                    )
-                    VALUES (
-                        :plate_text_norm, :display_text, :province,
-                        :confidence, :last_seen, :count_seen, :editable
-                    )
-                    ON CONFLICT (plate_text_norm)
-                    DO UPDATE SET
-                        display_text = CASE
-                            WHEN master_plates.display_text = '' AND EXCLUDED.display_text <> ''
-                                THEN EXCLUDED.display_text
-                            ELSE master_plates.display_text
-                        END,
-                        province = CASE
-                            WHEN EXCLUDED.province <> '' THEN EXCLUDED.province
-                            ELSE master_plates.province
-                        END,
-                        confidence = GREATEST(master_plates.confidence, EXCLUDED.confidence),
-                        last_seen = EXCLUDED.last_seen,
-                        count_seen = master_plates.count_seen + 1
-                """),
-                {
-                    "plate_text_norm": plate_text_norm,
-                    "display_text": (plate_text[:32] if plate_text else plate_text_norm),
-                    "province": province,
-                    "confidence": conf,
-                    "last_seen": now_utc(),
-                    "count_seen": 1,
-                    "editable": True,
-                },
-            )
-            db.commit()
-        
-        log.info(
-            "✅ LPR SUCCESS: track_id=%d, count=%d, plate=%s, conf=%.2f",
-            track_id, vehicle_count, plate_text, conf
+        record = ReadRecord(
+            camera_id=camera_id,
+            track_id=track_id,
+            original_path=str(vehicle_crop_path),
+            sha256=vehicle_crop_sha256,
+            crop_path=str(plate_crop_path),
+            det_conf=det_conf,
+            bbox=state["bbox"],
+            plate_text=plate_text,
+            plate_text_norm=plate_text_norm,
+            province=province,
+            confidence=conf,
+            upsert_master=conf >= MASTER_CONF_THRESHOLD,
+            idempotency_key=make_idempotency_key(
+                camera_id, track_id, vehicle_count, vehicle_crop_sha256
+            ) if idempotency_supported(db) else None,
         )
-        
-        return {
+        result = {
             "ok": True,
             "track_id": track_id,
             "vehicle_count": vehicle_count,
             "camera_id": camera_id,
-            "capture_id": int(capture_id),
-            "detection_id": int(detection_id),
-            "read_id": int(read_id),
             "plate_text": plate_text,
             "plate_text_norm": plate_text_norm,
             "province": province,
             "confidence": conf,
             "master_assisted": assisted.get("assisted", False),
+            "ocr_variants_run": raw.get("variants_run"),
+            "ocr_tier": raw.get("ocr_tier"),
             "vehicle_crop_path": str(vehicle_crop_path),
             "plate_crop_path": str(plate_crop_path),
         }
+        
+        # write-behind needs the idempotency key (captures column from the backend)
+        if write_behind_enabled() and record.idempotency_key:
+            # Batched by the write-behind writer; row ids are not known yet
+            with timer.stage("db_spool"):
+                spool_read(record)
+            result.update(spooled=True, idempotency_key=record.idempotency_key)
+        else:
+            with timer.stage("db_persist"):
+                saved = persist_read(db, record)
+            result.update(
+                capture_id=saved.capture_id,
+                detection_id=saved.detection_id,
+                read_id=saved.read_id,
+            )
+        checkpoints.save(ckpt_key, "persist", result)
+        
+        log.info(
+            "✅ LPR SUCCESS: track_id=%d, count=%d, plate=%s, conf=%.2f%s",
+            track_id, vehicle_count, plate_text, conf,
+            " (spooled)" if result.get("spooled") else "",
+        )
+        
+        return result
     
     except Exception as e:
         db.rollback()
@@ -490,11 +607,13 @@ def process_lpr_task(
             track_id, vehicle_count, e
         )
         
-        # Retry logic
-        try:
+        # Retry logic: keep the offloaded crop only for an attempt that will run.
+        # (Once retries are exhausted self.retry re-raises ``e`` instead of
+        # MaxRetriesExceededError, so check before calling it.)
+        if self.max_retries is None or self.request.retries < self.max_retries:
+            release_payload = False
             raise self.retry(exc=e, countdown=5)
-        except self.MaxRetriesExceededError:
-            log.error("Max retries exceeded for track_id=%d", track_id)
+        log.error("Max retries exceeded for track_id=%d", track_id)
         
         return {
             "ok": False,
@@ -505,4 +624,6 @@ def process_lpr_task(
         }
     
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+        if release_payload:
+            release_crop_ref(vehicle_crop_ref)
\ No newline at end of file
@@ -0,0 +1,347 @@
+"""
+write_behind.py — Write-behind Batched DB Writer
+==================================================
+
+Optional replacement for the per-read commit in ``process_lpr_task``. Tasks
+drop each finished read into a local spool directory (one JSON file per read,
+written atomically) and return immediately. A single writer process drains
+the spool in batches:
+
+  PostgreSQL   COPY into a temp staging table, then one chained
+               INSERT ... SELECT for captures → detections → plate_reads
+               plus an aggregated master_plates upsert, one commit
+  other        stepwise multi-row loop in one transaction (SQLite replay)
+
+A batch is flushed when it reaches ``LPR_WB_BATCH_SIZE`` records or when the
+oldest record has waited ``LPR_WB_MAX_LATENCY_MS``. Spool files are deleted
+only after the commit, so delivery is at-least-once; ``captures.idempotency_key``
+(camera/track/count + crop hash) turns a replayed record into a no-op. A batch
+the database rejects is retried one record at a time; records that still fail
+are renamed to ``.bad`` so they cannot block the spool.
+
+Run:  python -m alpr_worker.write_behind
+
+ENV:
+  LPR_WRITE_BEHIND=false          tasks spool reads instead of committing them
+  LPR_WB_SPOOL_DIR=               default: $STORAGE_DIR/spool
+  LPR_WB_BATCH_SIZE=200           max records per flush
+  LPR_WB_MAX_LATENCY_MS=1000      max age of the oldest spooled record before a flush
+  LPR_WB_POLL_MS=100              spool poll interval
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+from .persistence import ReadRecord, insert_read_rows, should_upsert_master, upsert_master
+
+log = logging.getLogger(__name__)
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("LPR_WRITE_BEHIND", "false").lower() == "true"
+
+
+def make_idempotency_key(camera_id: str, track_id: int, vehicle_count: int, sha256: str) -> str:
+    """Stable per task delivery; the crop hash separates tracker/counter resets."""
+    return f"{camera_id}:{track_id}:{vehicle_count}:{sha256[:16]}"[:128]
+
+
+def _spool_dir() -> Path:
+    configured = os.getenv("LPR_WB_SPOOL_DIR", "").strip()
+    if configured:
+        return Path(configured)
+    return Path(os.getenv("STORAGE_DIR", "/storage")) / "spool"
+
+
+# ----------------------------
+# Producer side (tasks)
+# ----------------------------
+def spool_read(rec: ReadRecord) -> Path:
+    """Durably queue ``rec`` for the writer. Requires ``rec.idempotency_key``."""
+    if not rec.idempotency_key:
+        raise ValueError("write-behind records need an idempotency_key")
+    if rec.captured_at is None:
+        rec.captured_at = datetime.now(timezone.utc)
+
+    spool = _spool_dir()
+    spool.mkdir(parents=True, exist_ok=True)
+    payload = asdict(rec)
+    payload["captured_at"] = rec.captured_at.isoformat()
+
+    # time-ordered names keep flushes roughly FIFO
+    path = spool / f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json"
+    tmp_path = spool / f".{path.name}.tmp"
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _load_record(path: Path) -> ReadRecord:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["captured_at"] = datetime.fromisoformat(data["captured_at"])
+    return ReadRecord(**data)
+
+
+# ----------------------------
+# Writer side
+# ----------------------------
+_STAGE_COLUMNS = [
+    "idempotency_key", "source", "camera_id", "track_id", "captured_at", "original_path", "sha256",
+    "crop_path", "det_conf", "bbox",
+    "plate_text", "plate_text_norm", "province", "confidence", "status", "created_at",
+    "display_text", "last_seen", "upsert_master",
+]
+
+# Column types are copied from the real tables (json, readstatus enum, ...).
+# Timestamps are staged as timestamptz so they convert exactly like the
+# tz-aware values bound by the per-read path.
+_CREATE_STAGE = """
+    CREATE TEMP TABLE _lpr_wb_stage ON COMMIT DROP AS
+    SELECT c.idempotency_key, c.source, c.camera_id, c.track_id,
+           c.captured_at::timestamptz AS captured_at, c.original_path, c.sha256,
+           d.crop_path, d.det_conf, d.bbox,
+           r.plate_text, r.plate_text_norm, r.province, r.confidence, r.status,
+           r.created_at::timestamptz AS created_at,
+           m.display_text, m.last_seen, m.editable AS upsert_master
+    FROM captures c, detections d, plate_reads r, master_plates m
+    WITH NO DATA
+"""
+
+_FLUSH_STAGE = """
+    WITH cap AS (
+        INSERT INTO captures (idempotency_key, source, camera_id, track_id, captured_at, original_path, sha256)
+        SELECT idempotency_key, source, camera_id, track_id, captured_at, original_path, sha256
+        FROM _lpr_wb_stage
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id, idempotency_key
+    ),
+    det AS (
+        INSERT INTO detections (capture_id, crop_path, det_conf, bbox)
+        SELECT cap.id, s.crop_path, s.det_conf, s.bbox
+        FROM cap JOIN _lpr_wb_stage s ON s.idempotency_key = cap.idempotency_key
+        RETURNING id, capture_id
+    ),
+    rd AS (
+        INSERT INTO plate_reads (detection_id, plate_text, plate_text_norm, province, confidence, status, created_at)
+        SELECT det.id, s.plate_text, s.plate_text_norm, s.province, s.confidence, s.status, s.created_at
+        FROM det
+        JOIN cap ON cap.id = det.capture_id
+        JOIN _lpr_wb_stage s ON s.idempotency_key = cap.idempotency_key
+        RETURNING id
+    ),
+    mp AS (
+        -- one row per plate: ON CONFLICT cannot touch the same row twice
+        INSERT INTO master_plates (
+            plate_text_norm, display_text, province,
+            confidence, last_seen, count_seen, editable
+        )
+        SELECT s.plate_text_norm,
+               (array_agg(s.display_text ORDER BY s.last_seen DESC))[1],
+               COALESCE((array_agg(s.province ORDER BY s.last_seen DESC) FILTER (WHERE s.province <> ''))[1], ''),
+               max(s.confidence), max(s.last_seen), count(*), true
+        FROM cap JOIN _lpr_wb_stage s ON s.idempotency_key = cap.idempotency_key
+        WHERE s.upsert_master AND s.plate_text_norm <> ''
+        GROUP BY s.plate_text_norm
+        ON CONFLICT (plate_text_norm)
+        DO UPDATE SET
+            display_text = CASE
+                WHEN master_plates.display_text = '' AND EXCLUDED.display_text <> ''
+                    THEN EXCLUDED.display_text
+                ELSE master_plates.display_text
+            END,
+            province = CASE
+                WHEN EXCLUDED.province <> '' THEN EXCLUDED.province
+                ELSE master_plates.province
+            END,
+            confidence = GREATEST(master_plates.confidence, EXCLUDED.confidence),
+            last_seen = GREATEST(master_plates.last_seen, EXCLUDED.last_seen),
+            count_seen = master_plates.count_seen + EXCLUDED.count_seen
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM cap) AS inserted, (SELECT count(*) FROM rd) AS reads
+"""
+
+
+def _stage_row(rec: ReadRecord) -> List[object]:
+    captured_at = rec.captured_at or datetime.now(timezone.utc)
+    return [
+        rec.idempotency_key, rec.source, rec.camera_id, rec.track_id, captured_at.isoformat(),
+        rec.original_path, rec.sha256,
+        rec.crop_path, float(rec.det_conf), json.dumps(rec.bbox or {}, ensure_ascii=False),
+        (rec.plate_text or "")[:32], (rec.plate_text_norm or "")[:32], (rec.province or "")[:64],
+        float(rec.confidence), "PENDING", captured_at.isoformat(),
+        (rec.plate_text[:32] if rec.plate_text else rec.plate_text_norm),
+        captured_at.astimezone(timezone.utc).replace(tzinfo=None).isoformat(),
+        "t" if should_upsert_master(rec) else "f",
+    ]
+
+
+def _quarantine(path: Path) -> None:
+    try:
+        path.rename(path.with_suffix(".bad"))
+    except FileNotFoundError:
+        pass  # another writer sharing the spool got there first
+
+
+def _is_record_error(exc: Exception) -> bool:
+    """False for a lost/unavailable database, where every record would fail alike."""
+    if isinstance(exc, (OperationalError, InterfaceError)):
+        return False
+    return not getattr(exc, "connection_invalidated", False)
+
+
+class WriteBehindWriter:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.spool_dir = _spool_dir()
+        self.batch_size = max(1, int(os.getenv("LPR_WB_BATCH_SIZE", "200")))
+        self.max_latency = float(os.getenv("LPR_WB_MAX_LATENCY_MS", "1000")) / 1000.0
+        self.poll_interval = float(os.getenv("LPR_WB_POLL_MS", "100")) / 1000.0
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+        log.info(
+            "WriteBehindWriter: spool=%s batch_size=%d max_latency=%.0fms",
+            self.spool_dir, self.batch_size, self.max_latency * 1000,
+        )
+
+    def _pending(self) -> List[Path]:
+        return sorted(self.spool_dir.glob("*.json"))
+
+    def run_forever(self) -> None:
+        while True:
+            pending = self._pending()
+            if not pending:
+                time.sleep(self.poll_interval)
+                continue
+
+            oldest_age = time.time() - pending[0].stat().st_mtime
+            if len(pending) < self.batch_size and oldest_age < self.max_latency:
+                time.sleep(min(self.poll_interval, self.max_latency - oldest_age))
+                continue
+
+            try:
+                self.flush(pending[: self.batch_size])
+            except Exception:
+                log.exception("Write-behind flush failed; records stay spooled for retry")
+                time.sleep(max(self.poll_interval, 1.0))
+
+    def flush(self, paths: List[Path]) -> Tuple[int, int]:
+        """Write the given spool files; returns (records, newly inserted)."""
+        entries: List[Tuple[Path, ReadRecord]] = []
+        seen = set()
+        for path in paths:
+            try:
+                rec = _load_record(path)
+            except Exception as e:
+                log.error("Dropping unreadable spool file %s: %s", path, e)
+                _quarantine(path)
+                continue
+            if rec.idempotency_key in seen:
+                continue
+            seen.add(rec.idempotency_key)
+            entries.append((path, rec))
+
+        t0 = time.perf_counter()
+        records = [rec for _, rec in entries]
+        try:
+            inserted = self._write(records) if records else 0
+        except Exception as e:
+            if not _is_record_error(e):
+                raise
+            log.warning("Write-behind batch of %d rejected (%s); retrying records one at a time", len(records), e)
+            inserted = self._write_each(entries)
+
+        # Only now is it safe to forget the records (at-least-once).
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+        log.info(
+            "Write-behind flush: records=%d inserted=%d duplicates=%d took=%.1fms",
+            len(records), inserted, len(records) - inserted, (time.perf_counter() - t0) * 1000,
+        )
+        return len(records), inserted
+
+    def _write_each(self, entries: List[Tuple[Path, ReadRecord]]) -> int:
+        """Per-record fallback: a record the DB still rejects is set aside as ``.bad``."""
+        inserted = 0
+        for path, rec in entries:
+            try:
+                inserted += self._write([rec])
+            except Exception as e:
+                if not _is_record_error(e):
+                    raise
+                log.error("Dropping spool file %s rejected by the database: %s", path, e)
+                _quarantine(path)
+                continue
+            path.unlink(missing_ok=True)
+        return inserted
+
+    def _write(self, records: List[ReadRecord]) -> int:
+        db: Session = self.session_factory()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                return self._write_copy(db, records)
+            return self._write_rows(db, records)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write_copy(db: Session, records: List[ReadRecord]) -> int:
+        buf = io.StringIO()
+        # quote every string so '' stays '' (unquoted empty is NULL in COPY csv)
+        writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+        for rec in records:
+            writer.writerow(_stage_row(rec))
+        buf.seek(0)
+
+        db.execute(text(_CREATE_STAGE))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY _lpr_wb_stage ({', '.join(_STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        finally:
+            cursor.close()
+        row = db.execute(text(_FLUSH_STAGE)).one()
+        db.commit()
+        return int(row.inserted)
+
+    @staticmethod
+    def _write_rows(db: Session, records: List[ReadRecord]) -> int:
+        inserted = 0
+        for rec in records:
+            if insert_read_rows(db, rec) is None:
+                continue
+            inserted += 1
+            if should_upsert_master(rec):
+                upsert_master(db, rec)
+        db.commit()
+        return inserted
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    from .tasks import SessionLocal
+
+    WriteBehindWriter(SessionLocal).run_forever()
+
+
+if __name__ == "__main__":
+    main()
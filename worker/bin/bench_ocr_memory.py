@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Memory / load-time benchmark for PlateOCR's EasyOCR readers.
+
+Each mode is measured in a fresh child process so RSS is not shared:
+
+  shared     OCR_SHARED_READER=true  — one th+en reader serves the province passes
+  separate   OCR_SHARED_READER=false — a second th-only reader (previous behaviour)
+
+Reported per mode: PlateOCR() load time, RSS growth over the bare interpreter
+(torch/easyocr imported first so only model weights count), peak RSS and,
+on GPU, torch.cuda.max_memory_allocated. With --crops (plate crops, not
+vehicle crops) each child also OCRs them and the report shows how often the
+modes agree on plate text and province.
+
+usage:
+  python bin/bench_ocr_memory.py
+  python bin/bench_ocr_memory.py --crops storage/crops --limit 200 --device cpu --json mem.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+_MODES = {"shared": "true", "separate": "false"}
+
+
+def current_rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def list_crops(crops_dir: str, limit: int) -> List[Path]:
+    if not crops_dir:
+        return []
+    files = sorted(p for p in Path(crops_dir).iterdir() if p.suffix.lower() in _IMAGE_SUFFIXES)
+    return files[:limit] if limit else files
+
+
+def run_child(args: argparse.Namespace) -> int:
+    import torch  # noqa: F401 — import cost is not part of the model footprint
+    import easyocr  # noqa: F401
+
+    from alpr_worker.inference.ocr import PlateOCR
+
+    baseline = current_rss_mb()
+    t0 = time.perf_counter()
+    ocr = PlateOCR()
+    load_sec = time.perf_counter() - t0
+    loaded = current_rss_mb()
+
+    reads: Dict[str, Dict[str, Any]] = {}
+    t0 = time.perf_counter()
+    for path in list_crops(args.crops, args.limit):
+        result = ocr.read_plate(str(path))
+        reads[path.name] = {"plate_text": result.plate_text, "province": result.province}
+    read_sec = time.perf_counter() - t0
+
+    report = {
+        "load_sec": round(load_sec, 3),
+        "model_rss_mb": round(loaded - baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "readers": 1 if ocr.thai_reader is ocr.reader else 2,
+        "reads": reads,
+        "read_ms_mean": round(1000.0 * read_sec / len(reads), 1) if reads else 0.0,
+    }
+    if torch.cuda.is_available():
+        report["cuda_max_allocated_mb"] = round(torch.cuda.max_memory_allocated() / (1024.0 * 1024.0), 1)
+    print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+
+def measure(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    env = dict(os.environ, OCR_SHARED_READER=_MODES[mode])
+    if args.device == "cpu":
+        env["CUDA_VISIBLE_DEVICES"] = ""
+    cmd = [sys.executable, __file__, "--child", "--limit", str(args.limit)]
+    if args.crops:
+        cmd += ["--crops", args.crops]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def agreement(a: Dict[str, Dict[str, Any]], b: Dict[str, Dict[str, Any]], field: str) -> float:
+    common = [name for name in a if name in b]
+    if not common:
+        return 0.0
+    return sum(a[name][field] == b[name][field] for name in common) / len(common)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--crops", default="", help="directory of plate crops to OCR in both modes")
+    parser.add_argument("--limit", type=int, default=100, help="OCR at most N crops (0 = all)")
+    parser.add_argument("--device", default="cpu", help='"cpu" (default) hides CUDA; anything else keeps it')
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    runs = {mode: measure(mode, args) for mode in _MODES}
+    print(f"{'mode':<10} {'readers':>7} {'load_s':>8} {'model_mb':>9} {'peak_mb':>8} {'read_ms':>8}")
+    for mode, r in runs.items():
+        print(
+            f"{mode:<10} {r['readers']:>7} {r['load_sec']:>8.2f} {r['model_rss_mb']:>9.1f} "
+            f"{r['peak_rss_mb']:>8.1f} {r['read_ms_mean']:>8.1f}"
+            + (f"  cuda_max={r['cuda_max_allocated_mb']:.1f}MB" if "cuda_max_allocated_mb" in r else "")
+        )
+
+    shared, separate = runs["shared"], runs["separate"]
+    if separate["model_rss_mb"] > 0:
+        print(f"model RSS saved: {100.0 * (1.0 - shared['model_rss_mb'] / separate['model_rss_mb']):.1f}%")
+    if shared["reads"]:
+        print(
+            f"agreement over {len(shared['reads'])} crops: "
+            f"plate={agreement(shared['reads'], separate['reads'], 'plate_text'):.1%} "
+            f"province={agreement(shared['reads'], separate['reads'], 'province'):.1%}"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(runs, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Microbenchmark for plate-format checks: per-pattern regex loops vs the
+compiled classifier (validate.classify_plate, postprocess plate_pattern_match).
+
+The candidate stream imitates what one read feeds the checks: for each
+synthetic plate (every validate.PATTERNS format), --variants OCR variants
+each yield a handful of candidates — the plate itself, confusable swaps,
+a dropped character, dash/dot/space spellings, Thai digits and junk — so
+the same strings repeat within a read as they do in PlateOCR.
+
+Reported in calls/sec:
+
+  scan      the previous implementation (regex lists walked per call; kept
+            here as the reference)
+  cold      the compiled classifier with its memo cleared
+  warm      the same stream again with the memo filled
+
+"all three" is is_valid_plate + is_possibly_truncated + classify_plate_type
+per candidate: three scans before, one classify_plate call now. Every result
+is checked against the reference; a mismatch is printed and the exit status
+is 1.
+
+usage:
+  python bin/bench_plate_grammar.py
+  python bin/bench_plate_grammar.py --plates 2000 --variants 9 --repeat 5
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from alpr_worker.inference import postprocess_thai_plate, validate  # noqa: E402
+
+_THAI = [chr(c) for c in range(ord("ก"), ord("ฮ") + 1)]
+_CONFUSABLE = {}
+for _a, _b in postprocess_thai_plate._CONFUSABLE_PAIRS:
+    _CONFUSABLE.setdefault(_a, []).append(_b)
+_THAI_DIGITS = str.maketrans("0123456789", "๐๑๒๓๔๕๖๗๘๙")
+
+
+# ----------------------------
+# Reference (per-pattern) implementation
+# ----------------------------
+def scan_is_valid_plate(norm: str) -> bool:
+    if not norm:
+        return False
+    for p in validate.PATTERNS_WITH_DASH:
+        if p.match(norm):
+            return True
+    clean = norm.replace("-", "").replace(".", "")
+    for p in validate.PATTERNS:
+        if p.match(clean):
+            return True
+    return False
+
+
+def scan_is_possibly_truncated(norm: str) -> bool:
+    if not norm:
+        return False
+    clean = norm.replace("-", "").replace(".", "").replace(" ", "")
+    if re.match(r"^\d[ก-ฮ]\d{3,4}$", clean):
+        return True
+    if len(clean) <= 3 and re.match(r"^[ก-ฮ0-9]+$", clean):
+        return True
+    return False
+
+
+def scan_classify_plate_type(norm: str) -> str:
+    if not norm:
+        return "unknown"
+    clean = norm.replace("-", "").replace(".", "").replace(" ", "")
+    thai_chars = [c for c in clean if "ก" <= c <= "ฮ"]
+    if len(thai_chars) >= 2:
+        return "personal"
+    if len(thai_chars) == 1:
+        if re.match(r"^[ก-ฮ]\d{5,6}$", clean):
+            return "truck"
+        return "motorcycle"
+    if clean.isdigit():
+        return "commercial"
+    return "unknown"
+
+
+def scan_all(norm: str):
+    return scan_is_valid_plate(norm), scan_classify_plate_type(norm), scan_is_possibly_truncated(norm)
+
+
+def compiled_all(norm: str):
+    info = validate.classify_plate(norm)
+    return info.valid, info.plate_type, info.truncated
+
+
+def scan_plate_pattern_match(text: str) -> bool:
+    normalized = postprocess_thai_plate.normalize_plate_text(text)
+    return any(pattern.match(normalized) for pattern in postprocess_thai_plate._PLATE_PATTERNS)
+
+
+# ----------------------------
+# Candidate stream
+# ----------------------------
+def synthetic_plate(rng: random.Random) -> str:
+    digits = lambda lo, hi: "".join(rng.choice("0123456789") for _ in range(rng.randint(lo, hi)))  # noqa: E731
+    thai = lambda n: "".join(rng.choice(_THAI) for _ in range(n))  # noqa: E731
+    return rng.choice([
+        lambda: thai(2) + digits(1, 4),
+        lambda: thai(1) + digits(1, 4),
+        lambda: digits(1, 1) + thai(2) + digits(1, 4),
+        lambda: digits(1, 1) + thai(1) + digits(1, 4),
+        lambda: digits(2, 2) + thai(rng.randint(1, 2)) + digits(1, 4),
+        lambda: digits(6, 6),
+        lambda: digits(5, 5),
+        lambda: thai(1) + digits(5, 6),
+    ])()
+
+
+def ocr_variants(plate: str, rng: random.Random) -> List[str]:
+    out = [plate]
+    swaps = [i for i, ch in enumerate(plate) if ch in _CONFUSABLE]
+    if swaps:
+        i = rng.choice(swaps)
+        out.append(plate[:i] + rng.choice(_CONFUSABLE[plate[i]]) + plate[i + 1:])
+    if len(plate) > 2:
+        i = rng.randrange(len(plate))
+        out.append(plate[:i] + plate[i + 1:])
+    split = rng.randint(1, len(plate) - 1)
+    out.append(plate[:split] + rng.choice(["-", ".", " "]) + plate[split:])
+    if rng.random() < 0.2:
+        out.append(plate.translate(_THAI_DIGITS))
+    if rng.random() < 0.3:
+        out.append(plate[: rng.randint(1, 3)])
+    if rng.random() < 0.2:
+        out.append(plate + rng.choice(_THAI + list("0123456789")))
+    return out
+
+
+def candidate_stream(plates: int, variants: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    stream: List[str] = []
+    for _ in range(plates):
+        plate = synthetic_plate(rng)
+        for _ in range(variants):
+            stream.extend(ocr_variants(plate, rng))
+    return stream
+
+
+def calls_per_sec(fn: Callable, stream: Sequence[str], repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for text in stream:
+            fn(text)
+    elapsed = time.perf_counter() - t0
+    return repeat * len(stream) / elapsed if elapsed > 0 else float("inf")
+
+
+def clear_memo() -> None:
+    validate.classify_plate.cache_clear()
+    validate.is_valid_plate.cache_clear()
+    postprocess_thai_plate.plate_pattern_match.cache_clear()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plates", type=int, default=1000, help="synthetic plates (one read each)")
+    parser.add_argument("--variants", type=int, default=9, help="OCR variants per read")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the stream per measurement")
+    args = parser.parse_args()
+
+    stream = candidate_stream(args.plates, args.variants, args.seed)
+    benches = {
+        "is_valid_plate": (scan_is_valid_plate, validate.is_valid_plate),
+        "is_possibly_truncated": (scan_is_possibly_truncated, validate.is_possibly_truncated),
+        "classify_plate_type": (scan_classify_plate_type, validate.classify_plate_type),
+        "all three": (scan_all, compiled_all),
+        "plate_pattern_match": (scan_plate_pattern_match, postprocess_thai_plate.plate_pattern_match),
+    }
+
+    mismatches = 0
+    for name, (scan_fn, compiled_fn) in benches.items():
+        for text in stream:
+            if scan_fn(text) != compiled_fn(text):
+                mismatches += 1
+                print(f"{name} mismatch: {text!r}")
+
+    print(f"{len(stream)} candidates ({len(set(stream))} distinct) from {args.plates} reads x {args.variants} variants")
+    print(f"{'function':<22} {'scan/s':>10} {'cold/s':>10} {'warm/s':>10} {'cold x':>7} {'warm x':>7}")
+    for name, (scan_fn, compiled_fn) in benches.items():
+        scan = calls_per_sec(scan_fn, stream, args.repeat)
+        cold = 0.0
+        for _ in range(args.repeat):
+            clear_memo()
+            cold += calls_per_sec(compiled_fn, stream, 1)
+        cold /= args.repeat
+        warm = calls_per_sec(compiled_fn, stream, args.repeat)
+        print(f"{name:<22} {scan:>10.0f} {cold:>10.0f} {warm:>10.0f} {cold / scan:>6.1f}x {warm / scan:>6.1f}x")
+
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Microbenchmark for province matching: linear scan vs prebuilt index + memo.
+
+Three ways of answering the same workload of province reads, in calls/sec
+for match_province and province_candidates:
+
+  scan    the previous implementation — choice lists rebuilt per call, a
+          substring scan over every province, no memo (kept here as the
+          reference)
+  cold    alpr_worker.inference.provinces with its memo caches cleared, so
+          every distinct read goes through the bigram index + RapidFuzz
+  warm    the same workload again with the memo filled (OCR repeats the
+          same strings across variants and passes)
+
+Results of scan and the indexed functions are compared call by call; any
+mismatch is printed and makes the exit status 1.
+
+The default workload is --n synthetic reads (province names and aliases
+with OCR-like edits, plate digits glued on, truncation); --texts reads one
+string per line instead (e.g. province texts pulled from raw OCR output).
+
+usage:
+  python bin/bench_provinces.py
+  python bin/bench_provinces.py --n 5000 --repeat 5 --threshold 55
+  python bin/bench_provinces.py --texts province_reads.txt
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rapidfuzz import fuzz, process  # noqa: E402
+
+from alpr_worker.inference import provinces  # noqa: E402
+from alpr_worker.inference.provinces import (  # noqa: E402
+    PROVINCE_ALIASES,
+    THAI_PROVINCES,
+    _NORMALIZED_ALIASES,
+    _NORMALIZED_PROVINCES,
+)
+
+_NOISE = [chr(c) for c in range(ord("ก"), ord("ฮ") + 1)] + list("0123456789") + ["่", "้", "ิ", "ี", "ุ"]
+
+
+# ----------------------------
+# Reference (pre-index) implementation
+# ----------------------------
+def scan_normalize(text: str) -> str:
+    return provinces.normalize_thai_text.__wrapped__(text)
+
+
+def scan_match_province(text: str, threshold: int = 70) -> Tuple[str, float]:
+    cleaned = scan_normalize(text)
+    if not cleaned:
+        return "", 0.0
+
+    if "กรุงเทพ" in cleaned or "กรงเทพ" in cleaned or "มหานคร" in cleaned:
+        return "กรุงเทพมหานคร", 100.0
+    if cleaned in _NORMALIZED_ALIASES:
+        return _NORMALIZED_ALIASES[cleaned], 100.0
+    if cleaned in _NORMALIZED_PROVINCES:
+        return _NORMALIZED_PROVINCES[cleaned], 100.0
+
+    for normalized, province in _NORMALIZED_PROVINCES.items():
+        if cleaned in normalized or normalized in cleaned:
+            overlap = min(len(cleaned), len(normalized)) / max(len(cleaned), len(normalized))
+            score = 74.0 + overlap * 20.0
+            if score >= threshold:
+                return province, score
+
+    province_hit = process.extractOne(cleaned, list(_NORMALIZED_PROVINCES.keys()), scorer=fuzz.WRatio)
+    alias_hit = process.extractOne(cleaned, list(_NORMALIZED_ALIASES.keys()), scorer=fuzz.WRatio)
+
+    candidate = ""
+    score = 0.0
+    is_alias = False
+    if province_hit:
+        candidate = province_hit[0]
+        score = float(province_hit[1])
+    if alias_hit and float(alias_hit[1]) > score:
+        candidate = alias_hit[0]
+        score = float(alias_hit[1])
+        is_alias = True
+
+    if score < float(threshold):
+        return "", score
+    if is_alias:
+        return _NORMALIZED_ALIASES[candidate], score
+    return _NORMALIZED_PROVINCES.get(candidate, ""), score
+
+
+def scan_province_candidates(text: str, limit: int = 3, threshold: int = 70) -> List[Tuple[str, float]]:
+    cleaned = scan_normalize(text)
+    if not cleaned:
+        return []
+
+    candidates: List[Tuple[str, float]] = []
+    if "กรุงเทพ" in cleaned or "กรงเทพ" in cleaned or "มหานคร" in cleaned:
+        return [("กรุงเทพมหานคร", 100.0)]
+    if cleaned in _NORMALIZED_ALIASES:
+        return [(_NORMALIZED_ALIASES[cleaned], 100.0)]
+    if cleaned in _NORMALIZED_PROVINCES:
+        return [(_NORMALIZED_PROVINCES[cleaned], 100.0)]
+
+    overlap_hits: List[Tuple[str, float]] = []
+    for normalized, province in _NORMALIZED_PROVINCES.items():
+        if cleaned in normalized or normalized in cleaned:
+            overlap = min(len(cleaned), len(normalized)) / max(len(cleaned), len(normalized))
+            score = 74.0 + overlap * 20.0
+            if score >= threshold:
+                overlap_hits.append((province, score))
+    overlap_hits.sort(key=lambda item: item[1], reverse=True)
+    candidates.extend(overlap_hits[:limit])
+
+    province_hits = process.extract(cleaned, list(_NORMALIZED_PROVINCES.keys()), scorer=fuzz.WRatio, limit=limit)
+    alias_hits = process.extract(cleaned, list(_NORMALIZED_ALIASES.keys()), scorer=fuzz.WRatio, limit=limit)
+    for candidate, score, _ in province_hits or []:
+        if float(score) >= float(threshold):
+            candidates.append((_NORMALIZED_PROVINCES.get(candidate, ""), float(score)))
+    for candidate, score, _ in alias_hits or []:
+        if float(score) >= float(threshold):
+            candidates.append((_NORMALIZED_ALIASES.get(candidate, ""), float(score)))
+
+    deduped: List[Tuple[str, float]] = []
+    seen = set()
+    for name, score in sorted(candidates, key=lambda item: item[1], reverse=True):
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        deduped.append((name, score))
+        if len(deduped) >= limit:
+            break
+    return deduped
+
+
+# ----------------------------
+# Workload
+# ----------------------------
+def synthetic_reads(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    names = THAI_PROVINCES + list(PROVINCE_ALIASES)
+    reads = []
+    for _ in range(n):
+        chars = list(rng.choice(names))
+        for _ in range(rng.randint(0, 3)):
+            i = rng.randrange(len(chars) + 1)
+            op = rng.random()
+            if op < 0.3 and chars:
+                chars[min(i, len(chars) - 1)] = rng.choice(_NOISE)
+            elif op < 0.6 and chars:
+                del chars[min(i, len(chars) - 1)]
+            else:
+                chars.insert(i, rng.choice(_NOISE))
+        if rng.random() < 0.25:
+            chars = list(f"{rng.randint(1, 9)}กข{rng.randint(1, 9999)}") + chars
+        if rng.random() < 0.2 and chars:
+            chars = chars[: rng.randint(1, len(chars))]
+        reads.append("".join(chars))
+    return reads
+
+
+def calls_per_sec(fn: Callable, reads: Sequence[str], repeat: int, **kwargs) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for text in reads:
+            fn(text, **kwargs)
+    elapsed = time.perf_counter() - t0
+    return repeat * len(reads) / elapsed if elapsed > 0 else float("inf")
+
+
+def clear_memo() -> None:
+    provinces.normalize_thai_text.cache_clear()
+    provinces._match_normalized.cache_clear()
+    provinces._candidates_normalized.cache_clear()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="one province read per line (default: synthetic reads)")
+    parser.add_argument("--n", type=int, default=2000, help="synthetic reads")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the workload per measurement")
+    parser.add_argument("--threshold", type=int, default=55, help="as OCR_PROVINCE_MIN_SCORE")
+    parser.add_argument("--limit", type=int, default=3, help="province_candidates limit")
+    args = parser.parse_args()
+
+    if args.texts:
+        reads = [line.strip() for line in Path(args.texts).read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        reads = synthetic_reads(args.n, args.seed)
+    distinct = len(set(reads))
+
+    mismatches = 0
+    for text in reads:
+        if scan_match_province(text, args.threshold) != provinces.match_province(text, args.threshold):
+            mismatches += 1
+            print(f"match_province mismatch: {text!r}")
+        expected = scan_province_candidates(text, args.limit, args.threshold)
+        if expected != provinces.province_candidates(text, args.limit, args.threshold):
+            mismatches += 1
+            print(f"province_candidates mismatch: {text!r}")
+
+    benches = {
+        "match_province": (scan_match_province, provinces.match_province, {"threshold": args.threshold}),
+        "province_candidates": (
+            scan_province_candidates, provinces.province_candidates,
+            {"limit": args.limit, "threshold": args.threshold},
+        ),
+    }
+    print(f"{len(reads)} reads ({distinct} distinct), threshold={args.threshold}, repeat={args.repeat}")
+    print(f"{'function':<20} {'scan/s':>10} {'cold/s':>10} {'warm/s':>11} {'cold x':>7} {'warm x':>7}")
+    for name, (scan_fn, indexed_fn, kwargs) in benches.items():
+        scan = calls_per_sec(scan_fn, reads, args.repeat, **kwargs)
+        cold = 0.0
+        for _ in range(args.repeat):
+            clear_memo()
+            cold += calls_per_sec(indexed_fn, reads, 1, **kwargs)
+        cold /= args.repeat
+        warm = calls_per_sec(indexed_fn, reads, args.repeat, **kwargs)
+        print(f"{name:<20} {scan:>10.0f} {cold:>10.0f} {warm:>11.0f} {cold / scan:>6.1f}x {warm / scan:>6.1f}x")
+
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Export PlateOCR's EasyOCR models to ONNX for OCR_BACKEND=onnx.
+
+Writes recognizer.onnx (+ recognizer.int8.onnx, dynamic int8 quantization)
+and detector.onnx (+ detector.int8.onnx with --quantize-detector; CRAFT is
+conv-heavy and dynamic quantization rarely pays off there) into --out, then
+runs a random batch through torch and ONNX Runtime and prints the max
+absolute difference per file. Accuracy on real plates: replay the same
+crops with bin/replay_bench.py --ocr-backend torch / onnx and --compare.
+
+Needs torch, easyocr, onnx and onnxruntime (export time only — the worker
+just needs onnxruntime).
+
+usage:
+  python bin/export_easyocr_onnx.py --out /models/easyocr_onnx
+  OCR_BACKEND=onnx OCR_ONNX_DIR=/models/easyocr_onnx python bin/replay_bench.py ...
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def check(reader, written) -> None:
+    import numpy as np
+    import torch
+    from easyocr.config import imgH
+
+    from alpr_worker.inference.onnx_backend import OnnxModule, _unwrap
+
+    inputs = {
+        "recognizer": torch.rand(4, 1, imgH, 320) * 2 - 1,
+        "detector": torch.rand(1, 3, 384, 768),
+    }
+    for name, path in written.items():
+        component = name.split(".")[0]
+        x = inputs[component]
+        with torch.no_grad():
+            model = _unwrap(getattr(reader, component)).float().cpu().eval()
+            expected = model(x, None) if component == "recognizer" else model(x)[0]
+        got = OnnxModule(path)(x)
+        got = got if component == "recognizer" else got[0]
+        diff = float(np.abs(expected.numpy() - got.numpy()).max())
+        size_mb = path.stat().st_size / (1024.0 * 1024.0)
+        print(f"{path.name:<24} {size_mb:>7.1f} MB  max |torch - onnx| = {diff:.4g}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="/models/easyocr_onnx", help="output directory")
+    parser.add_argument("--no-quantize", action="store_true", help="fp32 models only")
+    parser.add_argument("--quantize-detector", action="store_true", help="also write detector.int8.onnx")
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    import easyocr
+
+    from alpr_worker.inference.onnx_backend import export_reader
+
+    # Same language set as PlateOCR.reader (and thai_reader, which shares its models)
+    reader = easyocr.Reader(["th", "en"], gpu=False, verbose=False)
+    written = export_reader(
+        reader, Path(args.out),
+        quantize=not args.no_quantize,
+        quantize_detector=args.quantize_detector,
+        opset=args.opset,
+    )
+    check(reader, written)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
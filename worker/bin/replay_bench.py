@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""Offline replay benchmark for the full LPR pipeline (runs CPU-only).
+
+Vehicle crops go through process_lpr_task exactly as in the worker (Celery
+eager ``apply``: decode → detect → crop validation → OCR → master lookup →
+DB insert) against a throw-away SQLite DB. Every task is traced
+(LPR_TRACE_SAMPLE_RATE=1), so the report has p50/p95/p99 for each stage plus
+throughput, peak RSS and, with --labels, OCR agreement.
+
+Detector: MODEL_PATH (or --model) may be the .pt or .onnx export; with
+--device cpu (default) CUDA is hidden so both YOLO and EasyOCR run on CPU.
+Plate dedup, checkpoints, write-behind and the shared inference server are
+turned off so every crop is measured end to end.
+
+OCR backend A/B: run once with --ocr-backend torch --json, then again with
+--ocr-backend onnx --compare <torch run>; the comparison includes how often
+the two runs read the same plate text / province per crop (no labels needed).
+
+Parallel variants on CPU: --variant-workers N (OCR_VARIANT_WORKERS) against a
+sequential baseline; --thread-budget sets the threads the run may use (the
+replay is one process, so by default all cores). Reads should be identical
+(--min-agreement 1.0) and the wall-clock gain shows as throughput Δ.
+
+Plate normalisation: --target-char-height / --max-variant-pixels set
+OCR_TARGET_CHAR_HEIGHT / OCR_MAX_VARIANT_PIXELS (0 = off); run with both at 0
+for the baseline, then with the values to deploy and --compare, which reports
+the throughput / per-stage latency Δ and how many crops read the same plate.
+
+labels: CSV ``filename,plate_text[,province]`` (header optional), or JSON
+  {"<filename>": "<plate_text>"} / {"<filename>": {"plate_text": ..., "province": ...}}
+
+usage:
+  MODEL_PATH=/models/best.pt python bin/replay_bench.py \\
+      --crops storage/original/vehicle_crops --labels labels.csv --limit 300 --json run.json
+  python bin/replay_bench.py --labels labels.csv --compare baseline.json --max-regression 0.15
+  python bin/replay_bench.py --ocr-backend onnx --compare torch.json --min-agreement 0.98
+  python bin/replay_bench.py --variant-workers 4 --compare sequential.json --min-agreement 1.0
+  python bin/replay_bench.py --labels labels.csv --target-char-height 0 --max-variant-pixels 0 --json off.json
+  python bin/replay_bench.py --labels labels.csv --target-char-height 32 --max-variant-pixels 600000 --compare off.json
+"""
+import argparse
+import base64
+import csv
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+# Same tables as the Postgres schema, minus enums / JSON types.
+_SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS captures (
+        id INTEGER PRIMARY KEY, source TEXT, camera_id TEXT, track_id INTEGER,
+        captured_at TIMESTAMP, original_path TEXT, sha256 TEXT, idempotency_key TEXT UNIQUE)""",
+    """CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY, capture_id INTEGER, crop_path TEXT, det_conf REAL, bbox TEXT)""",
+    """CREATE TABLE IF NOT EXISTS plate_reads (
+        id INTEGER PRIMARY KEY, detection_id INTEGER, plate_text TEXT, plate_text_norm TEXT,
+        province TEXT, confidence REAL, status TEXT, created_at TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS master_plates (
+        id INTEGER PRIMARY KEY, plate_text_norm TEXT UNIQUE, display_text TEXT, province TEXT,
+        confidence REAL, last_seen TIMESTAMP, count_seen INTEGER, editable BOOLEAN)""",
+]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def load_labels(path: Optional[str]) -> Dict[str, Dict[str, str]]:
+    if not path:
+        return {}
+    text = Path(path).read_text(encoding="utf-8-sig")
+    labels: Dict[str, Dict[str, str]] = {}
+    if path.endswith(".json"):
+        for name, value in json.loads(text).items():
+            if isinstance(value, str):
+                value = {"plate_text": value}
+            labels[Path(name).name] = {"plate_text": value.get("plate_text", ""), "province": value.get("province", "")}
+        return labels
+
+    for row in csv.reader(text.splitlines()):
+        if not row or row[0].strip().lower() in ("filename", "file", "image"):
+            continue
+        labels[Path(row[0].strip()).name] = {
+            "plate_text": row[1].strip() if len(row) > 1 else "",
+            "province": row[2].strip() if len(row) > 2 else "",
+        }
+    return labels
+
+
+def configure_env(args, work_dir: Path) -> None:
+    """Pin the worker to a local, deterministic setup before alpr_worker is imported."""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{work_dir / 'replay.db'}"
+    os.environ["STORAGE_DIR"] = str(work_dir / "storage")
+    os.environ["LPR_TRACE_SAMPLE_RATE"] = "1"
+    os.environ["PLATE_DEDUP_ENABLED"] = "false"
+    os.environ["LPR_CHECKPOINT_ENABLED"] = "false"
+    os.environ["LPR_WRITE_BEHIND"] = "false"
+    os.environ["LPR_BATCH_ENABLED"] = "false"
+    os.environ["LPR_PAYLOAD_MODE"] = "inline"
+    os.environ["INFERENCE_SOCKET"] = ""
+    os.environ["ULTRALYTICS_AUTOINSTALL"] = "false"
+    if args.model:
+        os.environ["MODEL_PATH"] = args.model
+    os.environ["DETECTOR_DEVICE"] = args.device
+    if args.ocr_backend:
+        os.environ["OCR_BACKEND"] = args.ocr_backend
+    if args.variant_workers is not None:
+        os.environ["OCR_VARIANT_WORKERS"] = str(args.variant_workers)
+    if args.thread_budget is not None:
+        os.environ["OCR_THREAD_BUDGET"] = str(args.thread_budget)
+    if args.target_char_height is not None:
+        os.environ["OCR_TARGET_CHAR_HEIGHT"] = str(args.target_char_height)
+    if args.max_variant_pixels is not None:
+        os.environ["OCR_MAX_VARIANT_PIXELS"] = str(args.max_variant_pixels)
+    # one replay process: the budget is the whole machine unless told otherwise
+    os.environ["CELERY_WORKER_POOL"] = "solo"
+    if args.device == "cpu":
+        os.environ["USE_TRT_DETECTOR"] = "false"
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+
+def collect_images(crops_dir: Path, limit: int) -> List[Path]:
+    images = sorted(p for p in crops_dir.rglob("*") if p.suffix.lower() in _IMAGE_SUFFIXES)
+    return images[:limit] if limit > 0 else images
+
+
+def run(args) -> Dict:
+    crops_dir = Path(args.crops).resolve()
+    images = collect_images(crops_dir, args.limit)
+    if not images:
+        raise SystemExit(f"no images under {crops_dir}")
+    labels = load_labels(args.labels)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="lpr_replay_"))
+    configure_env(args, work_dir)
+
+    from sqlalchemy import text
+
+    from alpr_worker import tasks
+    from alpr_worker.artifact_writer import get_artifact_writer
+
+    if tasks.engine.dialect.name == "sqlite":
+        with tasks.engine.begin() as conn:
+            for ddl in _SQLITE_SCHEMA:
+                conn.execute(text(ddl))
+
+    t0 = time.perf_counter()
+    tasks.get_detector()
+    tasks.get_ocr()
+    model_load_s = time.perf_counter() - t0
+    variant_pool = getattr(tasks.get_ocr(), "variant_pool", None)
+    variant_budget = variant_pool.budget if variant_pool is not None else None
+
+    stage_ms: Dict[str, List[float]] = {}
+    variants_run: List[int] = []
+    ocr_tiers: Dict[str, int] = {}
+    agreement = {"labelled": 0, "plate_match": 0, "province_labelled": 0, "province_match": 0}
+    mismatches = []
+    reads: Dict[str, Dict[str, str]] = {}
+    outcomes = {"ok": 0, "rejected": 0, "error": 0}
+
+    def replay(idx: int, path: Path, record: bool) -> None:
+        payload = base64.b64encode(path.read_bytes()).decode("ascii")
+        res = tasks.process_lpr_task.apply(kwargs=dict(
+            vehicle_crop_b64=payload, track_id=idx, vehicle_count=idx, camera_id="replay",
+        ))
+        result = res.get(propagate=False)
+        if not record:
+            return
+        if res.failed() or not isinstance(result, dict):
+            outcomes["error"] += 1
+            return
+        outcomes["ok" if result.get("ok") else "rejected"] += 1
+        reads[path.name] = {
+            "plate_text_norm": result.get("plate_text_norm", ""),
+            "province": result.get("province", ""),
+        }
+        if result.get("ocr_variants_run") is not None:
+            variants_run.append(result["ocr_variants_run"])
+        if result.get("ocr_tier"):
+            ocr_tiers[result["ocr_tier"]] = ocr_tiers.get(result["ocr_tier"], 0) + 1
+        for stage, ms in (result.get("timings_ms") or {}).items():
+            stage_ms.setdefault(stage, []).append(ms)
+
+        label = labels.get(path.name)
+        if label and label["plate_text"]:
+            agreement["labelled"] += 1
+            expected = tasks.norm_plate_text(label["plate_text"]).replace("-", "")
+            got = (result.get("plate_text_norm") or "").replace("-", "")
+            if got == expected:
+                agreement["plate_match"] += 1
+            else:
+                mismatches.append({"file": path.name, "expected": expected, "got": got})
+            if label["province"]:
+                agreement["province_labelled"] += 1
+                if result.get("province", "") == label["province"]:
+                    agreement["province_match"] += 1
+
+    for i, path in enumerate(images[: args.warmup]):
+        replay(-1 - i, path, record=False)
+
+    t0 = time.perf_counter()
+    for i, path in enumerate(images):
+        replay(i, path, record=True)
+    wall = time.perf_counter() - t0
+    get_artifact_writer().flush()
+
+    stages = {
+        name: {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": statistics.fmean(values),
+        }
+        for name, values in stage_ms.items()
+    }
+    return {
+        "images": len(images),
+        "wall_s": wall,
+        "throughput_per_s": len(images) / wall if wall > 0 else 0.0,
+        "model_load_s": model_load_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "outcomes": outcomes,
+        "ocr_variants_run_mean": statistics.fmean(variants_run) if variants_run else None,
+        "ocr_tiers": ocr_tiers,
+        "agreement": {
+            **agreement,
+            "plate_rate": agreement["plate_match"] / agreement["labelled"] if agreement["labelled"] else None,
+            "province_rate": (
+                agreement["province_match"] / agreement["province_labelled"]
+                if agreement["province_labelled"] else None
+            ),
+        },
+        "stages": stages,
+        "mismatches": mismatches,
+        "reads": reads,
+        "env": {
+            "device": args.device,
+            "ocr_backend": getattr(tasks.get_ocr(), "backend", ""),
+            "variant_workers": variant_budget.workers if variant_budget else None,
+            "intra_op_threads": variant_budget.intra_op if variant_budget else None,
+            "target_char_height": float(os.getenv("OCR_TARGET_CHAR_HEIGHT", "0")),
+            "max_variant_pixels": int(os.getenv("OCR_MAX_VARIANT_PIXELS", "0")),
+            "model_path": os.getenv("MODEL_PATH", ""),
+            "database": tasks.engine.dialect.name,
+        },
+    }
+
+
+def print_report(summary: Dict) -> None:
+    print(
+        f"images={summary['images']} wall={summary['wall_s']:.1f}s "
+        f"throughput={summary['throughput_per_s']:.2f}/s model_load={summary['model_load_s']:.1f}s "
+        f"peak_rss={summary['peak_rss_mb']:.0f}MB outcomes={summary['outcomes']}"
+    )
+    env = summary.get("env", {})
+    if env.get("variant_workers"):
+        print(f"OCR threads: {env['variant_workers']} variant workers x {env['intra_op_threads']} intra-op")
+    if env.get("target_char_height") or env.get("max_variant_pixels"):
+        print(f"OCR normalise: char height {env.get('target_char_height') or 'off'} "
+              f"variant pixel cap {env.get('max_variant_pixels') or 'off'}")
+    if summary.get("ocr_variants_run_mean") is not None:
+        print(f"OCR variants run per plate: {summary['ocr_variants_run_mean']:.2f}")
+    tiers = summary.get("ocr_tiers") or {}
+    if tiers.get("fast") or tiers.get("escalated"):
+        settled = tiers.get("fast", 0) + tiers.get("escalated", 0)
+        print(f"OCR cascade: fast {tiers.get('fast', 0)} escalated {tiers.get('escalated', 0)} "
+              f"(escalation rate {tiers.get('escalated', 0) / settled:.2f})")
+    agreement = summary["agreement"]
+    if agreement["labelled"]:
+        print(f"plate agreement {agreement['plate_match']}/{agreement['labelled']} = {agreement['plate_rate']:.3f}")
+    if agreement["province_labelled"]:
+        print(
+            f"province agreement {agreement['province_match']}/{agreement['province_labelled']} "
+            f"= {agreement['province_rate']:.3f}"
+        )
+
+    print(f"{'stage':<34} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for name, s in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["mean"] * kv[1]["n"]):
+        print(f"{name:<34} {s['n']:>5} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f} {s['mean']:>9.2f}")
+
+
+def compare(
+    summary: Dict, baseline: Dict, max_regression: Optional[float], min_agreement: Optional[float] = None
+) -> int:
+    """Print deltas against a previous --json run; non-zero if over the threshold."""
+    print(f"\n{'vs baseline':<34} {'p50 Δ%':>9} {'p95 Δ%':>9}")
+    for name, s in sorted(summary["stages"].items()):
+        base = baseline.get("stages", {}).get(name)
+        if not base or not base["p50"] or not base["p95"]:
+            continue
+        print(
+            f"{name:<34} {100 * (s['p50'] / base['p50'] - 1):>+9.1f} {100 * (s['p95'] / base['p95'] - 1):>+9.1f}"
+        )
+
+    regressions = []
+    base_tput = baseline.get("throughput_per_s") or 0.0
+    if base_tput:
+        change = summary["throughput_per_s"] / base_tput - 1
+        print(f"throughput Δ {100 * change:+.1f}%")
+        if max_regression is not None and change < -max_regression:
+            regressions.append(f"throughput {100 * change:+.1f}%")
+    total, base_total = summary["stages"].get("total"), baseline.get("stages", {}).get("total")
+    if total and base_total and base_total["p95"] and max_regression is not None:
+        change = total["p95"] / base_total["p95"] - 1
+        if change > max_regression:
+            regressions.append(f"total p95 {100 * change:+.1f}%")
+    rate, base_rate = summary["agreement"]["plate_rate"], baseline.get("agreement", {}).get("plate_rate")
+    if rate is not None and base_rate is not None:
+        print(f"plate agreement Δ {rate - base_rate:+.3f}")
+        if max_regression is not None and rate < base_rate - 0.005:
+            regressions.append(f"plate agreement {rate - base_rate:+.3f}")
+
+    reads, base_reads = summary.get("reads") or {}, baseline.get("reads") or {}
+    common = [name for name in reads if name in base_reads]
+    if common:
+        same_plate = sum(reads[n]["plate_text_norm"] == base_reads[n]["plate_text_norm"] for n in common)
+        same_province = sum(reads[n]["province"] == base_reads[n]["province"] for n in common)
+        print(
+            f"same read as baseline over {len(common)} crops: plate {same_plate / len(common):.3f} "
+            f"province {same_province / len(common):.3f}"
+        )
+        if min_agreement is not None and same_plate / len(common) < min_agreement:
+            regressions.append(f"baseline agreement {same_plate / len(common):.3f}")
+
+    if regressions:
+        print("REGRESSION: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+def main() -> int:
+    default_crops = Path(os.getenv("STORAGE_DIR", "./storage")) / "original" / "vehicle_crops"
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--crops", default=str(default_crops), help="directory of vehicle crops")
+    parser.add_argument("--labels", help="CSV or JSON ground truth keyed by file name")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most N crops (0 = all)")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed crops before measuring")
+    parser.add_argument("--model", help="detector weights (.pt / .onnx); default MODEL_PATH")
+    parser.add_argument("--device", default="cpu", help='"cpu" (default) or a CUDA device id')
+    parser.add_argument("--database-url", default="", help="default: throw-away SQLite file")
+    parser.add_argument("--json", dest="json_out", help="write the summary here")
+    parser.add_argument("--compare", help="summary JSON of a baseline run")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="with --compare: exit 1 if throughput / total p95 worsen by more than this fraction")
+    parser.add_argument("--ocr-backend", choices=["torch", "onnx"], default="",
+                        help="set OCR_BACKEND (default: inherit the environment)")
+    parser.add_argument("--variant-workers", type=int, default=None,
+                        help="set OCR_VARIANT_WORKERS (default: inherit the environment)")
+    parser.add_argument("--thread-budget", type=int, default=None,
+                        help="set OCR_THREAD_BUDGET (default: all cores of this machine)")
+    parser.add_argument("--target-char-height", type=float, default=None,
+                        help="set OCR_TARGET_CHAR_HEIGHT in px, 0 = off (default: inherit the environment)")
+    parser.add_argument("--max-variant-pixels", type=int, default=None,
+                        help="set OCR_MAX_VARIANT_PIXELS, 0 = off (default: inherit the environment)")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="with --compare: exit 1 if fewer crops than this read the same plate as the baseline")
+    args = parser.parse_args()
+
+    summary = run(args)
+    print_report(summary)
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        return compare(summary, baseline, args.max_regression, args.min_agreement)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
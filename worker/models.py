@@ -19,6 +19,7 @@ class Capture(Base):
     captured_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     original_path: Mapped[str] = mapped_column(Text)
     sha256: Mapped[str] = mapped_column(String(64))
+    idempotency_key: Mapped[str | None] = mapped_column(String(128), nullable=True, unique=True)
 
 class Detection(Base):
     __tablename__ = "detections"
@@ -198,6 +198,34 @@ else
 fi
 echo ""
 
+# ==================== Shared Inference Server ====================
+# One process owns the detector + OCR models; Celery children connect over a
+# Unix socket and fall back to in-process models if it is not up.
+if [ "${INFERENCE_SERVER_ENABLED:-false}" = "true" ]; then
+    export INFERENCE_SOCKET="${INFERENCE_SOCKET:-/tmp/alpr-inference.sock}"
+    echo "[worker] Starting shared inference server on ${INFERENCE_SOCKET}..."
+    python3 -m alpr_worker.inference.server &
+    for i in $(seq 1 "${INFERENCE_SERVER_WAIT_SEC:-120}"); do
+        if [ -S "$INFERENCE_SOCKET" ]; then
+            echo "[worker] ✓ Inference server ready"
+            break
+        fi
+        sleep 1
+    done
+    if [ ! -S "$INFERENCE_SOCKET" ]; then
+        echo "[worker] ⚠ Inference server not ready; tasks will load models in-process"
+    fi
+    echo ""
+fi
+
+# ==================== Write-behind DB Writer ====================
+# Tasks spool reads to ${STORAGE_DIR}/spool; one writer batches them into PostgreSQL.
+if [ "${LPR_WRITE_BEHIND:-false}" = "true" ]; then
+    echo "[worker] Starting write-behind DB writer..."
+    python3 -m alpr_worker.write_behind &
+    echo ""
+fi
+
 # ==================== Worker Configuration ====================
 echo "[worker] === Worker Configuration ==="
 echo "[worker] Concurrency: ${CELERY_WORKER_CONCURRENCY:-4}"
@@ -205,7 +233,10 @@ echo "[worker] Prefetch Multiplier: ${CELERY_WORKER_PREFETCH:-8}"
 echo "[worker] Task Time Limit: 300s (hard), 240s (soft)"
 echo "[worker] Queues: lpr, tracking, training"
 echo "[worker] Max Tasks Per Child: 100"
-echo "[worker] Pool: solo (single-process)"
+echo "[worker] Pool: ${CELERY_WORKER_POOL:-solo}"
+echo "[worker] Shared Inference Server: ${INFERENCE_SERVER_ENABLED:-false}"
+echo "[worker] Write-behind DB Writer: ${LPR_WRITE_BEHIND:-false}"
+echo "[worker] Micro-batching: ${LPR_BATCH_ENABLED:-false} (needs pool=threads)"
 echo ""
 
 # ==================== Start Celery Worker ====================
@@ -215,7 +246,7 @@ echo ""
 
 exec celery -A alpr_worker.celery_app:celery_app worker \
     --loglevel=info \
-    --pool=solo \
+    --pool=${CELERY_WORKER_POOL:-solo} \
     --concurrency=${CELERY_WORKER_CONCURRENCY:-4} \
     --prefetch-multiplier=${CELERY_WORKER_PREFETCH:-8} \
     -Q lpr,tracking,training \